@@ -3,20 +3,58 @@ import numpy as np
 from gymnasium.spaces import Box
 from gymnasium import spaces
 import math
+from rewards import RewardEngine
+from profiler import StepProfiler
+from reset_bank import DEFAULT_RESET_BANK_SIZE, ResetBank
+from state_layout import EGO_PADDLE, PUCK, PUCK_X, PUCK_Y, PUCK_VY, BODY_SLOTS, OBS_SIZE, alt_paddle_offset, state_size
 
 
 def get_box2d_simulator_fn():
     from airhockey_box2d import AirHockeyBox2D
     return AirHockeyBox2D
+
+def get_numpy_batch_simulator_fn():
+    from airhockey_numpy import AirHockeyNumpyBatch
+    return AirHockeyNumpyBatch
+    
+def get_pixel_renderer_fn():
+    from render import HeadlessAirHockeyRenderer
+    return HeadlessAirHockeyRenderer
     
 def get_robosuite_simulator_fn():
     from air_hockey_challenge_robosuite.robosuite.wrappers.gym_wrapper import GymWrapper
     return GymWrapper
 
 
+# goal attributes set by AirHockeyEnv.set_goals, saved in snapshots
+GOAL_ATTRS = ('ego_goal_pos', 'ego_goal_vel', 'ego_goal_radius', 'alt_goal_pos', 'alt_goal_radius')
+
+
+def scale_uniform(u, low, high):
+    """
+    Maps uniforms in [0, 1) to [low, high), like np.random.Generator.uniform does.
+    """
+    low = np.asarray(low)
+    return low + (np.asarray(high) - low) * u
+
+
+class AirHockeyEnvSnapshot:
+    """
+    Copy of an AirHockeyEnv state, see AirHockeyEnv.snapshot.
+    """
+    __slots__ = ('simulator', 'timesteps', 'old_state', 'goals', 'goal_bank')
+
+    def __init__(self, simulator, timesteps, old_state, goals, goal_bank):
+        self.simulator = simulator
+        self.timesteps = timesteps
+        self.old_state = old_state
+        self.goals = goals
+        self.goal_bank = goal_bank
+
+
 class AirHockeyEnv(Env):
     def __init__(self,
-                 simulator, # box2d or robosuite
+                 simulator, # box2d, numpy_batch or robosuite
                  simulator_params,
                  task, 
                  n_training_steps,
@@ -33,14 +71,23 @@ class AirHockeyEnv(Env):
                  goal_min_y_velocity, 
                  goal_max_y_velocity,
                  seed,
-                 max_timesteps=1000):
+                 max_timesteps=1000,
+                 observation_mode='state',
+                 pixel_obs_size=84,
+                 pixel_obs_grayscale=True,
+                 frame_stack=1,
+                 profile=False,
+                 profile_interval=1000,
+                 zero_alloc=False):
         
         if simulator == 'box2d':
             simulator_fn = get_box2d_simulator_fn()
+        elif simulator == 'numpy_batch':
+            simulator_fn = get_numpy_batch_simulator_fn()
         elif simulator == 'robosuite':
             simulator_fn = get_robosuite_simulator_fn()
         else:
-            raise ValueError("Invalid simulator type. Must be 'box2d' or 'robosuite'.")
+            raise ValueError("Invalid simulator type. Must be 'box2d', 'numpy_batch' or 'robosuite'.")
             
         self.simulator = simulator_fn.from_dict(simulator_params)
         self.simulator_params = simulator_params
@@ -50,7 +97,10 @@ class AirHockeyEnv(Env):
         self.n_training_steps = n_training_steps
         self.n_timesteps_so_far = 0
         self.seed = seed
-        np.random.seed(seed)
+        # one generator per env, shared with the simulator (see seed_rng), so spawns and goals only depend
+        # on the env seed and never on the global numpy RNG or on other envs in the process
+        self.goal_bank = ResetBank(self.sample_goals, simulator_params.get('reset_bank_size', DEFAULT_RESET_BANK_SIZE))
+        self.seed_rng(seed)
         
         # termination conditions
         self.terminate_on_out_of_bounds = terminate_on_out_of_bounds
@@ -66,6 +116,8 @@ class AirHockeyEnv(Env):
         self.goal_max_y_velocity = goal_max_y_velocity
         self.reward_type = task
         self.multiagent = self.simulator_params['num_paddles'] == 2
+        # players stepped per env step, multi-agent envs take and return one row per player
+        self.num_agents = 2 if self.multiagent else 1
         self.truncate_rew = truncate_rew
         self.wall_bumping_rew = wall_bumping_rew
         self.direction_change_rew = direction_change_rew
@@ -84,42 +136,177 @@ class AirHockeyEnv(Env):
         self.table_y_left = -self.width / 2
         self.max_paddle_vel = self.simulator.max_paddle_vel
         self.max_puck_vel = self.simulator.max_puck_vel
+
+        # the alt player's frame is the table turned around (x, y, vx, vy all flip sign), with the alt
+        # paddle in the ego slots and the ego paddle in the alt slots, see get_joint_state
+        alt_paddle = alt_paddle_offset(simulator_params['num_pucks'])
+        self.alt_state_index = np.r_[alt_paddle:alt_paddle + BODY_SLOTS, PUCK:alt_paddle, EGO_PADDLE:EGO_PADDLE + BODY_SLOTS]
+        self.alt_obs_index = self.alt_state_index[:OBS_SIZE]
+        # centers of the two home regions, in env coordinates
+        self.bottom_center_point = (self.table_x_bot, 0)
+        self.top_center_point = (self.table_x_top, 0)
+        self.current_state = None
+        self.old_state = None
+        # rewards, shaping and termination, shared with batched callers
+        self.reward_engine = RewardEngine(task=task,
+                                          width=self.width,
+                                          length=self.length,
+                                          paddle_radius=self.paddle_radius,
+                                          puck_radius=self.puck_radius,
+                                          max_paddle_vel=self.max_paddle_vel,
+                                          max_timesteps=max_timesteps,
+                                          terminate_on_out_of_bounds=terminate_on_out_of_bounds,
+                                          terminate_on_enemy_goal=terminate_on_enemy_goal,
+                                          terminate_on_puck_stop=terminate_on_puck_stop,
+                                          truncate_rew=truncate_rew,
+                                          wall_bumping_rew=wall_bumping_rew,
+                                          direction_change_rew=direction_change_rew,
+                                          horizontal_vel_rew=horizontal_vel_rew,
+                                          diagonal_motion_rew=diagonal_motion_rew,
+                                          stand_still_rew=stand_still_rew)
+        if self.multiagent:
+            if self.goal_conditioned:
+                raise ValueError("Multi-agent envs only support tasks without goals.")
+            # both players' states, each in its own frame, see get_joint_state
+            joint_shape = (2, state_size(2, simulator_params['num_pucks']))
+            self.joint_state = np.zeros(joint_shape)
+            self.joint_old_state = np.zeros(joint_shape)
+            # the alt observation is gathered here first, indexing with alt_obs_index would allocate
+            self.alt_obs_scratch = np.zeros(OBS_SIZE)
+        # step (an instance attribute, there is no class step), its reward and its termination are specialized
+        # once from the players, the goals, the task and the flags, so a step runs no checks for options that
+        # are off (see RewardEngine.make_transition_fn). zero_alloc envs compute them on python floats
+        self.zero_alloc = zero_alloc
+        self.transition = self.reward_engine.make_transition_fn(self.multiagent, python_floats=zero_alloc)
+        self.step = self.multi_step if self.multiagent else self.goal_step if self.goal_conditioned else self.single_agent_step
         
+        # per-phase timers, off unless asked for (set up before the pixel renderer so it is timed too)
+        self.profiler = None
+        if profile:
+            self.initialize_profiler(profile_interval)
+        
+        # state: the 8 paddle / puck floats, pixels: uint8 images of the table
+        if observation_mode not in ('state', 'pixels'):
+            raise ValueError("Invalid observation mode. Must be 'state' or 'pixels'.")
+        self.observation_mode = observation_mode
+        if observation_mode == 'pixels':
+            self.initialize_pixel_observations(pixel_obs_size, pixel_obs_grayscale, frame_stack)
+        # state observations, goals and multi-agent rewards in float32, written into the same buffers on
+        # every step (copy them to keep them), and contact events as a view of the contact buffer
+        self.obs_dtype = np.dtype(np.float32 if zero_alloc else float)
         self.initialize_spaces()
+        if zero_alloc:
+            self.initialize_buffers()
         
         self.metadata = {}
         self.reset()
 
+    def initialize_profiler(self, profile_interval):
+        """
+        Replaces the step phases with timed wrappers (see profiler.py), an env without profile=True keeps
+        its plain methods. Every profile_interval steps the profile so far is added to info['profile'].
+        Renderers made for this env afterwards time their get_frame calls as 'render'.
+        """
+        profiler = self.profiler = StepProfiler()
+        profiler.instrument(self.simulator, 'get_transition', 'get_transition')
+        profiler.instrument(self, 'get_observation', 'get_observation')
+        self.transition = self.reward_engine.make_transition_fn(self.multiagent, wrap=profiler.wrap,
+                                                                python_floats=self.zero_alloc)
+        profiler.instrument(self, 'get_goal_observation', 'goal_dict')
+        profiler.instrument(self, 'reset', 'reset')
+        timed_step = profiler.wrap('step', self.step)
+        step_timer = profiler.timers['step']
+
+        def step(action):
+            result = timed_step(action)
+            if step_timer[1] % profile_interval == 0:
+                result[4]['profile'] = profiler.get_profile()
+            return result
+        self.step = step
+
+    def get_profile(self):
+        """
+        Cumulative time and call count of every phase since the env was made or reset_profile was called,
+        see StepProfiler.get_profile. Requires profile=True.
+        """
+        if self.profiler is None:
+            raise ValueError("Profiling is off, make the env with profile=True.")
+        return self.profiler.get_profile()
+
+    def reset_profile(self):
+        if self.profiler is None:
+            raise ValueError("Profiling is off, make the env with profile=True.")
+        self.profiler.reset()
+
+    def initialize_pixel_observations(self, pixel_obs_size, grayscale, frame_stack):
+        """
+        Sets up a renderer that draws straight at the observation size, and a ring buffer of the last
+        frame_stack frames. Observations are channels-first (frame_stack * channels, height, width) uint8
+        images, oldest frame first, so every frame is one contiguous block (interleaving frames along a
+        last channel axis costs more than rendering them).
+        """
+        if self.multiagent:
+            raise ValueError("Pixel observations are only supported for single-agent tasks.")
+        if frame_stack < 1:
+            raise ValueError("frame_stack must be at least 1.")
+        height, width = (pixel_obs_size, pixel_obs_size) if np.isscalar(pixel_obs_size) else pixel_obs_size
+        self.pixel_renderer = get_pixel_renderer_fn()(self, size=(height, width), grayscale=grayscale)
+        self.frame_channels = 1 if grayscale else 3
+        self.frame_stack = frame_stack
+        self.frame_buffer = np.zeros((self.frame_channels * frame_stack, height, width), dtype=np.uint8)
+        self.frame_index = 0
+        # channel order of the observation for every position of the newest frame in the ring
+        channels = np.arange(self.frame_channels * frame_stack).reshape(frame_stack, self.frame_channels)
+        self.frame_order = [np.roll(channels, -(i + 1), axis=0).ravel() for i in range(frame_stack)]
+
+    def get_pixel_observation(self, new_episode=False):
+        frame = self.pixel_renderer.get_frame()
+        # (height, width) or (height, width, 3) -> channels first
+        frame = frame[None] if frame.ndim == 2 else frame.transpose(2, 0, 1)
+        if new_episode:
+            # the stack starts out as copies of the first frame
+            self.frame_buffer.reshape(self.frame_stack, *frame.shape)[:] = frame
+            self.frame_index = self.frame_stack - 1
+        else:
+            self.frame_index = (self.frame_index + 1) % self.frame_stack
+            start = self.frame_index * self.frame_channels
+            self.frame_buffer[start:start + self.frame_channels] = frame
+        return self.frame_buffer[self.frame_order[self.frame_index]]
+
     def initialize_spaces(self):
         # setup observation / action / reward spaces
         low = np.array([self.table_x_top, self.table_y_left, -self.max_paddle_vel, -self.max_paddle_vel, 
-                        self.table_x_top, self.table_y_left, -self.max_puck_vel, -self.max_puck_vel])
+                        self.table_x_top, self.table_y_left, -self.max_puck_vel, -self.max_puck_vel], dtype=self.obs_dtype)
 
         high = np.array([self.table_x_bot, self.table_y_right, self.max_paddle_vel, self.max_paddle_vel, 
-                         self.table_x_bot, self.table_y_right, self.max_puck_vel, self.max_puck_vel])
+                         self.table_x_bot, self.table_y_right, self.max_puck_vel, self.max_puck_vel], dtype=self.obs_dtype)
+        if self.observation_mode == 'pixels':
+            obs_space = Box(low=0, high=255, shape=self.frame_buffer.shape, dtype=np.uint8)
+        else:
+            obs_space = Box(low=low, high=high, shape=(8,), dtype=self.obs_dtype)
         
         if not self.goal_conditioned:
-            self.observation_space = Box(low=low, high=high, shape=(8,), dtype=float)
+            self.observation_space = obs_space
         else:
             
             if self.reward_type == 'goal_position':
                 # y, x
-                goal_low = np.array([self.table_x_top, self.table_y_left])#, -self.max_paddle_vel, self.max_paddle_vel])
-                goal_high = np.array([0, self.table_y_right])#, self.max_paddle_vel, self.max_paddle_vel])
+                goal_low = np.array([self.table_x_top, self.table_y_left], dtype=self.obs_dtype)#, -self.max_paddle_vel, self.max_paddle_vel])
+                goal_high = np.array([0, self.table_y_right], dtype=self.obs_dtype)#, self.max_paddle_vel, self.max_paddle_vel])
                 
                 self.observation_space = spaces.Dict(dict(
-                    observation=Box(low=low, high=high, shape=(8,), dtype=float),
-                    desired_goal=Box(low=goal_low, high=goal_high, shape=(2,), dtype=float),
-                    achieved_goal=Box(low=goal_low, high=goal_high, shape=(2,), dtype=float)
+                    observation=obs_space,
+                    desired_goal=Box(low=goal_low, high=goal_high, shape=(2,), dtype=self.obs_dtype),
+                    achieved_goal=Box(low=goal_low, high=goal_high, shape=(2,), dtype=self.obs_dtype)
                 ))
             
             elif self.reward_type == 'goal_position_velocity':
-                goal_low = np.array([self.table_x_top, self.table_y_left, -self.max_puck_vel, -self.max_puck_vel])
-                goal_high = np.array([0, self.table_y_right, self.max_puck_vel, self.max_puck_vel])
+                goal_low = np.array([self.table_x_top, self.table_y_left, -self.max_puck_vel, -self.max_puck_vel], dtype=self.obs_dtype)
+                goal_high = np.array([0, self.table_y_right, self.max_puck_vel, self.max_puck_vel], dtype=self.obs_dtype)
                 self.observation_space = spaces.Dict(dict(
-                    observation=Box(low=low, high=high, shape=(8,), dtype=float),
-                    desired_goal=Box(low=goal_low, high=goal_high, shape=(4,), dtype=float),
-                    achieved_goal=Box(low=goal_low, high=goal_high, shape=(4,), dtype=float)
+                    observation=obs_space,
+                    desired_goal=Box(low=goal_low, high=goal_high, shape=(4,), dtype=self.obs_dtype),
+                    achieved_goal=Box(low=goal_low, high=goal_high, shape=(4,), dtype=self.obs_dtype)
                 ))
             
             self.min_goal_radius = self.width / 16
@@ -127,18 +314,41 @@ class AirHockeyEnv(Env):
         self.action_space = Box(low=-1, high=1, shape=(2,), dtype=np.float32) # 2D action space
         self.reward_range = Box(low=-1, high=1) # need to make sure rewards are between 0 and 1
 
+    def initialize_buffers(self):
+        """
+        Buffers of zero_alloc: the observation, the goal observation dict around it and the multi-agent rewards.
+        """
+        self.obs_buffer = np.zeros((2, OBS_SIZE) if self.multiagent else OBS_SIZE, dtype=np.float32)
+        self.reward_buffer = np.zeros(2, dtype=np.float32)
+        if self.goal_conditioned and isinstance(self.observation_space, spaces.Dict):
+            goal_size = self.observation_space['desired_goal'].shape[0]
+            self.goal_obs = {'observation': self.obs_buffer,
+                             'desired_goal': np.zeros(goal_size, dtype=np.float32),
+                             'achieved_goal': np.zeros(goal_size, dtype=np.float32)}
+
     @staticmethod
     def from_dict(state_dict):
         return AirHockeyEnv(**state_dict)
 
+    def seed_rng(self, seed):
+        """
+        Restarts the env's random generator from seed, and hands it to the simulator.
+        """
+        self.rng = np.random.default_rng(seed)
+        self.goal_bank.clear()
+        self.simulator.seed_rng(self.rng)
+
     def reset(self, seed=None):
-        if seed is None:
-            seed = np.random.randint(0, 1e8)
-        np.random.seed(seed)
-        state_info = self.simulator.reset()
+        # without a seed, the episode continues the env's random sequence
+        if seed is not None:
+            self.seed_rng(seed)
+        state = self.simulator.reset()
+        self.current_state = state
+        if self.old_state is None or self.old_state.shape != state.shape:
+            self.old_state = np.zeros_like(state)
         # get initial observation
         self.set_goals(self.goal_radius_type)
-        obs = self.get_observation(state_info)
+        obs = self.get_observation(state, new_episode=True)
         
         self.n_timesteps_so_far += self.current_timestep
         self.current_timestep = 0
@@ -146,17 +356,58 @@ class AirHockeyEnv(Env):
         if not self.goal_conditioned:
             return obs, {}
         else:
-            return {"observation": obs, "desired_goal": self.get_desired_goal(), "achieved_goal": self.get_achieved_goal(state_info)}, {}
+            return self.get_goal_observation(obs, state), {}
+
+    def snapshot(self):
+        """
+        Captures the simulator state (see AirHockeyBox2D.snapshot, it includes the generator state), the goals,
+        the goal bank, the timestep counters and the previous state used for reward shaping.
+        """
+        goals = {}
+        for name in GOAL_ATTRS:
+            value = getattr(self, name, None)
+            goals[name] = np.copy(value) if isinstance(value, np.ndarray) else value
+        return AirHockeyEnvSnapshot(self.simulator.snapshot(),
+                                    np.array([self.current_timestep, self.n_timesteps_so_far]),
+                                    self.old_state.copy(),
+                                    goals,
+                                    self.goal_bank.get_state())
+
+    def restore(self, snapshot):
+        """
+        Puts the env back into the state captured by snapshot and returns the observation at that state.
+        """
+        state = self.simulator.restore(snapshot.simulator)
+        self.current_state = state
+        np.copyto(self.old_state, snapshot.old_state)
+        self.current_timestep, self.n_timesteps_so_far = (int(t) for t in snapshot.timesteps)
+        for name, value in snapshot.goals.items():
+            setattr(self, name, np.copy(value) if isinstance(value, np.ndarray) else value)
+        self.goal_bank.set_state(snapshot.goal_bank)
+        obs = self.get_observation(state, new_episode=True)
+        if not self.goal_conditioned:
+            return obs
+        else:
+            return self.get_goal_observation(obs, state)
+
+    def get_goal_observation(self, obs, state):
+        if self.zero_alloc:
+            goal_obs = self.goal_obs
+            desired, achieved = goal_obs['desired_goal'], goal_obs['achieved_goal']
+            desired[:2] = self.ego_goal_pos
+            if len(desired) == 4:
+                desired[2:] = self.ego_goal_vel
+            achieved[:] = state[PUCK_X:PUCK_X + len(achieved)]
+            return goal_obs
+        return {"observation": obs, "desired_goal": self.get_desired_goal(), "achieved_goal": self.get_achieved_goal(state)}
 
-    def get_achieved_goal(self, state_info):
+    def get_achieved_goal(self, state):
         if self.reward_type == 'goal_position':
-            # numpy array containing puck position and vel
-            position = np.array(state_info['pucks'][0]['position'])
-            return position.astype(float)
+            # numpy array containing puck position
+            return state[PUCK_X:PUCK_Y + 1].copy()
         elif self.reward_type == 'goal_position_velocity':
-            position = state_info['pucks'][0]['position']
-            velocity = state_info['pucks'][0]['velocity']
-            return np.array([position[0], position[1], velocity[0], velocity[1]])
+            # numpy array containing puck position and vel
+            return state[PUCK_X:PUCK_VY + 1].copy()
         else:
             raise ValueError("Invalid reward type for goal conditioned environment. " +
                              "Should be goal_position or goal_position_velocity.")
@@ -173,87 +424,38 @@ class AirHockeyEnv(Env):
                              "Should be goal_position or goal_position_velocity.")
     
     def compute_reward(self, achieved_goal, desired_goal, info):
-        # if not vectorized, convert to vector
-        single = len(achieved_goal.shape) == 1
-        if single:
-            achieved_goal = achieved_goal.reshape(1, -1)
-            desired_goal = desired_goal.reshape(1, -1)
+        # works on single goals and on (N, goal size) batches of them
         if self.goal_conditioned:
-            if achieved_goal.shape[1] == 2:
-                # return euclidean distance between the two points
-                dist = np.linalg.norm(achieved_goal[:, :2] - desired_goal[:, :2], axis=1)
-                sigmoid_scale = 2
-                radius = self.ego_goal_radius
-                reward_raw = 1 - (dist / radius) #self.max_goal_rew_radius * radius)
-                reward_mask = dist >= radius
-                reward_raw[reward_mask] = 0 # numerical stability, we will make these 0 later
-                reward = 1 / (1 + np.exp(-reward_raw * sigmoid_scale))
-                reward[reward_mask] = 0
-            else:
-                # return euclidean distance between the two points
-                dist = np.linalg.norm(achieved_goal[:, :2] - desired_goal[:, :2], axis=1)
-                # compute angle between velocities
-                denom = np.linalg.norm(achieved_goal[:, 2:], axis=1) * np.linalg.norm(desired_goal[:, 2:], axis=1) + 1e-8
-                vel_cos = np.sum(achieved_goal[:, 2:] * desired_goal[:, 2:], axis=1) / denom
-                
-                # numerical stability
-                vel_cos = np.clip(vel_cos, -1, 1)
-                vel_angle = np.arccos(vel_cos)
-                # mag difference
-                mag_diff = np.linalg.norm(achieved_goal[:, 2:] - desired_goal[:, 2:], axis=1)
-                
-                # # also return float from [0, 1] 0 being far 1 being the point
-                # # use sigmoid function because being closer is much more important than being far
-                sigmoid_scale = 2
-                radius = self.ego_goal_radius
-                reward_raw = 1 - (dist / radius)#self.max_goal_rew_radius * radius)
-                
-                mask = dist >= radius
-                reward_raw[mask] = 0 # numerical stability, we will make these 0 later
-                reward = 1 / (1 + np.exp(-reward_raw * sigmoid_scale))
-                reward_mask = dist >= radius
-                reward[reward_mask] = 0
-                position_reward = reward
-
-                vel_mag_reward = 1 - mag_diff / self.max_paddle_vel
-                
-                reward_mask = position_reward == 0
-                norm_cos_sim = (vel_cos + 1) / 2
-                vel_angle_reward = norm_cos_sim
-                vel_angle_reward[reward_mask] = 0
-                vel_mag_reward[reward_mask] = 0
-                vel_reward = (vel_angle_reward + vel_mag_reward) / 2
-                
-                # reward = (position_reward + vel_reward + vel_mag_reward) / 3
-                reward = 0.5 * position_reward + vel_reward
-            if single:
-                reward = reward[0]
-            return reward
+            return self.reward_engine.goal_reward(achieved_goal, desired_goal, self.ego_goal_radius)
         else:
             return self.get_reward(False, False, False, False, self.ego_goal_pos, self.ego_goal_radius)
 
-    def get_observation(self, state_info):
-        ego_paddle_x_pos = state_info['paddles']['paddle_ego']['position'][0]
-        ego_paddle_y_pos = state_info['paddles']['paddle_ego']['position'][1]
-        ego_paddle_x_vel = state_info['paddles']['paddle_ego']['velocity'][0]
-        ego_paddle_y_vel = state_info['paddles']['paddle_ego']['velocity'][1]
-        puck_x_pos = state_info['pucks'][0]['position'][0]
-        puck_y_pos = state_info['pucks'][0]['position'][1]
-        puck_x_vel = state_info['pucks'][0]['velocity'][0]
-        puck_y_vel = state_info['pucks'][0]['velocity'][1]
-
+    def get_observation(self, state, new_episode=False):
+        if self.observation_mode == 'pixels':
+            # drawn from the env state, new_episode restarts the frame stack
+            return self.get_pixel_observation(new_episode)
         if not self.multiagent:
-            obs = np.array([ego_paddle_x_pos, ego_paddle_y_pos, ego_paddle_x_vel, ego_paddle_y_vel, puck_x_pos, puck_y_pos, puck_x_vel, puck_y_vel])
+            if self.zero_alloc:
+                np.copyto(self.obs_buffer, state[:OBS_SIZE])
+                return self.obs_buffer
+            obs = state[:OBS_SIZE].copy()
         else:
-            alt_paddle_x_pos = state_info['paddles']['paddle_alt']['position'][0]
-            alt_paddle_y_pos = state_info['paddles']['paddle_alt']['position'][1]
-            alt_paddle_x_vel = state_info['paddles']['paddle_alt']['velocity'][0]
-            alt_paddle_y_vel = state_info['paddles']['paddle_alt']['velocity'][1]
-            
-            obs_ego = np.array([ego_paddle_x_pos, ego_paddle_y_pos, ego_paddle_x_vel, ego_paddle_y_vel,  puck_x_pos, puck_y_pos, puck_x_vel, puck_y_vel])
-            obs_alt = np.array([-alt_paddle_x_pos, -alt_paddle_y_pos, alt_paddle_x_vel, alt_paddle_y_vel, -puck_x_pos, -puck_y_pos, -puck_x_vel, -puck_y_vel])
-            obs = (obs_ego, obs_alt)
+            # (2, 8), the ego and alt observations, each in its own player's frame
+            obs = self.obs_buffer if self.zero_alloc else np.empty((2, OBS_SIZE))
+            obs[0] = state[:OBS_SIZE]
+            # the indices are valid, clip mode takes them without an intermediate buffer
+            np.negative(state.take(self.alt_obs_index, out=self.alt_obs_scratch, mode='clip'), out=obs[1])
         return obs
+
+    def get_joint_state(self, state, out):
+        """
+        Writes state as seen by both players into out, a (2, state size) array: row 0 is state itself,
+        row 1 the state in the alt player's frame, where the alt paddle is the ego paddle and the table is
+        turned around. Rewards, termination and observations then work the same for both rows.
+        """
+        out[0] = state
+        np.negative(state.take(self.alt_state_index, out=out[1], mode='clip'), out=out[1])
+        return out
     
     def set_goals(self, goal_radius_type, ego_goal_pos=None, alt_goal_pos=None):
         if self.goal_conditioned:
@@ -273,21 +475,23 @@ class AirHockeyEnv(Env):
                 if self.multiagent:
                     self.alt_goal_radius = 0.16 * self.width
             if ego_goal_pos is None:
+                # the bank holds unit uniforms, the ranges depend on the goal radius which can change over training
+                goals = self.goal_bank.next()
                 min_y = self.table_y_left + self.ego_goal_radius
                 max_y = self.table_y_right - self.ego_goal_radius
                 max_x = 0 - self.ego_goal_radius
                 min_x = self.table_x_top + self.ego_goal_radius
-                self.ego_goal_pos = np.random.uniform(low=(min_x, min_y), high=(max_x, max_y))
+                self.ego_goal_pos = scale_uniform(goals['ego_goal_pos'], (min_x, min_y), (max_x, max_y))
                 
                 min_x_vel = self.goal_min_x_velocity
                 max_x_vel = self.goal_max_x_velocity
                 min_y_vel = self.goal_min_y_velocity
                 max_y_vel = self.goal_max_y_velocity
                 
-                self.ego_goal_vel = np.random.uniform(low=(min_x_vel, min_y_vel), high=(max_x_vel, max_y_vel))
+                self.ego_goal_vel = scale_uniform(goals['ego_goal_vel'], (min_x_vel, min_y_vel), (max_x_vel, max_y_vel))
                 
                 if self.multiagent:
-                    self.alt_goal_pos = np.random.uniform(low=(0 - self.alt_goal_radius, self.table_y_left), high=(self.table_x_bot + self.alt_goal_radius, self.table_y_right))
+                    self.alt_goal_pos = scale_uniform(goals['alt_goal_pos'], (0 - self.alt_goal_radius, self.table_y_left), (self.table_x_bot + self.alt_goal_radius, self.table_y_right))
             else:
                 self.ego_goal_pos = ego_goal_pos
                 if self.multiagent:
@@ -298,59 +502,33 @@ class AirHockeyEnv(Env):
             self.alt_goal_pos = None
             self.alt_goal_radius = None
     
+    def sample_goals(self, n):
+        """
+        Samples the unit uniforms of n goals at once, see ResetBank and set_goals.
+        """
+        goals = {'ego_goal_pos': self.rng.random((n, 2)), 'ego_goal_vel': self.rng.random((n, 2))}
+        if self.multiagent:
+            goals['alt_goal_pos'] = self.rng.random((n, 2))
+        return goals
+
     # def convert_to_box2d_coords(self, x, y):
     #     return (x, -y)
 
-    def has_finished(self, state_info, multiagent=False):
-        truncated = False
-        terminated = False
-        puck_within_alt_home = False
-        puck_within_home = False
-
-        if self.current_timestep > self.max_timesteps:
-            terminated = True
-        else:
-            if self.terminate_on_out_of_bounds:
-                # check if we hit any walls or are above the middle of the board
-                if state_info['paddles']['paddle_ego']['position'][0] < 0 + self.paddle_radius or \
-                    state_info['paddles']['paddle_ego']['position'][0] > self.table_x_bot - self.paddle_radius or \
-                    state_info['paddles']['paddle_ego']['position'][1] > self.table_y_right - self.paddle_radius or \
-                    state_info['paddles']['paddle_ego']['position'][1] < self.table_y_left + self.paddle_radius:
-                    truncated = True
-
-        # confusing, but we need to swap x and y for this function
-        bottom_center_point = np.array([self.table_x_bot, 0])
-        top_center_point = np.array([self.table_x_top, 0])
-        puck_within_home = self.is_within_home_region(bottom_center_point, state_info['pucks'][0]['position'])
-        puck_within_alt_home = self.is_within_home_region(top_center_point, state_info['pucks'][0]['position'])
-        
-        if self.terminate_on_enemy_goal:
-            if not terminated and puck_within_home:
-                truncated = True
-
-        if multiagent:
-            terminated = terminated or truncated or puck_within_alt_home or puck_within_home
-            truncated = False
-            
-        if self.terminate_on_puck_stop:
-            if not truncated and np.linalg.norm(state_info['pucks'][0]['velocity']) < 0.01:
-                truncated = True
+    def get_goal_args(self):
+        # goal arguments of RewardEngine.compute / termination, None for tasks without goals
+        return self.ego_goal_pos, getattr(self, 'ego_goal_vel', None), self.ego_goal_radius
 
-        puck_within_ego_goal = False
+    def has_finished(self, state, multiagent=False):
+        goal_pos, _, goal_radius = self.get_goal_args()
+        result = self.reward_engine.termination(state, self.current_timestep, goal_pos, goal_radius, multiagent)
         puck_within_alt_goal = False
-
-        if self.goal_conditioned:
-            if self.is_within_goal_region(self.ego_goal_pos, state_info['pucks'][0]['position'], self.ego_goal_radius):
-                puck_within_ego_goal = True
-            if multiagent:
-                if self.is_within_goal_region(self.alt_goal_pos, state_info['pucks'][0]['position'], self.alt_goal_radius):
-                    puck_within_alt_goal = True
-
-        return terminated, truncated, puck_within_home, puck_within_alt_home, puck_within_ego_goal, puck_within_alt_goal
+        if self.goal_conditioned and multiagent:
+            puck_within_alt_goal = self.is_within_goal_region(self.alt_goal_pos, state[PUCK_X:PUCK_Y + 1], self.alt_goal_radius)
+        return bool(result['terminated']), bool(result['truncated']), bool(result['puck_within_home']), \
+            bool(result['puck_within_alt_home']), bool(result['puck_within_goal']), puck_within_alt_goal
     
     def get_goal_region_reward(self, point, position, radius, discrete=True) -> float:
-        point = np.array([point[0], point[1]])
-        dist = np.linalg.norm(position - point)
+        dist = math.hypot(position[0] - point[0], position[1] - point[1])
         
         if discrete:
             return 1.0 if dist < radius else 0.0
@@ -358,7 +536,7 @@ class AirHockeyEnv(Env):
         # use sigmoid function because being closer is much more important than being far
         sigmoid_scale = 2
         reward_raw = 1 - (dist / radius)
-        reward = 1 / (1 + np.exp(-reward_raw * sigmoid_scale))
+        reward = 1 / (1 + math.exp(-reward_raw * sigmoid_scale))
         reward = 0 if dist >= radius else reward
         return reward
 
@@ -369,176 +547,115 @@ class AirHockeyEnv(Env):
         return self.get_goal_region_reward(point, position, 0.16 * self.width, discrete=discrete)
     
     def is_within_goal_region(self, point, position, radius) -> bool:
-        point = np.array([point[0], point[1]])
-        dist = np.linalg.norm(position - point)
+        dist = math.hypot(position[0] - point[0], position[1] - point[1])
         return dist < radius
     
     def is_within_home_region(self, point, position) -> bool:
         return self.is_within_goal_region(point, position, 0.16 * self.width)
-    
-    def puck_reached(self, state_info):
-        puck_pos = state_info['pucks'][0]['position']
-        paddle_pos = state_info['paddles']['paddle_ego']['position']
-        dist = np.linalg.norm(np.array(puck_pos) - np.array(paddle_pos))
-        return dist <= self.paddle_radius + self.puck_radius
 
-    def get_base_reward(self, state_info, hit_a_puck, puck_within_home, 
+    def get_base_reward(self, state, hit_a_puck, puck_within_home, 
                        puck_within_alt_home, puck_within_goal,
                        goal_pos, goal_radius):
-        if self.reward_type == 'goal_discrete':
-            return self.get_goal_region_reward(goal_pos, state_info['pucks'][0]['position'], 
-                                                 goal_radius, discrete=True)
-        elif self.reward_type == 'goal_position' or self.reward_type == 'goal_position_velocity':
-            # return self.get_goal_region_reward(goal_pos, self.pucks[self.puck_names[0]][0], 
-            #                                      goal_radius, discrete=False)
-            return self.compute_reward(self.get_achieved_goal(self.current_state), self.get_desired_goal(), {})
-        elif self.reward_type == 'puck_height':
-            reward = -state_info['pucks'][0]['position'][0]
-            # min acceptable reward is 0 height and above
-            reward = max(reward, 0)
-            # let's normalize reward w.r.t. the top half length of the table
-            # aka within the range [0, self.length / 2]
-            max_rew = self.length / 2
-            min_rew = 0
-            reward = (reward - min_rew) / (max_rew - min_rew)
-            return reward
-        elif self.reward_type == 'puck_vel':
-            # reward for positive velocity towards the top of the board
-            reward = -state_info['pucks'][0]['velocity'][0]
-
-            max_rew = 2 # estimated max vel
-            min_rew = 0  # min acceptable good velocity
-
-            if reward < min_rew:
-                return 0
-            
-            reward = min(reward, max_rew)
-            reward = (reward - min_rew) / (max_rew - min_rew)
-            return reward
-        elif self.reward_type == 'puck_catch':
-            # reward for getting close to the puck, but make sure not to displace it
-            puck_pos = state_info['pucks'][0]['position']
-            paddle_pos = state_info['paddles']['paddle_ego']['position']
-            dist = np.linalg.norm(np.array(puck_pos) - np.array(paddle_pos))
-            max_dist = 0.16 * self.width
-            reward = 1 - (dist / max_dist)
-            reward = max(reward, 0)
-            return reward
-        elif self.reward_type == 'puck_reach':
-            puck_pos = state_info['pucks'][0]['position']
-            paddle_pos = state_info['paddles']['paddle_ego']['position']
-            dist = np.linalg.norm(np.array(puck_pos) - np.array(paddle_pos))
-            if dist <= self.paddle_radius + self.puck_radius:
-                reward = 1
-            else:
-                reward = 0
-            return reward
-        elif self.reward_type == 'puck_touch':
-            reward = 1 if hit_a_puck else 0
-            return reward
-        elif self.reward_type == 'alt_home':
-            reward = 1 if puck_within_alt_home else 0
-            return reward
-        else:
-            raise ValueError("Invalid reward type defined in config.")
-        
-    def get_reward_shaping(self, state_info):
-        additional_rew = 0.0
-        
-        # small negative reward for changing direction
-        if self.current_timestep > 0:
-            old_vel = self.old_state['paddles']['paddle_ego']['velocity']
-            new_vel = state_info['paddles']['paddle_ego']['velocity']
-            vel_unit = old_vel / (np.linalg.norm(old_vel) + 1e-8)
-            new_vel_unit = new_vel / (np.linalg.norm(new_vel) + 1e-8)
-            cosine_sim = np.dot(vel_unit, new_vel_unit) / (np.linalg.norm(vel_unit) * np.linalg.norm(new_vel_unit) + 1e-8)
-            norm_cosine_sim = (cosine_sim + 1) / 2
-            max_change_dir_rew = self.direction_change_rew
-            direction_rew = max_change_dir_rew * (1 - norm_cosine_sim)
-            additional_rew += direction_rew
-            
-        # small negative reward for moving too fast in horizontal direction
-        max_vel = self.max_paddle_vel
-        max_vel_rew = self.horizontal_vel_rew
-        normalized_y_vel = np.abs(state_info['paddles']['paddle_ego']['velocity'][1]) / max_vel
-        additional_rew += max_vel_rew * normalized_y_vel
-        
-        # negative penalty for diagonal motion
-        # angle of vector will be close to % 45 degrees if moving diagonally
-        angle = np.arctan2(state_info['paddles']['paddle_ego']['velocity'][1], state_info['paddles']['paddle_ego']['velocity'][0])
-        angle = np.abs(angle)
-        # check if sufficiently close to pi/4, 3pi/4, 5pi/4, 7pi/4
-        threshold = np.pi / 12
-        # check if between (pi/4 - pi/12, pi/4 + pi/12), ...
-        if np.abs(angle - -np.pi / 4) < threshold or np.abs(angle - 3 * -np.pi / 4) < threshold or \
-            np.abs(angle - np.pi / 4) < threshold or np.abs(angle - 3 * np.pi / 4) < threshold:
-            additional_rew += self.diagonal_motion_rew
+        _, goal_vel, _ = self.get_goal_args()
+        return float(self.reward_engine.base_reward_fn(state, hit_a_puck=hit_a_puck, puck_within_alt_home=puck_within_alt_home,
+                                                       goal_pos=goal_pos, goal_vel=goal_vel, goal_radius=goal_radius))
         
-        # small positive reward for keeping still
-        if np.linalg.norm(state_info['paddles']['paddle_ego']['velocity']) < 0.01:
-            additional_rew += self.stand_still_rew
-            
-        # determine if close to walls
-        if self.wall_bumping_rew != 0:
-            bump_right = state_info['paddles']['paddle_ego']['position'][1] > self.table_y_right - 2 * self.paddle_radius
-            bump_left = state_info['paddles']['paddle_ego']['position'][1] < self.table_y_left + 2 * self.paddle_radius
-            bump_top = state_info['paddles']['paddle_ego']['position'][0] < 0 + 4 * self.paddle_radius
-            bump_bottom = state_info['paddles']['paddle_ego']['position'][0] > self.table_x_bot - 4 * self.paddle_radius
-            if bump_left or bump_right or bump_top or bump_bottom:
-                additional_rew += self.wall_bumping_rew
-        
-        # todo: figure out how to determine if puck was hit by object.
-        # contacts, contact_names = self.get_contacts()
-        # hit_a_puck = self.respond_contacts(contact_names)
-        # # hacky way of determing if puck was hit below TODO: fix later!
-        # hit_a_puck = np.any(contacts) # check if any are true
-        return additional_rew
+    def get_reward_shaping(self, state):
+        return float(self.reward_engine.shaping(state, self.old_state, self.current_timestep)['shaping'])
         
     
-    def get_joint_reward(self, ego_hit_a_puck, alt_hit_a_puck, 
-                         puck_within_ego_home, puck_within_alt_home,
-                         puck_within_ego_goal, puck_within_alt_goal) -> tuple[float, float]:
-        ego_reward = self.get_reward(ego_hit_a_puck, puck_within_ego_home, 
-                                     puck_within_alt_home, puck_within_ego_goal,
-                                     self.ego_goal_pos, self.ego_goal_radius)
-        alt_reward = self.get_reward(alt_hit_a_puck, puck_within_alt_home,
-                                     puck_within_ego_home, puck_within_alt_goal,
-                                     self.alt_goal_pos, self.alt_goal_radius)
-        return ego_reward, alt_reward
+    def get_joint_reward(self, joint_state, joint_old_state, ego_hit_a_puck, alt_hit_a_puck) -> tuple[tuple, tuple]:
+        """
+        Rewards and termination flags of both players, each from its own row of the joint state.
+
+        Args:
+            joint_state (numpy.ndarray): (2, state size) state after the step, see get_joint_state.
+            joint_old_state (numpy.ndarray): the same before the step.
+            ego_hit_a_puck (bool): whether the ego paddle hit a puck.
+            alt_hit_a_puck (bool): whether the alt paddle hit a puck.
+
+        Returns:
+            (tuple, tuple): the ego and alt results of self.transition (see RewardEngine.make_transition_fn):
+            reward, terminated, truncated, puck_within_home, puck_within_alt_home, each in its player's frame.
+        """
+        # two single state calls, a batch of two is slower than the numpy scalar path
+        ego_result = self.transition(joint_state[0], joint_old_state[0], self.current_timestep, ego_hit_a_puck,
+                                     None, None, None)
+        alt_result = self.transition(joint_state[1], joint_old_state[1], self.current_timestep, alt_hit_a_puck,
+                                     None, None, None)
+        return ego_result, alt_result
     
-    def step(self, action):
-        if not self.multiagent:
-            obs, reward, is_finished, truncated, info = self.single_agent_step(action)
-            if not self.goal_conditioned:
-                return obs, reward, is_finished, truncated, info
-            else:
-                return {"observation": obs, "desired_goal": self.get_desired_goal(), "achieved_goal": self.get_achieved_goal(self.current_state)}, reward, is_finished, truncated, info
-        else:
-            return self.multi_step(action)
+    def goal_step(self, action):
+        obs, reward, is_finished, truncated, info = self.single_agent_step(action)
+        return self.get_goal_observation(obs, self.current_state), reward, is_finished, truncated, info
 
     def single_agent_step(self, action) -> tuple[np.ndarray, float, bool, bool, dict]:
-        next_state = self.simulator.get_transition(action)
+        # the simulator overwrites its state buffer in place, so keep a copy of the previous state
         if self.current_timestep > 0:
-            self.old_state = self.current_state
+            np.copyto(self.old_state, self.current_state)
+        next_state = self.simulator.get_transition(action)
         self.current_state = next_state
 
-        hit_a_puck = False
-        is_finished, truncated, puck_within_home, puck_within_alt_home, puck_within_goal, _ = self.has_finished(next_state)
-        if not truncated:
-            reward = self.get_base_reward(next_state, hit_a_puck, puck_within_home, 
-                                     puck_within_alt_home, puck_within_goal,
-                                     self.ego_goal_pos, self.ego_goal_radius)
-        else:
-            reward = self.truncate_rew
-        reward += self.get_reward_shaping(next_state)
-        if self.reward_type == 'puck_reach':
-            puck_reached_successfully = self.puck_reached(next_state)
-            if not is_finished and puck_reached_successfully:
-                is_finished = True
+        goal_pos, goal_vel, goal_radius = self.get_goal_args()
+        contact_events = self.simulator.contact_events
+        reward, is_finished, truncated, _, _ = self.transition(next_state, self.old_state, self.current_timestep,
+                                                               contact_events.ego_hit_puck, goal_pos, goal_vel, goal_radius)
+        reward = float(reward)
+        is_finished = bool(is_finished)
+        truncated = bool(truncated)
         self.current_timestep += 1
         
+        # info stays empty on steps without contacts, the vec envs only send non-empty infos back
+        info = {}
+        if contact_events.n:
+            info['contacts'] = contact_events.get_events(copy=not self.zero_alloc)
+        if is_finished or truncated:
+            info['hit_counts'] = contact_events.get_hit_counts()
         obs = self.get_observation(next_state)
-        return obs, reward, is_finished, truncated, {}
+        return obs, reward, is_finished, truncated, info
     
-    def multi_step(self, joint_action):
-        raise NotImplementedError("Multi-agent step function not implemented yet. But shouldn't take much work, it is mostly copy-pasting. But need to do specific rewards per player")
+    def multi_step(self, joint_action) -> tuple[np.ndarray, np.ndarray, bool, bool, dict]:
+        """
+        Steps both paddles at once, so one policy can play both sides (self-play).
+
+        Args:
+            joint_action (numpy.ndarray): (2, 2) ego and alt actions, each in its own player's frame.
+
+        Returns:
+            (2, 8) observations and (2,) rewards, ego first and each in its own player's frame, the
+            terminated and truncated flags, shared by both players, and info (with info['winner'] when
+            the episode ends).
+        """
+        if self.current_timestep > 0:
+            np.copyto(self.old_state, self.current_state)
+        joint_action = np.asarray(joint_action)
+        # the alt action is turned back into env coordinates (a tuple, negating the row would allocate)
+        next_state = self.simulator.get_transition(joint_action[0], (-joint_action[1, 0], -joint_action[1, 1]))
+        self.current_state = next_state
+
+        contact_events = self.simulator.contact_events
+        joint_state = self.get_joint_state(next_state, self.joint_state)
+        joint_old_state = self.get_joint_state(self.old_state, self.joint_old_state)
+        ego_result, alt_result = self.get_joint_reward(joint_state, joint_old_state, contact_events.ego_hit_puck,
+                                                       contact_events.alt_hit_puck)
+        ego_reward, ego_terminated, ego_truncated, puck_within_home, puck_within_alt_home = ego_result
+        alt_reward, alt_terminated, alt_truncated, _, _ = alt_result
+        if self.zero_alloc:
+            reward = self.reward_buffer
+            reward[0], reward[1] = ego_reward, alt_reward
+        else:
+            reward = np.array([ego_reward, alt_reward])
+        # the episode ends for both players as soon as it ends for either
+        is_finished = bool(ego_terminated or alt_terminated)
+        truncated = bool(ego_truncated or alt_truncated) and not is_finished
+        self.current_timestep += 1
+
+        info = {}
+        if contact_events.n:
+            info['contacts'] = contact_events.get_events(copy=not self.zero_alloc)
+        if is_finished or truncated:
+            info['hit_counts'] = contact_events.get_hit_counts()
+            # 0: the puck reached the alt home (ego scored), 1: the ego home (alt scored), -1: neither
+            info['winner'] = 0 if puck_within_alt_home else 1 if puck_within_home else -1
+        obs = self.get_observation(next_state)
+        return obs, reward, is_finished, truncated, info
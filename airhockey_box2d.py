@@ -1,588 +1,890 @@
-from Box2D.b2 import world
-from Box2D import (b2CircleShape, b2FixtureDef, b2LoopShape, b2PolygonShape,
-                   b2_dynamicBody, b2_staticBody, b2Filter, b2Vec2)
-import numpy as np
-
-
-class AirHockeyBox2D:
-    def __init__(self,
-                 num_paddles, 
-                 num_pucks, 
-                 num_blocks, 
-                 num_obstacles, 
-                 num_targets, 
-                 absorb_target, 
-                 length, 
-                 width,
-                 puck_radius, 
-                 paddle_radius, 
-                 block_width,
-                 max_force_timestep, 
-                 force_scaling, 
-                 paddle_damping, 
-                 puck_damping,
-                 render_size, 
-                 render_masks=False, 
-                 gravity=-5,
-                 paddle_density=1000,
-                 puck_density=250,
-                 block_density=1000,
-                 max_paddle_vel=2,
-                 time_frequency=20):
-
-        # task specific params
-        self.num_pucks = num_pucks
-        self.multiagent = num_paddles > 1
-        self.num_blocks = num_blocks
-        self.num_obstacles = num_obstacles
-        self.num_targets = num_targets
-        
-        # physics / world params
-        self.length, self.width = length, width
-        self.num_paddles = num_paddles
-        self.paddle_radius = paddle_radius
-        self.puck_radius = puck_radius
-        self.block_width = block_width  
-        self.max_force_timestep = max_force_timestep
-        self.time_frequency = time_frequency
-        self.time_per_step = 1 / self.time_frequency
-        self.force_scaling = force_scaling
-        self.absorb_target = absorb_target
-        self.paddle_damping = paddle_damping
-        self.puck_damping = puck_damping
-        self.gravity = gravity
-        self.puck_min_height = (-length / 2) + (length / 3)
-        self.paddle_max_height = 0
-        self.block_min_height = 0
-        self.max_speed_start = width
-        self.min_speed_start = -width
-        self.paddle_density = paddle_density
-        self.puck_density = puck_density
-        self.block_density = block_density
-        # these assume 2d, in 3d since we have height it would be higher mass
-        self.paddle_mass = self.paddle_density * np.pi * self.paddle_radius ** 2
-        self.puck_mass = self.puck_density * np.pi * self.puck_radius ** 2
-
-        # these 2 will depend on the other parameters
-        self.max_paddle_vel = max_paddle_vel # m/s. This will be dependent on the robot arm
-        # compute maximum force based on max paddle velocity
-        max_a = self.max_paddle_vel / self.time_per_step
-        max_f = self.paddle_mass * max_a
-        # assume maximum force transfer
-        puck_max_a = max_f / self.puck_mass
-        self.max_puck_vel = puck_max_a * self.time_per_step
-        self.world = world(gravity=(0, self.gravity), doSleep=True) # gravity is negative usually
-
-        # box2d visualization params (but the visualization is done in the Render file)
-        self.ppm = render_size / self.width
-        self.render_width = int(render_size)
-        self.render_length = int(self.ppm * self.length)
-        self.render_masks = render_masks
-        
-        self.table_x_min = -self.width / 2
-        self.table_x_max = self.width / 2
-        self.table_y_min = -self.length / 2
-        self.table_y_max = self.length / 2
-        
-        self.min_goal_radius = self.width / 16
-        self.max_goal_radius = self.width / 4
-        
-        self.metadata = {}
-        
-        # creating the ground -- need to only call once! otherwise it can be laggy
-        self.ground_body = self.world.CreateBody(
-            shapes=b2LoopShape(vertices=[(self.table_x_min, self.table_y_min),
-                                         (self.table_x_min, self.table_y_max), 
-                                         (self.table_x_max, self.table_y_max),
-                                         (self.table_x_max, self.table_y_min)]),
-        )
-        self.reset()
-
-    @staticmethod
-    def from_dict(state_dict):
-        return AirHockeyBox2D(**state_dict)
-
-    def reset(self, 
-              seed=None, 
-              ego_goal_pos=None,
-              alt_goal_pos=None,
-              object_state_dict=None, 
-              type_instance_dict=None, 
-              max_count_dict=None):
-
-        if seed is None:
-            seed = np.random.randint(10e8)
-        np.random.seed(seed)
-
-        if hasattr(self, "object_dict"):
-            for body in self.object_dict.values():
-                self.world.DestroyBody(body)
-
-        if type(self.gravity) == list:
-            self.world.gravity = (0, np.random.uniform(low=self.gravity[0], high=self.gravity[1]))
-
-        self.paddles = dict()
-        self.pucks = dict()
-        self.blocks = dict()
-        self.obstacles = dict()
-        self.targets = dict()
-
-        self.paddle_attrs = None
-        self.target_attrs = None
-
-        self.create_world_objects()
-        state_info = self.get_current_state()
-        return state_info
-    
-    def convert_from_box2d_coords(self, state_info):
-        # traverse through state_info until we find tuple, then correct
-        for key, value in state_info.items():
-            if type(value) == list:
-                for i in range(len(value)):
-                    for key2, value2 in value[i].items():
-                        if type(value2) == tuple:
-                            state_info[key][i][key2] = (-value2[1], value2[0])
-            else:
-                for key2, value2 in value.items():
-                    for key3, value3 in value2.items():
-                        state_info[key][key2][key3] = (-value3[1], value3[0])
-        return state_info
-
-    def get_current_state(self):
-
-        state_info = {}
-        
-        ego_paddle_x_pos = self.paddles['paddle_ego'][0].position[0]
-        ego_paddle_y_pos = self.paddles['paddle_ego'][0].position[1]
-        ego_paddle_x_vel = self.paddles['paddle_ego'][0].linearVelocity[0]
-        ego_paddle_y_vel = self.paddles['paddle_ego'][0].linearVelocity[1]
-        
-        state_info['paddles'] = {'paddle_ego': {'position': (ego_paddle_x_pos, ego_paddle_y_pos),
-                                            'velocity': (ego_paddle_x_vel, ego_paddle_y_vel)}}
-
-        puck_x_pos = self.pucks[self.puck_names[0]][0].position[0]
-        puck_y_pos = self.pucks[self.puck_names[0]][0].position[1]
-        puck_x_vel = self.pucks[self.puck_names[0]][0].linearVelocity[0]
-        puck_y_vel = self.pucks[self.puck_names[0]][0].linearVelocity[1]
-        
-        pucks_info = []
-        for puck_name in self.puck_names:
-            puck_x_pos = self.pucks[puck_name][0].position[0]
-            puck_y_pos = self.pucks[puck_name][0].position[1]
-            puck_x_vel = self.pucks[puck_name][0].linearVelocity[0]
-            puck_y_vel = self.pucks[puck_name][0].linearVelocity[1]
-            pucks_info.append({'position': (puck_x_pos, puck_y_pos), 
-                               'velocity': (puck_x_vel, puck_y_vel)})
-        
-        state_info['pucks'] = pucks_info
-        return self.convert_from_box2d_coords(state_info)
-
-    def create_world_objects(self):
-        for i in range(self.num_pucks):
-            name, puck_attrs = self.create_puck(i, min_height=self.puck_min_height)
-            self.pucks[name] = puck_attrs
-
-        for i in range(self.num_blocks):
-            name, block_attrs = self.create_block_type(i, name_type = "Block", dynamic=False, min_height = self.block_min_height)
-            self.blocks[name] = block_attrs
-
-        for i in range(self.num_obstacles): # could replace with arbitary polygons
-            name, obs_attrs = self.create_block_type(i, name_type = "Obstacle", angle=np.random.rand() * np.pi, dynamic = False, color=(0, 127, 127), min_height = self.block_min_height)
-            self.obstacles[name] = obs_attrs
-
-        for i in range(self.num_targets):
-            name, target_attrs = self.create_block_type(i, name_type = "Target", color=(255, 255, 0))
-            self.targets[name] = target_attrs
-        
-        name, paddle_attrs = self.create_paddle(i, name="paddle_ego", color=(0, 255, 0))
-        self.paddles[name] = paddle_attrs
-
-        if self.multiagent:
-            name_alt, paddle_alt_attrs = self.create_paddle(i=i, name="paddle_alt", color=(0, 255, 0), home_paddle=False)
-            self.paddles[name_alt] = paddle_alt_attrs
-
-        # names and object dict
-        self.puck_names = list(self.pucks.keys())
-        self.puck_names.sort()
-        self.paddle_names = list(self.paddles.keys())
-        self.block_names = list(self.blocks.keys())
-        self.block_names.sort()
-        self.obstacle_names = list(self.obstacles.keys())
-        self.obstacle_names.sort()
-        self.target_names = list(self.targets.keys())
-        self.target_names.sort()
-        self.object_dict = {**{name: self.pucks[name][0] for name in self.pucks.keys()},
-                            **{name: self.paddles[name][0] for name in self.paddles.keys()},
-                             **{name: self.blocks[name][0] for name in self.blocks.keys()},
-                             **{name: self.targets[name][0] for name in self.targets.keys()},
-                             **{name: self.obstacles[name][0] for name in self.obstacles.keys()},
-                             }
-
-    def create_paddle(self, i, 
-                        name=None, 
-                        color=(127, 127, 127), 
-                        vel=None, 
-                        pos=None, 
-                        collidable=True, 
-                        home_paddle=True):
-        if not self.multiagent:
-            if pos is None:
-                pos = (0, -self.length / 2 + 0.01) # start at home region
-            # below code is for a random position
-            # if pos is None: pos = ((np.random.rand() - 0.5) * 2 * (self.table_x_max), 
-            #                        max(min_height,-self.length / 2) + (np.random.rand() * ((min(max_height,self.length / 2)) - (max(min_height,-self.length / 2)))))
-        else:
-            if pos is None: 
-                if home_paddle:
-                    pos = (0, -self.length / 2 + 0.01)
-                else:
-                    pos = (0, self.length / 2 - 0.01)
-                    
-        if vel is None: 
-            vel = (np.random.rand() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start,
-                   np.random.rand() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start)
-        radius = self.paddle_radius
-        paddle = self.world.CreateDynamicBody(
-            fixtures=b2FixtureDef(
-                shape=b2CircleShape(radius=radius),
-                density=self.paddle_density,
-                restitution = 1.0,
-                filter=b2Filter (maskBits=1,
-                                 categoryBits=1 if collidable else 0)),
-            bullet=True,
-            position=pos,
-            linearDamping=self.paddle_damping
-        )
-        color =  color # randomize color
-        default_paddle_name = "paddle" + str(i)
-        paddle.gravityScale = 0
-        return ((default_paddle_name, (paddle, color)) if name is None else (name, (paddle, color)))
-
-    # puck = bouncing ball
-    def create_puck(self, i, 
-                        name=None, 
-                        color=(127, 127, 127), 
-                        radius=-1,
-                        vel=None, 
-                        pos=None, 
-                        collidable=True,
-                        min_height=-30,
-                        max_height=30):
-        if not self.multiagent:
-            # then we want it to start at the top, which is max_height, 0
-            if pos is None: 
-                x_pos = np.random.uniform(low=-self.width / 3, high=self.width / 3) # doesnt spawn at edges
-                # (np.random.rand() - 0.5) * 2 * (self.table_x_max)
-                pos = (x_pos,
-                       min(max_height, self.length / 2) - 0.01)
-        else: 
-            if pos is None: 
-                pos = ((np.random.rand() - 0.5) * 2 * (self.table_x_max), 
-                       max(min_height,-self.length / 2) + (np.random.rand() * ((min(max_height,self.length / 2)) - (max(min_height,-self.length / 2)))))
-        # print(name, pos, min_height, max_height)
-        if not self.multiagent:
-            if vel is None: 
-                vel = (2 * np.random.rand() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start,
-                       -0.7)
-                # with 1/4th p, add x vel
-                if np.random.rand() < 0.25:
-                    # vel = (2 * np.random.rand() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start, -1)
-                    vel = (0, -1)
-                else:
-                    vel = (0, -1)
-        else:
-            if vel is None: 
-                vel = (np.random.rand() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start,
-                       10 * np.random.rand() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start)
-        if radius < 0: 
-            # radius = max(1, np.random.rand() * (self.width/ 2))
-            # radius = self.width / 5.325
-            radius = self.puck_radius
-        puck = self.world.CreateDynamicBody(
-            fixtures=b2FixtureDef(
-                shape=b2CircleShape(radius=radius),
-                density=self.puck_density,
-                restitution = 1.0,
-                filter=b2Filter (maskBits=1,
-                                 categoryBits=1 if collidable else 0)),
-            bullet=True,
-            position=pos,
-            linearVelocity=vel,
-            linearDamping=self.puck_damping
-        )
-        color =  color # randomize color
-        puck_name = "puck" + str(i)
-        return ((puck_name, (puck, color)) if name is None else (name, (puck, color)))
-
-    def create_block_type(self, i, name=None,name_type=None, color=(127, 127, 127), width=-1, height=-1, vel=None, pos=None, dynamic=True, angle=0, angular_vel=0, fixed_rotation=False, collidable=True, min_height=-30):
-        if pos is None: pos = ((np.random.rand() - 0.5) * 2 * (self.table_x_max), min_height + (np.random.rand() * (self.length - (min_height + self.length / 2))))
-        if vel is None: vel = ((np.random.rand() - 0.5) * 2 * (self.width),(np.random.rand() - 0.5) * 2 * (self.length))
-        if not dynamic: vel = np.zeros((2,))
-        if width < 0: width = max(0.75, np.random.rand() * 3)
-        if height < 0: height = max(0.5, np.random.rand())
-        # TODO: possibly create obstacles of arbitrary shape
-        vertices = [([-width / 2, -height / 2]), ([width / 2, -height / 2]), ([width / 2, height / 2]), ([-width / 2, height / 2])]
-        block_name  = name_type # Block, Obstacle, Target
-
-        fixture = b2FixtureDef(
-            shape=b2PolygonShape(vertices=vertices),
-            density=self.block_density,
-            restitution=0.1,
-            filter=b2Filter (maskBits=1,
-                                 categoryBits=1 if collidable else 0),
-        )
-
-        body = self.world.CreateBody(type=b2_dynamicBody if dynamic else b2_staticBody,
-                                    position=pos,
-                                    linearVelocity=vel,
-                                    angularVelocity=angular_vel,
-                                    angle=angle,
-                                    fixtures=fixture,
-                                    fixedRotation=fixed_rotation,
-                                    )
-        color =  color # randomize color
-        block_name = block_name + str(i)
-        return (block_name if name is None else name), (body, color)
-    
-    def convert_to_box2d_coords(self, action):
-        action = np.array((action[1], -action[0]))
-        return action
-
-    # s, a -> s'
-    def get_transition(self, action, other_action=None):
-        if self.multiagent:
-            return self.get_multiagent_transition(action, other_action)
-        else:
-            action = self.convert_to_box2d_coords(action)
-            return self.get_singleagent_transition(action)
-
-    def get_singleagent_transition(self, action):
-        
-        # check if out of bounds and correct
-        pos = [self.paddles['paddle_ego'][0].position[0], self.paddles['paddle_ego'][0].position[1]]
-        if pos[1] > 0 - 3 * self.paddle_radius:
-            action[1] = min(action[1], 0)
-        
-        # action is delta position
-        # let's use simple time-optimal control to figure out the force to apply
-        delta_pos = np.array([action[0], action[1]])
-        # if delta_pos[0] == 0 and delta_pos[1] == 0:
-        #     force = np.array([0, 0])
-        # else:
-        current_vel = np.array([self.paddles['paddle_ego'][0].linearVelocity[0], self.paddles['paddle_ego'][0].linearVelocity[1]])
-        accel = [2 * (delta_pos[0] - current_vel[0] * self.time_per_step) / self.time_per_step ** 2,
-                2 * (delta_pos[1] - current_vel[1] * self.time_per_step) / self.time_per_step ** 2]
-        # force = np.array([self.paddles['paddle_ego'][0].mass * accel[0], self.paddles['paddle_ego'][0].mass * accel[1]])
-        
-        # # first let's determine velocity
-        vel = delta_pos / self.time_per_step
-        vel_mag = np.linalg.norm(vel)
-        vel_unit = vel / (vel_mag + 1e-8)
-
-        if vel_mag > self.max_paddle_vel:
-            vel = vel_unit * self.max_paddle_vel
-
-        force = self.paddles['paddle_ego'][0].mass * vel / self.time_per_step
-        force_mag = np.linalg.norm(force)
-        force_unit = force / (force_mag + 1e-8)
-        if force_mag > self.max_force_timestep:
-            force = force_unit * self.max_force_timestep
-            
-        force = force.astype(float)
-        if self.paddles['paddle_ego'][0].position[1] > 0: 
-            new_force = self.force_scaling * self.paddles['paddle_ego'][0].mass * action[1]
-            if new_force < -self.max_force_timestep:
-                new_force = -self.max_force_timestep
-            force[1] = min(new_force, 0)
-        if 'paddle_ego' in self.paddles:
-            self.paddles['paddle_ego'][0].ApplyForceToCenter(force, True)
-
-        # pos = [self.paddles['paddle_ego'][0].position[0], self.paddles['paddle_ego'][0].position[1]]
-        # new_pos = [pos[0] + vel[0] * self.time_per_step, pos[1] + vel[1] * self.time_per_step]
-        # # new_pos should be within the board though
-        # if new_pos[0] < self.table_x_min:
-        #     new_pos[0] = self.table_x_min
-        # if new_pos[0] > self.table_x_max:
-        #     new_pos[0] = self.table_x_max
-        # if new_pos[1] < self.table_y_min:
-        #     new_pos[1] = self.table_y_min
-        # if new_pos[1] > self.table_y_max:
-        #     new_pos[1] = self.table_y_max
-
-        # # calculate what new vel will be after applying force
-        # accel = [force[0] / self.paddles['paddle_ego'][0].mass, force[1] / self.paddles['paddle_ego'][0].mass]
-        # new_vel = [vel[0] + accel[0] * self.time_per_step, vel[1] + accel[1] * self.time_per_step]
-        # new_pos = [pos[0] + vel[0] * self.time_per_step + 0.5 * accel[0] * self.time_per_step ** 2, 
-        #            pos[1] + vel[1] * self.time_per_step + 0.5 * accel[1] * self.time_per_step ** 2]
-        
-        # print('\n')
-        # print('action', action)
-        
-        # print("velocity_before", self.paddles['paddle_ego'][0].linearVelocity)
-        # print('position before', self.paddles['paddle_ego'][0].position)
-
-        self.world.Step(self.time_per_step, 10, 10)
-        
-        # print("velocity after", self.paddles['paddle_ego'][0].linearVelocity)
-        # print('position after', self.paddles['paddle_ego'][0].position)
-        # print('predicted new vel', new_vel)
-        # print('predicted new pos', new_pos)
-
-        
-        # self.paddles['paddle_ego'][0].linearVelocity = b2Vec2(vel[0], vel[1])
-        # self.paddles['paddle_ego'][0].position = (new_pos[0], new_pos[1])
-        
-        vel = np.array([self.paddles['paddle_ego'][0].linearVelocity[0], self.paddles['paddle_ego'][0].linearVelocity[1]])
-        vel_mag = np.linalg.norm(vel)
-
-        # keep velocity at a maximum value
-        if vel_mag > self.max_paddle_vel:
-            self.paddles['paddle_ego'][0].linearVelocity = b2Vec2(vel[0] / vel_mag * self.max_paddle_vel, vel[1] / vel_mag * self.max_paddle_vel)
-            
-        # check if out of bounds and correct
-        pos = [self.paddles['paddle_ego'][0].position[0], self.paddles['paddle_ego'][0].position[1]]
-        if pos[0] < self.table_x_min:
-            pos[0] = self.table_x_min
-        if pos[0] > self.table_x_max:
-            pos[0] = self.table_x_max
-        if pos[1] > 0:
-            pos[1] = 0
-        if pos[1] > self.table_y_max:
-            pos[1] = self.table_y_max
-        self.paddles['paddle_ego'][0].position = (pos[0], pos[1])
-        
-        state_info = self.get_current_state()
-        return state_info
-    
-    def get_multiagent_transition(self, joint_action):
-        action_ego, action_alt = joint_action
-        ego_delta_pos = np.array([action_ego[0], action_ego[1]])
-        alt_delta_pos = np.array([action_alt[0], action_alt[1]])
-        
-        # first let's determine velocity
-        ego_vel = ego_delta_pos / self.time_per_step
-        alt_vel = alt_delta_pos / self.time_per_step
-        ego_vel_mag = np.linalg.norm(ego_vel)
-        alt_vel_mag = np.linalg.norm(alt_vel)
-        ego_vel_unit = ego_vel / (ego_vel_mag + 1e-8)
-        alt_vel_unit = alt_vel / (alt_vel_mag + 1e-8)
-        
-        if ego_vel_mag > self.max_paddle_vel:
-            ego_vel = ego_vel_unit * self.max_paddle_vel
-        if alt_vel_mag > self.max_paddle_vel:
-            alt_vel = alt_vel_unit * self.max_paddle_vel
-            
-        force_ego = self.paddles['paddle_ego'][0].mass * ego_vel / self.time_per_step
-        force_alt = self.paddles['paddle_alt'][0].mass * alt_vel / self.time_per_step
-        force_mag_ego = np.linalg.norm(force_ego)
-        force_mag_alt = np.linalg.norm(force_alt)
-        force_unit_ego = force_ego / (force_mag_ego + 1e-8)
-        force_unit_alt = force_alt / (force_mag_alt + 1e-8)
-        
-        if force_mag_ego > self.max_force_timestep:
-            force_ego = force_unit_ego * self.max_force_timestep
-            
-        if force_mag_alt > self.max_force_timestep:
-            force_alt = force_unit_alt * self.max_force_timestep
-            
-        force_ego = force_ego.astype(float)
-        force_alt = force_alt.astype(float)
-        
-        if self.paddles['paddle_ego'][0].position[1] > 0:
-            force_ego[1] = min(self.force_scaling * self.paddles['paddle_ego'][0].mass * action_ego[1], 0)
-        if self.paddles['paddle_alt'][0].position[1] < 0:
-            force_alt[1] = min(self.force_scaling * self.paddles['paddle_alt'][0].mass * action_alt[1], 0)
-        if 'paddle_ego' in self.paddles:
-            self.paddles['paddle_ego'][0].ApplyForceToCenter(force_ego, True)
-        if 'paddle_alt' in self.paddles:
-            self.paddles['paddle_alt'][0].ApplyForceToCenter(force_alt, True)
-            
-        vel_ego = np.array([self.paddles['paddle_ego'][0].linearVelocity[0], self.paddles['paddle_ego'][0].linearVelocity[1]])
-        vel_alt = np.array([self.paddles['paddle_alt'][0].linearVelocity[0], self.paddles['paddle_alt'][0].linearVelocity[1]])
-        vel_mag_ego = np.linalg.norm(vel_ego)
-        vel_mag_alt = np.linalg.norm(vel_alt)
-        
-        pos_ego = [self.paddles['paddle_ego'][0].position[0], self.paddles['paddle_ego'][0].position[1]]
-        new_pos_ego = [pos_ego[0] + vel_ego[0] * self.time_per_step, pos_ego[1] + vel_ego[1] * self.time_per_step]
-        
-        pos_alt = [self.paddles['paddle_alt'][0].position[0], self.paddles['paddle_alt'][0].position[1]]
-        new_pos_alt = [pos_alt[0] + vel_alt[0] * self.time_per_step, pos_alt[1] + vel_alt[1] * self.time_per_step]
-        
-        # new_pos should be within the board though
-        if pos_ego[0] < self.table_x_min:
-            pos_ego[0] = self.table_x_min
-        if pos_ego[0] > self.table_x_max:
-            pos_ego[0] = self.table_x_max
-        if pos_ego[1] < self.table_y_min:
-            pos_ego[1] = self.table_y_min
-        if pos_ego[1] > self.table_y_max:
-            pos_ego[1] = self.table_y_max
-            
-        if pos_alt[0] < self.table_x_min:
-            pos_alt[0] = self.table_x_min
-        if pos_alt[0] > self.table_x_max:
-            pos_alt[0] = self.table_x_max
-        if pos_alt[1] < self.table_y_min:
-            pos_alt[1] = self.table_y_min
-        if pos_alt[1] > self.table_y_max:
-            pos_alt[1] = self.table_y_max
-        
-        # keep velocity at a maximum value
-        if vel_mag_ego > self.max_paddle_vel:
-            vel_ego = [vel_ego[0] / vel_mag_ego * self.max_paddle_vel, vel_ego[1] / vel_mag_ego * self.max_paddle_vel]
-            self.paddles['paddle_ego'][0].linearVelocity = b2Vec2(vel_ego[0], vel_ego[1])
-        if vel_mag_alt > self.max_paddle_vel:
-            vel_alt = [vel_alt[0] / vel_mag_alt * self.max_paddle_vel, vel_alt[1] / vel_mag_alt * self.max_paddle_vel]
-            self.paddles['paddle_alt'][0].linearVelocity = b2Vec2(vel_alt[0], vel_alt[1])
-        
-        self.world.Step(self.time_per_step, 10, 10)
-        
-        # why do we do this? Because in the real world we have downward force and it is unlikely a paddle will change pos/vel 
-        # because of hitting a puck
-        self.paddles['paddle_ego'][0].linearVelocity = b2Vec2(vel_ego[0], vel_ego[1])
-        self.paddles['paddle_alt'][0].linearVelocity = b2Vec2(vel_alt[0], vel_alt[1])
-        self.paddles['paddle_ego'][0].position = (new_pos_ego[0], new_pos_ego[1])
-        self.paddles['paddle_alt'][0].position = (new_pos_alt[0], new_pos_alt[1])
-
-        # todo: figure out how to determine if puck was hit by object.
-        # contacts, contact_names = self.get_contacts()
-        # hit_a_puck = self.respond_contacts(contact_names)
-        # # hacky way of determing if puck was hit below TODO: fix later!
-        # hit_a_puck = np.any(contacts) # check if any are true
-        
-        # let's fix. if paddle hits a puck, then let's not change it's position
-        
-        
-        state_info = self.get_current_state()
-        return state_info
-
-    def get_contacts(self):
-        contacts = list()
-        shape_pointers = ([self.paddles[bn][0] for bn in self.paddle_names]  + \
-                         [self.pucks[bn][0] for bn in self.puck_names] + [self.blocks[pn][0] for pn in self.block_names] + \
-                         [self.obstacles[pn][0] for pn in self.obstacle_names] + [self.targets[pn][0] for pn in self.target_names])
-        names = self.paddle_names + self.puck_names + self.block_names + self.obstacle_names + self.target_names
-        contact_names = {n: list() for n in names}
-        for bn in names:
-            all_contacts = np.zeros(len(shape_pointers)).astype(bool)
-            for contact in self.object_dict[bn].contacts:
-                if contact.contact.touching:
-                    contact_bool = np.array([(contact.other == bp and contact.contact.touching) for bp in shape_pointers])
-                    contact_names[bn] += [sn for sn, bp in zip(names, shape_pointers) if (contact.other == bp)]
-                else:
-                    contact_bool = np.zeros(len(shape_pointers)).astype(bool)
-                all_contacts += contact_bool
-            contacts.append(all_contacts)
-        return np.stack(contacts, axis=0), contact_names
-
-    def respond_contacts(self, contact_names):
-        hit_a_puck = list()
-        for tn in self.target_names:
-            for cn in contact_names[tn]: 
-                if cn.find("puck") != -1:
-                    hit_a_puck.append(cn)
-        if self.absorb_target:
-            for cn in hit_a_puck:
-                self.world.DestroyBody(self.object_dict[cn])
-                del self.object_dict[cn]
-        return hit_a_puck # TODO: record a destroyed flag
+from Box2D.b2 import world
+from Box2D import (b2CircleShape, b2ContactListener, b2FixtureDef, b2LoopShape, b2PolygonShape,
+                   b2_dynamicBody, b2_staticBody, b2Filter, b2Vec2, b2_linearSlop)
+import math
+import numpy as np
+from contacts import (BODY_BLOCK, BODY_OBSTACLE, BODY_PADDLE, BODY_PUCK, BODY_TARGET, BODY_WALL, EVENT_LOOKUP,
+                      PUCK_TARGET, ContactEventBuffer)
+from physics_presets import get_physics_params
+from reset_bank import DEFAULT_RESET_BANK_SIZE, ResetBank
+from state_layout import BODY_SLOTS, EGO_PADDLE, alt_paddle_offset, puck_offset, state_size
+
+# 'force' pushes the paddles towards the action target, 'kinematic' sets the velocity that moves them onto it,
+# see push_paddle and move_paddle. the paddles are dynamic bodies either way, so walls, obstacles and a puck
+# squeezed against a wall stop them
+PADDLE_CONTROLS = ('force', 'kinematic')
+
+
+class AirHockeyBox2D:
+    def __init__(self,
+                 num_paddles, 
+                 num_pucks, 
+                 num_blocks, 
+                 num_obstacles, 
+                 num_targets, 
+                 absorb_target, 
+                 length, 
+                 width,
+                 puck_radius, 
+                 paddle_radius, 
+                 block_width,
+                 max_force_timestep, 
+                 force_scaling, 
+                 paddle_damping, 
+                 puck_damping,
+                 render_size, 
+                 render_masks=False, 
+                 gravity=-5,
+                 paddle_density=1000,
+                 puck_density=250,
+                 block_density=1000,
+                 max_paddle_vel=2,
+                 time_frequency=20,
+                 pooled_reset=True,
+                 physics_preset='default',
+                 physics_substeps=None,
+                 velocity_iterations=None,
+                 position_iterations=None,
+                 action_repeat=None,
+                 reset_bank_size=DEFAULT_RESET_BANK_SIZE,
+                 paddle_control='force',
+                 world_scale=1.0,
+                 bullet=True,
+                 skip_resting=False):
+
+        if paddle_control not in PADDLE_CONTROLS:
+            raise ValueError(f"Unknown paddle_control {paddle_control}, expected one of {PADDLE_CONTROLS}.")
+        # task specific params
+        self.num_pucks = num_pucks
+        self.multiagent = num_paddles > 1
+        self.num_blocks = num_blocks
+        self.num_obstacles = num_obstacles
+        self.num_targets = num_targets
+        
+        # physics / world params
+        self.length, self.width = length, width
+        self.num_paddles = num_paddles
+        self.paddle_radius = paddle_radius
+        self.puck_radius = puck_radius
+        self.block_width = block_width  
+        self.max_force_timestep = max_force_timestep
+        self.time_frequency = time_frequency
+        self.time_per_step = 1 / self.time_frequency
+        # preallocated for vector_norm, so paddle control makes no numpy temporaries
+        self.norm_buffer, self.norm_out = np.zeros(2), np.zeros(())
+        # the box2d world runs in meters times world_scale (its tolerances are tuned for bodies of 0.1 to 10
+        # units), everything else (attributes, state, snapshots, contact impulses) stays in meters. masses
+        # stay in kg, box2d forces are in world_scale newtons. box2d moves a body at most b2_maxTranslation
+        # (2 units) per world step, world_scale * speed * physics_time_step has to stay below that
+        if world_scale <= 0:
+            raise ValueError("world_scale must be positive.")
+        self.world_scale = world_scale
+        # continuous collision between moving bodies (pucks and paddles). box2d always keeps them out of
+        # the walls and obstacles, without bullets a puck can pass through a paddle it covers more than
+        # about a radius of per world step, see benchmarks/bench_world_scale.py
+        self.bullet = bullet
+        # control steps in which every dynamic body sleeps skip the world step (which would move nothing) and
+        # the state update, see is_resting. zero paddle forces then leave a sleeping paddle asleep
+        self.skip_resting = skip_resting
+        # solver settings, see physics_presets.py. each control step runs physics_substeps world steps,
+        # and each call to get_transition runs action_repeat control steps
+        self.physics_params = get_physics_params(physics_preset,
+                                                 physics_substeps=physics_substeps,
+                                                 velocity_iterations=velocity_iterations,
+                                                 position_iterations=position_iterations,
+                                                 action_repeat=action_repeat)
+        self.physics_substeps = self.physics_params['physics_substeps']
+        self.velocity_iterations = self.physics_params['velocity_iterations']
+        self.position_iterations = self.physics_params['position_iterations']
+        self.action_repeat = self.physics_params['action_repeat']
+        self.physics_time_step = self.time_per_step / self.physics_substeps
+        self.force_scaling = force_scaling
+        self.absorb_target = absorb_target
+        self.paddle_damping = paddle_damping
+        self.puck_damping = puck_damping
+        self.gravity = gravity
+        self.puck_min_height = (-length / 2) + (length / 3)
+        self.paddle_max_height = 0
+        self.block_min_height = 0
+        self.max_speed_start = width
+        self.min_speed_start = -width
+        self.paddle_density = paddle_density
+        self.puck_density = puck_density
+        self.block_density = block_density
+        # these assume 2d, in 3d since we have height it would be higher mass
+        self.paddle_mass = self.paddle_density * np.pi * self.paddle_radius ** 2
+        self.puck_mass = self.puck_density * np.pi * self.puck_radius ** 2
+
+        # these 2 will depend on the other parameters
+        self.max_paddle_vel = max_paddle_vel # m/s. This will be dependent on the robot arm
+        # compute maximum force based on max paddle velocity
+        max_a = self.max_paddle_vel / self.time_per_step
+        max_f = self.paddle_mass * max_a
+        # assume maximum force transfer
+        puck_max_a = max_f / self.puck_mass
+        self.max_puck_vel = puck_max_a * self.time_per_step
+
+        # box2d visualization params (but the visualization is done in the Render file)
+        self.ppm = render_size / self.width
+        self.render_width = int(render_size)
+        self.render_length = int(self.ppm * self.length)
+        self.render_masks = render_masks
+
+        # reuse bodies across resets, see reset
+        self.pooled_reset = pooled_reset
+        
+        self.table_x_min = -self.width / 2
+        self.table_x_max = self.width / 2
+        self.table_y_min = -self.length / 2
+        self.table_y_max = self.length / 2
+        
+        # move_paddle aims kinematic control inside the walls (where the wall skin stops a paddle) and out of
+        # the 3 paddle radii before the center line, that push_paddle does not push into
+        self.paddle_control = paddle_control
+        self.kinematic_paddles = paddle_control == 'kinematic'
+        self.paddle_x_max = self.table_x_max - self.paddle_radius - b2_linearSlop / world_scale
+        self.paddle_y_min = self.table_y_min + self.paddle_radius + b2_linearSlop / world_scale
+        self.paddle_y_max = -3 * self.paddle_radius
+
+        self.min_goal_radius = self.width / 16
+        self.max_goal_radius = self.width / 4
+        
+        self.metadata = {}
+        
+        # paddle / puck / wall / target contacts of the current step, filled by a ContactRecorder
+        self.contact_events = ContactEventBuffer()
+        self.absorbed_pucks = set()
+
+        # spawns come from this simulator's own generator (AirHockeyEnv passes in its own, see seed_rng),
+        # reset_bank_size of them are sampled at once
+        self.rng = np.random.default_rng()
+        self.reset_bank = ResetBank(self.sample_spawns, reset_bank_size)
+
+        self.create_world(self.gravity)
+        self.rebuild_world = False
+        self.reset()
+
+    def create_world(self, gravity):
+        scale = self.world_scale
+        self.world = world(gravity=(0, gravity * scale), doSleep=True) # gravity is negative usually
+        # paddle forces are held for every substep of a control step, step_physics clears them
+        self.world.autoClearForces = False
+        # creating the ground -- need to only call once! otherwise it can be laggy
+        self.ground_body = self.world.CreateBody(
+            shapes=b2LoopShape(vertices=[(self.table_x_min * scale, self.table_y_min * scale),
+                                         (self.table_x_min * scale, self.table_y_max * scale),
+                                         (self.table_x_max * scale, self.table_y_max * scale),
+                                         (self.table_x_max * scale, self.table_y_min * scale)]),
+            userData=(BODY_WALL, -1),
+        )
+        self.world.contactListener = ContactRecorder(self.contact_events, scale)
+
+    @staticmethod
+    def from_dict(state_dict):
+        return AirHockeyBox2D(**state_dict)
+
+    def seed_rng(self, seed):
+        """
+        Restarts the spawn sequence from seed (an int, or a np.random.Generator to share).
+        """
+        self.rng = np.random.default_rng(seed)
+        self.reset_bank.clear()
+        self.rebuild_world = True
+
+    def sample_spawns(self, n):
+        """
+        Samples n initial configurations with a few vectorized draws, see ResetBank.
+
+        Returns:
+            dict: name -> (n, ...) array. Gravity, puck and target positions and velocities, block, obstacle
+            and target positions and sizes (width, height) and obstacle angles, in box2d coords.
+        """
+        rng = self.rng
+        spawns = {}
+        if type(self.gravity) == list:
+            spawns['gravity'] = rng.uniform(low=self.gravity[0], high=self.gravity[1], size=n)
+        shape = (n, self.num_pucks, 2)
+        if not self.multiagent:
+            # the puck starts at the far end, away from the edges, and moves towards the paddle
+            spawns['puck_pos'] = rng.uniform(low=(-self.width / 3, self.length / 2 - 0.01),
+                                             high=(self.width / 3, self.length / 2 - 0.01), size=shape)
+            spawns['puck_vel'] = np.broadcast_to(np.array([0., -1.]), shape)
+        else:
+            min_height = max(self.puck_min_height, -self.length / 2)
+            spawns['puck_pos'] = rng.uniform(low=(self.table_x_min, min_height),
+                                             high=(self.table_x_max, self.length / 2), size=shape)
+            spawns['puck_vel'] = rng.uniform(low=(self.min_speed_start, self.min_speed_start),
+                                             high=(self.max_speed_start, self.min_speed_start + 10 * (self.max_speed_start - self.min_speed_start)),
+                                             size=shape)
+        for name_type, count, min_height in (('Block', self.num_blocks, self.block_min_height),
+                                             ('Obstacle', self.num_obstacles, self.block_min_height),
+                                             ('Target', self.num_targets, -30)):
+            if count == 0:
+                continue
+            shape = (n, count, 2)
+            spawns[name_type + '_pos'] = rng.uniform(low=(self.table_x_min, min_height),
+                                                     high=(self.table_x_max, self.length / 2), size=shape)
+            spawns[name_type + '_size'] = np.maximum((0.75, 0.5), rng.random(shape) * (3, 1))
+            if name_type == 'Obstacle':
+                spawns['Obstacle_angle'] = rng.random((n, count)) * np.pi
+            if name_type == 'Target':
+                spawns['Target_vel'] = rng.uniform(low=(-self.width, -self.length), high=(self.width, self.length), size=shape)
+        return spawns
+
+    def reset(self, 
+              seed=None, 
+              ego_goal_pos=None,
+              alt_goal_pos=None,
+              object_state_dict=None, 
+              type_instance_dict=None, 
+              max_count_dict=None):
+
+        if seed is not None:
+            self.seed_rng(seed)
+        if self.rebuild_world:
+            # box2d's contact ordering (and so the last bits of a rollout) depends on the history of the world,
+            # like restore, the first reset after seeding starts from a fresh world so it plays the same after
+            # any earlier rollout
+            self.create_world(0 if type(self.gravity) == list else self.gravity)
+            self.__dict__.pop("object_dict", None)
+            self.rebuild_world = False
+        # python floats, box2d takes them faster than numpy scalars
+        self.spawn = {name: values.tolist() for name, values in self.reset_bank.next().items()}
+
+        # bodies are created once and re-placed on every reset, they are only rebuilt
+        # when the object counts or shapes change (or a body was destroyed, e.g. an absorbed puck)
+        pooled_bodies = None
+        if hasattr(self, "object_dict"):
+            if self.pooled_reset and self.get_pool_signature() == self.pool_signature \
+                and len(self.object_dict) == self.pool_size:
+                pooled_bodies = self.object_dict
+                # deactivating drops last episode's contacts and broadphase proxies; doing it for all bodies
+                # in the same order as the DestroyBody loop below keeps proxy ids (and so contact order) identical
+                for body in pooled_bodies.values():
+                    body.active = False
+            else:
+                for body in self.object_dict.values():
+                    self.world.DestroyBody(body)
+
+        if type(self.gravity) == list:
+            self.world.gravity = (0, self.spawn['gravity'] * self.world_scale)
+
+        self.paddles = dict()
+        self.pucks = dict()
+        self.blocks = dict()
+        self.obstacles = dict()
+        self.targets = dict()
+
+        self.paddle_attrs = None
+        self.target_attrs = None
+
+        self.create_world_objects(pooled_bodies)
+        self.contact_events.reset_counts()
+        self.absorbed_pucks.clear()
+        if pooled_bodies is not None:
+            # pooled bodies got fresh broadphase proxies in place_body, pair them up now like
+            # box2d does for newly created fixtures at the start of the next step
+            self.world.contactManager.FindNewContacts()
+        return self.get_current_state()
+
+    def get_pool_signature(self):
+        return (self.num_pucks, self.num_blocks, self.num_obstacles, self.num_targets, self.multiagent,
+                self.puck_radius, self.paddle_radius)
+
+    def place_body(self, body, position, linear_velocity=(0, 0), angle=0, angular_velocity=0):
+        """
+        Moves a pooled (deactivated) body to a new pose and velocity (box2d units), as if it was just created
+        there. Reactivating it creates new broadphase proxies at the new pose.
+        """
+        body.transform = (position, angle)
+        body.linearVelocity = linear_velocity
+        body.angularVelocity = angular_velocity
+        body.active = True
+        body.awake = True
+        return body
+
+    def get_polygon_bodies(self):
+        return [self.object_dict[name] for name in self.block_names + self.obstacle_names + self.target_names
+                if name in self.object_dict]
+
+    def snapshot(self):
+        """
+        Captures every body transform and velocity, the block shapes, the world gravity and the RNG and
+        reset bank state.
+
+        Returns:
+            SimulatorSnapshot: a compact copy that can be passed to restore any number of times.
+        """
+        # absorbed pucks are left out, restore keeps them deactivated
+        names = tuple(name for name in self.object_dict.keys() if name not in self.absorbed_pucks)
+        bodies = np.empty((len(names), 6))
+        for i, body in enumerate(self.object_dict[name] for name in names):
+            position, velocity = body.position, body.linearVelocity
+            bodies[i] = (position[0], position[1], body.angle, velocity[0], velocity[1], body.angularVelocity)
+        vertices = np.array([body.fixtures[0].shape.vertices for body in self.get_polygon_bodies()]).reshape(-1, 4, 2)
+        if self.world_scale != 1:
+            bodies[:, [0, 1, 3, 4]] /= self.world_scale
+            vertices /= self.world_scale
+        return SimulatorSnapshot(names, bodies, vertices, self.world.gravity[1] / self.world_scale, self.spawn,
+                                 (self.rng.bit_generator.state, self.reset_bank.get_state()))
+
+    def restore(self, snapshot):
+        """
+        Puts the simulator back into the state captured by snapshot.
+
+        The world is rebuilt from scratch with the same sequence of operations every time: box2d's contact
+        ordering (and warm starting) depends on the history of the world, so reusing the live world would make
+        rollouts from the same snapshot differ in the last bits. Restoring a snapshot twice and applying the same
+        actions gives bit-identical rollouts.
+        """
+        # the spawned poses and block sizes are overwritten below, building the world from the snapshot's
+        # spawn only makes the sequence of world operations (and so the broadphase layout) the same on every restore
+        self.spawn = snapshot.spawn
+        self.create_world(snapshot.gravity)
+        self.paddles = dict()
+        self.pucks = dict()
+        self.blocks = dict()
+        self.obstacles = dict()
+        self.targets = dict()
+        self.create_world_objects()
+        if not set(snapshot.names) <= set(self.object_dict.keys()):
+            raise ValueError("Snapshot objects do not match the simulator configuration.")
+
+        # bodies missing from the snapshot (absorbed pucks) stay deactivated
+        for body in self.object_dict.values():
+            body.active = False
+        self.contact_events.reset_counts()
+        self.absorbed_pucks = {name for name in self.puck_names if name not in snapshot.names}
+        scale = self.world_scale
+        for body, vertices in zip(self.get_polygon_bodies(), snapshot.vertices):
+            fixture = body.fixtures[0]
+            fixture_def = b2FixtureDef(shape=b2PolygonShape(vertices=(vertices * scale).tolist()),
+                                       density=fixture.density,
+                                       restitution=fixture.restitution,
+                                       filter=fixture.filterData)
+            body.DestroyFixture(fixture)
+            body.CreateFixture(fixture_def)
+        for name, (x, y, angle, vx, vy, omega) in zip(snapshot.names, snapshot.bodies):
+            self.place_body(self.object_dict[name], (x * scale, y * scale), (vx * scale, vy * scale), angle, omega)
+        rng_state, bank_state = snapshot.rng_state
+        self.rng.bit_generator.state = rng_state
+        self.reset_bank.set_state(bank_state)
+        return self.get_current_state()
+    
+    def get_current_state(self):
+        """
+        Writes the kinematics of every paddle and puck into the preallocated state array.
+
+        The array is in env coordinates (meters) and uses the fixed slot offsets from state_layout.
+        The same buffer is returned (and overwritten) on every call, copy it to keep a state around.
+        """
+        state = self.state
+        for offset, body in self.state_bodies:
+            position = body.position
+            velocity = body.linearVelocity
+            # box2d (x, y) -> env (-y, x)
+            state[offset:offset + BODY_SLOTS] = (-position[1], position[0], -velocity[1], velocity[0])
+        if self.world_scale != 1:
+            state /= self.world_scale
+        return state
+
+    def create_world_objects(self, pooled_bodies=None):
+        # with pooled_bodies, existing bodies (keyed by object name) are re-placed instead of created.
+        # poses and sizes come from the current spawn, see sample_spawns
+        pool = pooled_bodies if pooled_bodies is not None else {}
+        spawn = self.spawn
+        for i in range(self.num_pucks):
+            name, puck_attrs = self.create_puck(i, min_height=self.puck_min_height, pos=spawn['puck_pos'][i], vel=spawn['puck_vel'][i], body=pool.get("puck" + str(i)))
+            self.pucks[name] = puck_attrs
+
+        for i in range(self.num_blocks):
+            width, height = spawn['Block_size'][i]
+            name, block_attrs = self.create_block_type(i, name_type = "Block", width=width, height=height, pos=spawn['Block_pos'][i], vel=(0, 0), dynamic=False, min_height = self.block_min_height, body=pool.get("Block" + str(i)))
+            self.blocks[name] = block_attrs
+
+        for i in range(self.num_obstacles): # could replace with arbitary polygons
+            width, height = spawn['Obstacle_size'][i]
+            name, obs_attrs = self.create_block_type(i, name_type = "Obstacle", width=width, height=height, pos=spawn['Obstacle_pos'][i], vel=(0, 0), angle=spawn['Obstacle_angle'][i], dynamic = False, color=(0, 127, 127), min_height = self.block_min_height, body=pool.get("Obstacle" + str(i)))
+            self.obstacles[name] = obs_attrs
+
+        for i in range(self.num_targets):
+            width, height = spawn['Target_size'][i]
+            name, target_attrs = self.create_block_type(i, name_type = "Target", width=width, height=height, pos=spawn['Target_pos'][i], vel=spawn['Target_vel'][i], color=(255, 255, 0), body=pool.get("Target" + str(i)))
+            self.targets[name] = target_attrs
+        
+        name, paddle_attrs = self.create_paddle(i, name="paddle_ego", color=(0, 255, 0), body=pool.get("paddle_ego"))
+        self.paddles[name] = paddle_attrs
+
+        if self.multiagent:
+            name_alt, paddle_alt_attrs = self.create_paddle(i=i, name="paddle_alt", color=(0, 255, 0), home_paddle=False, body=pool.get("paddle_alt"))
+            self.paddles[name_alt] = paddle_alt_attrs
+
+        # names and object dict
+        self.puck_names = list(self.pucks.keys())
+        self.puck_names.sort()
+        self.paddle_names = list(self.paddles.keys())
+        self.block_names = list(self.blocks.keys())
+        self.block_names.sort()
+        self.obstacle_names = list(self.obstacles.keys())
+        self.obstacle_names.sort()
+        self.target_names = list(self.targets.keys())
+        self.target_names.sort()
+        self.object_dict = {**{name: self.pucks[name][0] for name in self.pucks.keys()},
+                            **{name: self.paddles[name][0] for name in self.paddles.keys()},
+                             **{name: self.blocks[name][0] for name in self.blocks.keys()},
+                             **{name: self.targets[name][0] for name in self.targets.keys()},
+                             **{name: self.obstacles[name][0] for name in self.obstacles.keys()},
+                             }
+        self.dynamic_bodies = [body for body in self.object_dict.values() if body.type == b2_dynamicBody]
+        # (kind, index) for the contact listener, puck indices follow the state array order
+        for i, name in enumerate(self.puck_names):
+            self.object_dict[name].userData = (BODY_PUCK, i)
+        for i, name in enumerate(('paddle_ego', 'paddle_alt')):
+            if name in self.object_dict:
+                self.object_dict[name].userData = (BODY_PADDLE, i)
+        for kind, names in ((BODY_BLOCK, self.block_names), (BODY_OBSTACLE, self.obstacle_names), (BODY_TARGET, self.target_names)):
+            for i, name in enumerate(names):
+                self.object_dict[name].userData = (kind, i)
+        self.pool_signature = self.get_pool_signature()
+        self.pool_size = len(self.object_dict)
+
+        # bodies in state array order, see state_layout
+        self.state_bodies = [(EGO_PADDLE, self.paddles['paddle_ego'][0])]
+        self.state_bodies += [(puck_offset(i), self.pucks[name][0]) for i, name in enumerate(self.puck_names)]
+        if self.multiagent:
+            self.state_bodies.append((alt_paddle_offset(self.num_pucks), self.paddles['paddle_alt'][0]))
+        if not hasattr(self, 'state') or len(self.state) != state_size(len(self.paddles), len(self.pucks)):
+            self.state = np.zeros(state_size(len(self.paddles), len(self.pucks)))
+
+    def create_paddle(self, i, 
+                        name=None, 
+                        color=(127, 127, 127), 
+                        vel=None, 
+                        pos=None, 
+                        collidable=True, 
+                        home_paddle=True,
+                        body=None):
+        if not self.multiagent:
+            if pos is None:
+                pos = (0, -self.length / 2 + 0.01) # start at home region
+            # below code is for a random position
+            # if pos is None: pos = ((np.random.rand() - 0.5) * 2 * (self.table_x_max), 
+            #                        max(min_height,-self.length / 2) + (np.random.rand() * ((min(max_height,self.length / 2)) - (max(min_height,-self.length / 2)))))
+        else:
+            if pos is None: 
+                if home_paddle:
+                    pos = (0, -self.length / 2 + 0.01)
+                else:
+                    pos = (0, self.length / 2 - 0.01)
+        if self.kinematic_paddles:
+            # start them where move_paddle keeps them
+            side = 1 if pos[1] < 0 else -1
+            pos = (pos[0], side * max(side * pos[1], self.paddle_y_min))
+        # paddles start at rest, vel is not used
+        scale = self.world_scale
+        pos = (pos[0] * scale, pos[1] * scale)
+        radius = self.paddle_radius * scale
+        if body is not None:
+            paddle = self.place_body(body, pos)
+        else:
+            paddle = self.world.CreateDynamicBody(
+                fixtures=b2FixtureDef(
+                    shape=b2CircleShape(radius=radius),
+                    density=self.paddle_density / scale ** 2,
+                    restitution = 1.0,
+                    filter=b2Filter (maskBits=1,
+                                     categoryBits=1 if collidable else 0)),
+                bullet=self.bullet,
+                position=pos,
+                # kinematic control sets the velocity that reaches the target, damping would fall short of it
+                linearDamping=0 if self.kinematic_paddles else self.paddle_damping
+            )
+        color =  color # randomize color
+        default_paddle_name = "paddle" + str(i)
+        paddle.gravityScale = 0
+        return ((default_paddle_name, (paddle, color)) if name is None else (name, (paddle, color)))
+
+    # puck = bouncing ball
+    def create_puck(self, i, 
+                        name=None, 
+                        color=(127, 127, 127), 
+                        radius=-1,
+                        vel=None, 
+                        pos=None, 
+                        collidable=True,
+                        min_height=-30,
+                        max_height=30,
+                        body=None):
+        if not self.multiagent:
+            # then we want it to start at the top, which is max_height, 0
+            if pos is None: 
+                x_pos = self.rng.uniform(low=-self.width / 3, high=self.width / 3) # doesnt spawn at edges
+                # (np.random.rand() - 0.5) * 2 * (self.table_x_max)
+                pos = (x_pos,
+                       min(max_height, self.length / 2) - 0.01)
+        else: 
+            if pos is None: 
+                pos = ((self.rng.random() - 0.5) * 2 * (self.table_x_max), 
+                       max(min_height,-self.length / 2) + (self.rng.random() * ((min(max_height,self.length / 2)) - (max(min_height,-self.length / 2)))))
+        # print(name, pos, min_height, max_height)
+        if not self.multiagent:
+            if vel is None: 
+                vel = (2 * self.rng.random() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start,
+                       -0.7)
+                # with 1/4th p, add x vel
+                if self.rng.random() < 0.25:
+                    # vel = (2 * np.random.rand() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start, -1)
+                    vel = (0, -1)
+                else:
+                    vel = (0, -1)
+        else:
+            if vel is None: 
+                vel = (self.rng.random() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start,
+                       10 * self.rng.random() * (self.max_speed_start - self.min_speed_start) + self.min_speed_start)
+        if radius < 0: 
+            # radius = max(1, np.random.rand() * (self.width/ 2))
+            # radius = self.width / 5.325
+            radius = self.puck_radius
+        scale = self.world_scale
+        pos = (pos[0] * scale, pos[1] * scale)
+        vel = (vel[0] * scale, vel[1] * scale)
+        radius *= scale
+        if body is not None:
+            puck = self.place_body(body, pos, vel)
+        else:
+            puck = self.world.CreateDynamicBody(
+                fixtures=b2FixtureDef(
+                    shape=b2CircleShape(radius=radius),
+                    density=self.puck_density / scale ** 2,
+                    restitution = 1.0,
+                    filter=b2Filter (maskBits=1,
+                                     categoryBits=1 if collidable else 0)),
+                bullet=self.bullet,
+                position=pos,
+                linearVelocity=vel,
+                linearDamping=self.puck_damping
+            )
+        color =  color # randomize color
+        puck_name = "puck" + str(i)
+        return ((puck_name, (puck, color)) if name is None else (name, (puck, color)))
+
+    def create_block_type(self, i, name=None,name_type=None, color=(127, 127, 127), width=-1, height=-1, vel=None, pos=None, dynamic=True, angle=0, angular_vel=0, fixed_rotation=False, collidable=True, min_height=-30, body=None):
+        if pos is None: pos = ((self.rng.random() - 0.5) * 2 * (self.table_x_max), min_height + (self.rng.random() * (self.length - (min_height + self.length / 2))))
+        if vel is None: vel = ((self.rng.random() - 0.5) * 2 * (self.width),(self.rng.random() - 0.5) * 2 * (self.length))
+        if not dynamic: vel = np.zeros((2,))
+        if width < 0: width = max(0.75, self.rng.random() * 3)
+        if height < 0: height = max(0.5, self.rng.random())
+        # TODO: possibly create obstacles of arbitrary shape
+        scale = self.world_scale
+        width, height = width * scale, height * scale
+        pos = (pos[0] * scale, pos[1] * scale)
+        vel = (vel[0] * scale, vel[1] * scale)
+        vertices = [([-width / 2, -height / 2]), ([width / 2, -height / 2]), ([width / 2, height / 2]), ([-width / 2, height / 2])]
+        block_name  = name_type # Block, Obstacle, Target
+
+        fixture = b2FixtureDef(
+            shape=b2PolygonShape(vertices=vertices),
+            density=self.block_density / scale ** 2,
+            restitution=0.1,
+            filter=b2Filter (maskBits=1,
+                                 categoryBits=1 if collidable else 0),
+        )
+
+        if body is not None:
+            # block sizes are resampled every reset, only swap the fixture if the shape changed
+            if body.fixtures[0].shape.vertices != [tuple(v) for v in vertices]:
+                body.DestroyFixture(body.fixtures[0])
+                body.CreateFixture(fixture)
+            body = self.place_body(body, pos, vel, angle, angular_vel)
+        else:
+            body = self.world.CreateBody(type=b2_dynamicBody if dynamic else b2_staticBody,
+                                        position=pos,
+                                        linearVelocity=vel,
+                                        angularVelocity=angular_vel,
+                                        angle=angle,
+                                        fixtures=fixture,
+                                        fixedRotation=fixed_rotation,
+                                        )
+        color =  color # randomize color
+        block_name = block_name + str(i)
+        return (block_name if name is None else name), (body, color)
+    
+    def convert_to_box2d_coords(self, action):
+        # a tuple of floats, paddle control works on plain floats (float32 actions are computed in float64)
+        return float(action[1]), -float(action[0])
+
+    def vector_norm(self, x, y):
+        """
+        np.linalg.norm((x, y)) (the same dot product, so the same bits) without allocating.
+        """
+        self.norm_buffer[0], self.norm_buffer[1] = x, y
+        np.dot(self.norm_buffer, self.norm_buffer, out=self.norm_out)
+        return math.sqrt(self.norm_out[()])
+
+    # s, a -> s'
+    def get_transition(self, action, other_action=None):
+        """
+        Args:
+            action: ego paddle delta-position action, in env coordinates.
+            other_action (optional): alt paddle action in env coordinates, multi-agent only. Defaults to
+                holding the alt paddle still.
+        """
+        # contact events are collected over all repeats and substeps of the env step
+        self.contact_events.clear()
+        for _ in range(self.action_repeat):
+            if self.multiagent:
+                if other_action is None:
+                    other_action = (0, 0)
+                state = self.get_multiagent_transition(self.convert_to_box2d_coords(action),
+                                                       self.convert_to_box2d_coords(other_action))
+            else:
+                state = self.get_singleagent_transition(self.convert_to_box2d_coords(action))
+            if self.absorb_target and self.contact_events.n:
+                self.respond_contacts()
+        return state
+
+    def step_physics(self):
+        """
+        Advances the world by one control step (time_per_step seconds) in physics_substeps world steps.
+        """
+        for _ in range(self.physics_substeps):
+            self.world.Step(self.physics_time_step, self.velocity_iterations, self.position_iterations)
+        self.world.ClearForces()
+
+    def is_resting(self):
+        """
+        Whether every dynamic body sleeps: box2d put it to sleep after b2_timeToSleep below its sleep tolerances,
+        and nothing (a contact, a paddle control, a placement) woke it since. A world step would move nothing and
+        limit_paddle would change nothing, so the state is still the last one.
+        """
+        for body in self.dynamic_bodies:
+            if body.awake:
+                return False
+        return True
+
+    def get_singleagent_transition(self, action):
+        if self.kinematic_paddles:
+            self.move_paddle('paddle_ego', action)
+            if self.skip_resting and self.is_resting():
+                return self.state
+            self.step_physics()
+            return self.get_current_state()
+        self.push_paddle('paddle_ego', action)
+        if self.skip_resting and self.is_resting():
+            return self.state
+        self.step_physics()
+        self.limit_paddle('paddle_ego')
+        return self.get_current_state()
+
+    def get_multiagent_transition(self, action, other_action):
+        # both paddles get the same control, the alt paddle mirrored onto the top half of the table
+        if self.kinematic_paddles:
+            self.move_paddle('paddle_ego', action)
+            self.move_paddle('paddle_alt', other_action, side=-1)
+            if self.skip_resting and self.is_resting():
+                return self.state
+            self.step_physics()
+            return self.get_current_state()
+        self.push_paddle('paddle_ego', action)
+        self.push_paddle('paddle_alt', other_action, side=-1)
+        if self.skip_resting and self.is_resting():
+            return self.state
+        self.step_physics()
+        self.limit_paddle('paddle_ego')
+        self.limit_paddle('paddle_alt', side=-1)
+        # puck hits are recorded by the contact listener, see get_contact_events
+        return self.get_current_state()
+
+    def push_paddle(self, name, action, side=1):
+        """
+        Applies the force that moves a paddle by the delta position action (box2d coordinates) over one
+        control step. side is 1 for the ego paddle (home at -y) and -1 for the alt paddle (home at +y),
+        the y axis is flipped for the alt paddle so both stay out of the other half the same way.
+        """
+        paddle = self.paddles[name][0]
+        forward = side * action[1]
+        scale = self.world_scale
+
+        # check if out of bounds and correct
+        if side * paddle.position[1] > 0 - 3 * self.paddle_radius * scale:
+            forward = min(forward, 0)
+
+        # action is delta position
+        # let's use simple time-optimal control to figure out the force to apply
+        # first let's determine velocity
+        vx, vy = action[0] / self.time_per_step, side * forward / self.time_per_step
+        vel_mag = self.vector_norm(vx, vy)
+        if vel_mag > self.max_paddle_vel:
+            vx = vx / (vel_mag + 1e-8) * self.max_paddle_vel
+            vy = vy / (vel_mag + 1e-8) * self.max_paddle_vel
+
+        fx, fy = paddle.mass * vx / self.time_per_step, paddle.mass * vy / self.time_per_step
+        force_mag = self.vector_norm(fx, fy)
+        if force_mag > self.max_force_timestep:
+            fx = fx / (force_mag + 1e-8) * self.max_force_timestep
+            fy = fy / (force_mag + 1e-8) * self.max_force_timestep
+
+        if side * paddle.position[1] > 0:
+            new_force = self.force_scaling * paddle.mass * forward
+            if new_force < -self.max_force_timestep:
+                new_force = -self.max_force_timestep
+            fy = side * min(new_force, 0)
+        # box2d moves the paddle by world_scale times the distance in meters. with skip_resting a zero force
+        # does not wake the paddle, so an idle paddle can fall asleep
+        paddle.ApplyForceToCenter((fx * scale, fy * scale), not self.skip_resting or fx != 0 or fy != 0)
+
+    def move_paddle(self, name, action, side=1):
+        """
+        Sets the velocity that moves a paddle by the delta position action (box2d coordinates) in one control
+        step, see push_paddle for side. The target is clipped to the paddle's part of the table and the speed
+        to max_paddle_vel beforehand, so the paddle ends the step on the target (or on the way to it) and never
+        needs limit_paddle. The paddle stays a dynamic body with its mass: hits exchange momentum with the puck
+        like in force control, and a puck between the paddle and a wall stops the paddle instead of being
+        pushed through the wall.
+        """
+        paddle = self.paddles[name][0]
+        position = paddle.position
+        scale = self.world_scale
+        x, y = position[0] / scale, side * position[1] / scale
+        target_x, target_y = x + action[0], y + side * action[1]
+        x_min, x_max, y_min = -self.paddle_x_max, self.paddle_x_max, self.paddle_y_min
+        # a puck between the paddle and a wall, in the band the paddle sweeps on its way to the target, would be
+        # pinned against the wall, stop a puck diameter short of that wall
+        reach = self.paddle_radius + self.puck_radius
+        for puck, _ in self.pucks.values():
+            puck_x, puck_y = puck.position[0] / scale, side * puck.position[1] / scale
+            if min(y, target_y) - reach < puck_y < max(y, target_y) + reach:
+                if puck_x > x:
+                    x_max = min(x_max, self.paddle_x_max - 2 * self.puck_radius)
+                else:
+                    x_min = max(x_min, -self.paddle_x_max + 2 * self.puck_radius)
+            if min(x, target_x) - reach < puck_x < max(x, target_x) + reach and puck_y < y:
+                y_min = self.paddle_y_min + 2 * self.puck_radius
+        target_x = min(max(target_x, x_min), x_max)
+        target_y = min(max(target_y, y_min), self.paddle_y_max)
+        vx = (target_x - x) / self.time_per_step
+        vy = (target_y - y) / self.time_per_step
+        speed = math.hypot(vx, vy)
+        if speed > self.max_paddle_vel:
+            vx *= self.max_paddle_vel / speed
+            vy *= self.max_paddle_vel / speed
+        paddle.linearVelocity = (vx * scale, side * vy * scale)
+
+    def limit_paddle(self, name, side=1):
+        """
+        Caps the paddle speed and puts it back on the table and its own half after a physics step,
+        see push_paddle for side.
+        """
+        paddle = self.paddles[name][0]
+        scale = self.world_scale
+        vx, vy = paddle.linearVelocity
+        vel_mag = self.vector_norm(vx, vy)
+        max_vel = self.max_paddle_vel * scale
+
+        # keep velocity at a maximum value
+        if vel_mag > max_vel:
+            paddle.linearVelocity = b2Vec2(vx / vel_mag * max_vel, vy / vel_mag * max_vel)
+
+        # check if out of bounds and correct
+        pos = [paddle.position[0], paddle.position[1]]
+        if pos[0] < self.table_x_min * scale:
+            pos[0] = self.table_x_min * scale
+        if pos[0] > self.table_x_max * scale:
+            pos[0] = self.table_x_max * scale
+        if side * pos[1] > 0:
+            pos[1] = 0
+        paddle.position = (pos[0], pos[1])
+
+    def get_contact_events(self):
+        """
+        Contacts between paddles, pucks, walls and targets during the last get_transition, see contacts.py.
+
+        Returns:
+            numpy.ndarray: EVENT_DTYPE rows of (kind, a, b, begin, impulse), one per pair of bodies that touched.
+        """
+        return self.contact_events.get_events()
+
+    def ego_hit_puck(self):
+        """
+        Whether the ego paddle started touching a puck during the last get_transition.
+        """
+        return self.contact_events.ego_hit_puck
+
+    def respond_contacts(self):
+        """
+        Finds the pucks that touched a target in the current step. With absorb_target they are taken off the table
+        until the next reset: the bodies are deactivated rather than destroyed so the body pool and the state array
+        stay valid (an absorbed puck keeps its last position and velocity in the state).
+
+        Returns:
+            list: names of the pucks that touched a target.
+        """
+        events = self.contact_events
+        hit_pucks = [self.puck_names[a] for kind, a in zip(events.buffer['kind'][:events.n], events.buffer['a'][:events.n])
+                     if kind == PUCK_TARGET]
+        if self.absorb_target:
+            for name in hit_pucks:
+                if name not in self.absorbed_pucks:
+                    self.object_dict[name].active = False
+                    self.absorbed_pucks.add(name)
+        return hit_pucks
+
+
+class ContactRecorder(b2ContactListener):
+    """
+    Box2D contact listener writing paddle-puck, puck-wall, puck-target and paddle-wall contacts into a
+    ContactEventBuffer. BeginContact marks hits, PostSolve adds up the normal impulses of every solver step.
+    Bodies without (kind, index) userData and other kinds of pairs (e.g. puck-block) are ignored.
+    """
+
+    def __init__(self, events, world_scale=1.0):
+        b2ContactListener.__init__(self)
+        self.events = events
+        # box2d impulses are in kg * world units / s, events are in kg * m / s
+        self.world_scale = world_scale
+
+    def get_event(self, contact):
+        data_a = contact.fixtureA.body.userData
+        data_b = contact.fixtureB.body.userData
+        if data_a is None or data_b is None:
+            return None
+        event = EVENT_LOOKUP.get((data_a[0], data_b[0]))
+        if event is None:
+            return None
+        kind, swap = event
+        if swap:
+            data_a, data_b = data_b, data_a
+        return kind, data_a[1], data_b[1]
+
+    def BeginContact(self, contact):
+        event = self.get_event(contact)
+        if event is not None:
+            self.events.add(*event, True, 0.0)
+
+    def PostSolve(self, contact, impulse):
+        event = self.get_event(contact)
+        if event is not None:
+            self.events.add(*event, False, sum(impulse.normalImpulses[:impulse.count]) / self.world_scale)
+
+
+class SimulatorSnapshot:
+    """
+    Array-backed copy of an AirHockeyBox2D state, see AirHockeyBox2D.snapshot.
+
+    Attributes:
+        names (tuple): object names, in the row order of `bodies`.
+        bodies (numpy.ndarray): (n, 6) rows of x, y, angle, x velocity, y velocity, angular velocity (box2d coords).
+        vertices (numpy.ndarray): (n_polygons, 4, 2) vertices of the blocks, obstacles and targets.
+        gravity (float): world gravity.
+        spawn (dict): the configuration the episode was reset to, see AirHockeyBox2D.sample_spawns.
+        rng_state (tuple): generator state and reset bank state.
+    """
+    __slots__ = ('names', 'bodies', 'vertices', 'gravity', 'spawn', 'rng_state')
+
+    def __init__(self, names, bodies, vertices, gravity, spawn, rng_state):
+        self.names = names
+        self.bodies = bodies
+        self.vertices = vertices
+        self.gravity = gravity
+        self.spawn = spawn
+        self.rng_state = rng_state
@@ -0,0 +1,476 @@
+import numpy as np
+from contacts import EVENT_NAMES, PADDLE_PUCK, PADDLE_WALL, PUCK_WALL, ContactEventBuffer
+from physics_presets import get_physics_params
+from state_layout import EGO_PADDLE, POS_X, POS_Y, VEL_X, VEL_Y, puck_offset, state_size
+
+# box2d's table edges have a skin of 2 * b2_linearSlop and its position solver leaves b2_linearSlop of it
+# overlapping, so circles come to rest this far (meters, at world_scale 1) short of the walls
+WALL_SKIN = 0.005
+
+
+class AirHockeyNumpyBatch:
+    """
+    Pure-NumPy air hockey simulator that steps many tables at once.
+
+    State is kept as struct-of-arrays in Box2D coordinates (so the force logic mirrors
+    AirHockeyBox2D line by line), and written in env coordinates into a (num_tables, state size)
+    array with the state_layout slot offsets when it is read out.
+    Only circles are simulated: paddles, pucks and the four table walls. Blocks, obstacles
+    and targets are not supported by this backend.
+
+    The integration follows the same order as a Box2D island solve: forces and gravity are
+    integrated into velocities, linear damping is applied, positions are integrated, and then
+    circle-circle and circle-wall contacts are resolved with restitution (using Box2D's
+    velocity threshold, below which collisions are inelastic).
+
+    Paddle-puck, puck-wall and paddle-wall contacts of every table are kept in arrays indexed by
+    event kind (see contacts.py), table 0's are also written to a ContactEventBuffer like AirHockeyBox2D's.
+    """
+
+    def __init__(self,
+                 num_paddles,
+                 num_pucks,
+                 num_blocks,
+                 num_obstacles,
+                 num_targets,
+                 absorb_target,
+                 length,
+                 width,
+                 puck_radius,
+                 paddle_radius,
+                 block_width,
+                 max_force_timestep,
+                 force_scaling,
+                 paddle_damping,
+                 puck_damping,
+                 render_size,
+                 render_masks=False,
+                 gravity=-5,
+                 paddle_density=1000,
+                 puck_density=250,
+                 block_density=1000,
+                 max_paddle_vel=2,
+                 time_frequency=20,
+                 num_tables=1,
+                 restitution=1.0,
+                 restitution_threshold=1.0,
+                 physics_preset='default',
+                 physics_substeps=None,
+                 velocity_iterations=None,
+                 position_iterations=None,
+                 action_repeat=None,
+                 pooled_reset=True,
+                 reset_bank_size=None,
+                 paddle_control='force',
+                 world_scale=1.0,
+                 bullet=True,
+                 skip_resting=False):
+
+        if num_paddles != 1:
+            raise ValueError("numpy_batch simulator only supports a single paddle (num_paddles: 1).")
+        if num_blocks > 0 or num_obstacles > 0 or num_targets > 0:
+            raise ValueError("numpy_batch simulator does not support blocks, obstacles or targets.")
+        # box2d-only simulator_params, accepted so both simulators take the same config. pooled_reset,
+        # reset_bank_size, world_scale, bullet and skip_resting tune how box2d runs and have nothing to tune
+        # here, but kinematic paddles would change the game
+        if paddle_control != 'force':
+            raise ValueError("numpy_batch simulator only supports force paddles (paddle_control: force), "
+                             "kinematic paddles are box2d-only.")
+
+        # task specific params
+        self.num_tables = num_tables
+        self.num_pucks = num_pucks
+        self.num_paddles = num_paddles
+        self.multiagent = num_paddles > 1
+        self.num_blocks = num_blocks
+        self.num_obstacles = num_obstacles
+        self.num_targets = num_targets
+        self.absorb_target = absorb_target
+
+        # physics / world params
+        self.length, self.width = length, width
+        self.paddle_radius = paddle_radius
+        self.puck_radius = puck_radius
+        self.block_width = block_width
+        self.max_force_timestep = max_force_timestep
+        self.time_frequency = time_frequency
+        self.time_per_step = 1 / self.time_frequency
+        # contacts are resolved in a single pass here, so velocity / position iterations are
+        # accepted for config compatibility with AirHockeyBox2D but have no effect
+        self.physics_params = get_physics_params(physics_preset,
+                                                 physics_substeps=physics_substeps,
+                                                 velocity_iterations=velocity_iterations,
+                                                 position_iterations=position_iterations,
+                                                 action_repeat=action_repeat)
+        self.physics_substeps = self.physics_params['physics_substeps']
+        self.action_repeat = self.physics_params['action_repeat']
+        self.physics_time_step = self.time_per_step / self.physics_substeps
+        self.force_scaling = force_scaling
+        self.paddle_damping = paddle_damping
+        self.puck_damping = puck_damping
+        self.gravity = gravity
+        self.restitution = restitution
+        self.restitution_threshold = restitution_threshold
+        self.paddle_density = paddle_density
+        self.puck_density = puck_density
+        self.block_density = block_density
+        self.paddle_mass = self.paddle_density * np.pi * self.paddle_radius ** 2
+        self.puck_mass = self.puck_density * np.pi * self.puck_radius ** 2
+
+        # same derived limits as AirHockeyBox2D
+        self.max_paddle_vel = max_paddle_vel
+        max_a = self.max_paddle_vel / self.time_per_step
+        max_f = self.paddle_mass * max_a
+        puck_max_a = max_f / self.puck_mass
+        self.max_puck_vel = puck_max_a * self.time_per_step
+
+        # visualization params are kept for config compatibility (the renderer needs Box2D bodies)
+        self.ppm = render_size / self.width
+        self.render_width = int(render_size)
+        self.render_length = int(self.ppm * self.length)
+        self.render_masks = render_masks
+
+        self.table_x_min = -self.width / 2
+        self.table_x_max = self.width / 2
+        self.table_y_min = -self.length / 2
+        self.table_y_max = self.length / 2
+
+        self.min_goal_radius = self.width / 16
+        self.max_goal_radius = self.width / 4
+
+        self.metadata = {}
+
+        # struct-of-arrays state, box2d coordinates
+        n = self.num_tables
+        self.paddle_pos = np.zeros((n, self.num_paddles, 2))
+        self.paddle_vel = np.zeros((n, self.num_paddles, 2))
+        self.puck_pos = np.zeros((n, self.num_pucks, 2))
+        self.puck_vel = np.zeros((n, self.num_pucks, 2))
+        self.table_gravity = np.zeros(n)
+        self.state = np.zeros((n, state_size(self.num_paddles, self.num_pucks)))
+        # (state offset, position view, velocity view) for every body, in state_layout order
+        self.state_bodies = [(EGO_PADDLE, self.paddle_pos[:, 0], self.paddle_vel[:, 0])]
+        self.state_bodies += [(puck_offset(i), self.puck_pos[:, i], self.puck_vel[:, i]) for i in range(self.num_pucks)]
+
+        # per-substep damping factors, same form as the box2d version pybox2d wraps (2.3.0):
+        # v *= clamp(1 - h * c, 0, 1), not the 1 / (1 + h * c) of later versions
+        self.paddle_damping_factor = min(max(1.0 - self.physics_time_step * self.paddle_damping, 0.0), 1.0)
+        self.puck_damping_factor = min(max(1.0 - self.physics_time_step * self.puck_damping, 0.0), 1.0)
+        self.puck_pairs = [(i, j) for i in range(self.num_pucks) for j in range(i + 1, self.num_pucks)]
+
+        # contacts of the current step per event kind: (n, paddles, pucks), (n, pucks) and (n, paddles) arrays
+        shapes = {PADDLE_PUCK: (n, self.num_paddles, self.num_pucks), PUCK_WALL: (n, self.num_pucks),
+                  PADDLE_WALL: (n, self.num_paddles)}
+        self.contact_touching = {kind: np.zeros(shape, dtype=bool) for kind, shape in shapes.items()}
+        self.contact_was_touching = {kind: np.zeros(shape, dtype=bool) for kind, shape in shapes.items()}
+        self.contact_begin = {kind: np.zeros(shape, dtype=bool) for kind, shape in shapes.items()}
+        self.contact_impulse = {kind: np.zeros(shape) for kind, shape in shapes.items()}
+        # contacts that began (hits) per table and event kind since the table's last reset
+        self.hit_counts = np.zeros((n, len(EVENT_NAMES)), dtype=int)
+        self.contact_events = ContactEventBuffer()
+        # event kinds with contacts this step and the last, the bookkeeping skips the others
+        self.touched = set()
+        self.was_touched = set()
+        # spawns come from this simulator's own generator, see seed_rng. every reset already draws
+        # the spawns of all its tables at once, so there is no reset bank
+        self.rng = np.random.default_rng()
+        self.reset()
+
+    @staticmethod
+    def from_dict(state_dict):
+        return AirHockeyNumpyBatch(**state_dict)
+
+    def seed_rng(self, seed):
+        """
+        Restarts the spawn sequence from seed (an int, or a np.random.Generator to share).
+        """
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self, seed=None, indices=None, **kwargs):
+        """
+        Resets all tables, or only the tables in `indices`.
+
+        Spawn distributions match AirHockeyBox2D single-agent resets: the puck starts at the
+        far end at a random lateral offset moving towards the paddle, and the paddle starts at rest
+        in its home region.
+        """
+        if seed is not None:
+            self.seed_rng(seed)
+
+        if indices is None:
+            indices = np.arange(self.num_tables)
+        indices = np.asarray(indices)
+        n = len(indices)
+
+        if type(self.gravity) == list:
+            self.table_gravity[indices] = self.rng.uniform(low=self.gravity[0], high=self.gravity[1], size=n)
+        else:
+            self.table_gravity[indices] = self.gravity
+
+        self.puck_pos[indices, :, 0] = self.rng.uniform(low=-self.width / 3, high=self.width / 3, size=(n, self.num_pucks))
+        self.puck_pos[indices, :, 1] = self.length / 2 - 0.01
+        self.puck_vel[indices, :, 0] = 0
+        self.puck_vel[indices, :, 1] = -1
+
+        self.paddle_pos[indices, :, 0] = 0
+        self.paddle_pos[indices, :, 1] = -self.length / 2 + 0.01
+        self.paddle_vel[indices] = 0
+
+        # pucks spawn overlapping the far wall; box2d's position solver pushes them out on the first step
+        self.collide_walls(self.puck_pos, self.puck_vel, self.puck_radius)
+        self.reset_contacts(indices)
+        return self.get_current_state(single=self.num_tables == 1)
+
+    def snapshot(self):
+        """
+        Copies the state of every table and the generator state, see AirHockeyBox2D.snapshot.
+        """
+        return BatchSnapshot(self.paddle_pos.copy(), self.paddle_vel.copy(), self.puck_pos.copy(),
+                             self.puck_vel.copy(), self.table_gravity.copy(), self.rng.bit_generator.state)
+
+    def restore(self, snapshot):
+        np.copyto(self.paddle_pos, snapshot.paddle_pos)
+        np.copyto(self.paddle_vel, snapshot.paddle_vel)
+        np.copyto(self.puck_pos, snapshot.puck_pos)
+        np.copyto(self.puck_vel, snapshot.puck_vel)
+        np.copyto(self.table_gravity, snapshot.table_gravity)
+        self.rng.bit_generator.state = snapshot.rng_state
+        self.reset_contacts(np.arange(self.num_tables))
+        return self.get_current_state(single=self.num_tables == 1)
+
+    def convert_to_box2d_coords(self, actions):
+        return np.stack((actions[:, 1], -actions[:, 0]), axis=1)
+
+    def get_current_state(self, single=False):
+        """
+        Writes every table's state into the (num_tables, state size) array, in env coordinates.
+
+        With `single` only the row of table 0 is returned, which is what AirHockeyEnv expects when
+        it drives this backend with num_tables: 1. The buffer is overwritten on every call.
+        """
+        state = self.state
+        for offset, pos, vel in self.state_bodies:
+            # box2d (x, y) -> env (-y, x)
+            np.negative(pos[:, 1], out=state[:, offset + POS_X])
+            state[:, offset + POS_Y] = pos[:, 0]
+            np.negative(vel[:, 1], out=state[:, offset + VEL_X])
+            state[:, offset + VEL_Y] = vel[:, 0]
+        return state[0] if single else state
+
+    # s, a -> s'
+    def get_transition(self, actions):
+        """
+        Advances every table by action_repeat control steps.
+
+        Args:
+            actions (numpy.ndarray): (num_tables, 2) delta-position actions in env coordinates.
+                A single (2,) action is accepted when num_tables == 1.
+        """
+        actions = np.asarray(actions, dtype=float)
+        single = actions.ndim == 1
+        if single:
+            if self.num_tables != 1:
+                raise ValueError("A single action was given but the simulator holds %d tables." % self.num_tables)
+            actions = actions.reshape(1, 2)
+        self.clear_contacts()
+        for _ in range(self.action_repeat):
+            action = self.convert_to_box2d_coords(actions)
+            force = self.get_paddle_force(action)
+            for _ in range(self.physics_substeps):
+                self.integrate(force)
+                self.solve_contacts()
+            self.clamp_paddle()
+        self.record_contacts()
+        return self.get_current_state(single=single)
+
+    def get_paddle_force(self, action):
+        # vectorized version of the force logic in AirHockeyBox2D.get_singleagent_transition
+        dt = self.time_per_step
+        pos = self.paddle_pos[:, 0]
+
+        near_center = pos[:, 1] > 0 - 3 * self.paddle_radius
+        action[near_center, 1] = np.minimum(action[near_center, 1], 0)
+
+        vel = action / dt
+        vel_mag = np.linalg.norm(vel, axis=1, keepdims=True)
+        vel = np.where(vel_mag > self.max_paddle_vel, vel / (vel_mag + 1e-8) * self.max_paddle_vel, vel)
+
+        force = self.paddle_mass * vel / dt
+        force_mag = np.linalg.norm(force, axis=1, keepdims=True)
+        force = np.where(force_mag > self.max_force_timestep, force / (force_mag + 1e-8) * self.max_force_timestep, force)
+
+        over_center = pos[:, 1] > 0
+        new_force = np.maximum(self.force_scaling * self.paddle_mass * action[:, 1], -self.max_force_timestep)
+        force[over_center, 1] = np.minimum(new_force[over_center], 0)
+        return force
+
+    def integrate(self, force):
+        dt = self.physics_time_step
+        self.paddle_vel[:, 0] += dt * force / self.paddle_mass
+        self.paddle_vel *= self.paddle_damping_factor
+        # paddles have gravityScale = 0, pucks feel the table gravity
+        self.puck_vel[:, :, 1] += dt * self.table_gravity[:, None]
+        self.puck_vel *= self.puck_damping_factor
+        self.paddle_pos += dt * self.paddle_vel
+        self.puck_pos += dt * self.puck_vel
+
+    def solve_contacts(self):
+        for k in range(self.num_pucks):
+            for p in range(self.num_paddles):
+                contact = self.collide_circles(self.paddle_pos[:, p], self.paddle_vel[:, p], self.paddle_radius, self.paddle_mass,
+                                               self.puck_pos[:, k], self.puck_vel[:, k], self.puck_radius, self.puck_mass)
+                if contact is not None:
+                    self.add_contact(PADDLE_PUCK, (slice(None), p, k), *contact)
+        for i, j in self.puck_pairs:
+            self.collide_circles(self.puck_pos[:, i], self.puck_vel[:, i], self.puck_radius, self.puck_mass,
+                                 self.puck_pos[:, j], self.puck_vel[:, j], self.puck_radius, self.puck_mass)
+        contact = self.collide_walls(self.puck_pos, self.puck_vel, self.puck_radius)
+        if contact is not None:
+            self.add_contact(PUCK_WALL, Ellipsis, contact[0], self.puck_mass * contact[1][contact[0]])
+        contact = self.collide_walls(self.paddle_pos, self.paddle_vel, self.paddle_radius)
+        if contact is not None:
+            self.add_contact(PADDLE_WALL, Ellipsis, contact[0], self.paddle_mass * contact[1][contact[0]])
+
+    def add_contact(self, kind, index, hit, impulse):
+        """
+        Marks the bodies at `index` of the `kind` contact arrays as touching where `hit`, and adds up their impulse.
+        """
+        touching = self.contact_touching[kind][index]
+        touching[hit] = True
+        total = self.contact_impulse[kind][index]
+        total[hit] += impulse
+        self.touched.add(kind)
+
+    def clear_contacts(self):
+        if self.touched:
+            for kind in self.touched:
+                self.contact_touching[kind][:] = False
+                self.contact_impulse[kind][:] = 0
+            self.touched = set()
+        self.contact_events.clear()
+
+    def record_contacts(self):
+        """
+        Finds the contacts that began this step, counts them as hits and writes table 0's contacts to contact_events.
+        """
+        for kind in self.touched | self.was_touched:
+            touching = self.contact_touching[kind]
+            was_touching = self.contact_was_touching[kind]
+            begin = self.contact_begin[kind]
+            np.greater(touching, was_touching, out=begin)
+            if begin.any():
+                self.hit_counts[:, kind] += begin.reshape(self.num_tables, -1).sum(axis=1)
+            np.copyto(was_touching, touching)
+            for body in zip(*np.nonzero(touching[0])):
+                a, b = (int(body[0]), int(body[1])) if len(body) == 2 else (int(body[0]), -1)
+                self.contact_events.add(kind, a, b, begin[0][body], self.contact_impulse[kind][0][body])
+        self.was_touched = self.touched
+
+    def reset_contacts(self, indices):
+        for kind in self.contact_touching:
+            self.contact_was_touching[kind][indices] = False
+            self.contact_begin[kind][indices] = False
+        self.hit_counts[indices] = 0
+        if 0 in indices:
+            self.contact_events.reset_counts()
+
+    def get_contact_events(self):
+        """
+        Contacts of table 0 during the last get_transition, see AirHockeyBox2D.get_contact_events.
+        Use the contact_touching / contact_begin / contact_impulse arrays for all tables.
+        """
+        return self.contact_events.get_events()
+
+    def ego_hit_puck(self):
+        """
+        (num_tables,) whether the ego paddle started touching a puck during the last get_transition.
+        """
+        return self.contact_begin[PADDLE_PUCK][:, 0].any(axis=1)
+
+    def get_restitution(self, approach_speed):
+        # box2d only applies restitution above b2_velocityThreshold
+        return np.where(approach_speed > self.restitution_threshold, self.restitution, 0.0)
+
+    def collide_circles(self, pos_a, vel_a, radius_a, mass_a, pos_b, vel_b, radius_b, mass_b):
+        """
+        Resolves contacts between circle a and circle b on every table, in place.
+
+        Returns:
+            None without contacts, else the (num_tables,) hit mask and the normal impulse of every hit table.
+        """
+        delta = pos_b - pos_a
+        dist = np.linalg.norm(delta, axis=1)
+        overlap = radius_a + radius_b - dist
+        hit = overlap > 0
+        if not np.any(hit):
+            return
+        normal = delta[hit] / (dist[hit, None] + 1e-8)
+        inv_a, inv_b = 1 / mass_a, 1 / mass_b
+        inv_sum = inv_a + inv_b
+
+        # push the bodies apart along the normal, weighted by inverse mass
+        correction = normal * (overlap[hit] / inv_sum)[:, None]
+        pos_a[hit] -= correction * inv_a
+        pos_b[hit] += correction * inv_b
+
+        rel_vel = np.sum((vel_b[hit] - vel_a[hit]) * normal, axis=1)
+        approaching = rel_vel < 0
+        e = self.get_restitution(-rel_vel)
+        impulse_mag = np.where(approaching, -(1 + e) * rel_vel / inv_sum, 0.0)
+        impulse = impulse_mag[:, None] * normal
+        vel_a[hit] -= impulse * inv_a
+        vel_b[hit] += impulse * inv_b
+        return hit, impulse_mag
+
+    def collide_walls(self, pos, vel, radius):
+        """
+        Resolves contacts between circles and the four table walls, in place.
+
+        Returns:
+            None without contacts, else a touching mask and the velocity change per circle (pos.shape[:-1] arrays).
+        """
+        radius = radius + WALL_SKIN
+        bounds = ((0, self.table_x_min + radius, self.table_x_max - radius),
+                  (1, self.table_y_min + radius, self.table_y_max - radius))
+        contact = None
+        for axis, low, high in bounds:
+            p = pos[..., axis]
+            v = vel[..., axis]
+            below = p < low
+            above = p > high
+            for side, limit, sign in ((below, low, 1), (above, high, -1)):
+                if np.any(side):
+                    p[side] = limit
+                    old = v[side]
+                    speed = -sign * old
+                    v[side] = np.where(speed > 0, sign * self.get_restitution(speed) * speed, old)
+                    if contact is None:
+                        contact = (np.zeros(p.shape, dtype=bool), np.zeros(p.shape))
+                    contact[0][side] = True
+                    contact[1][side] += np.abs(v[side] - old)
+        return contact
+
+    def clamp_paddle(self):
+        # same post-step corrections as AirHockeyBox2D.get_singleagent_transition
+        vel = self.paddle_vel[:, 0]
+        vel_mag = np.linalg.norm(vel, axis=1, keepdims=True)
+        np.copyto(vel, vel / (vel_mag + 1e-8) * self.max_paddle_vel, where=vel_mag > self.max_paddle_vel)
+
+        pos = self.paddle_pos[:, 0]
+        np.clip(pos[:, 0], self.table_x_min, self.table_x_max, out=pos[:, 0])
+        np.minimum(pos[:, 1], min(0, self.table_y_max), out=pos[:, 1])
+
+
+class BatchSnapshot:
+    """
+    Copy of the AirHockeyNumpyBatch arrays (box2d coordinates), see AirHockeyNumpyBatch.snapshot.
+    """
+    __slots__ = ('paddle_pos', 'paddle_vel', 'puck_pos', 'puck_vel', 'table_gravity', 'rng_state')
+
+    def __init__(self, paddle_pos, paddle_vel, puck_pos, puck_vel, table_gravity, rng_state):
+        self.paddle_pos = paddle_pos
+        self.paddle_vel = paddle_vel
+        self.puck_pos = puck_pos
+        self.puck_vel = puck_vel
+        self.table_gravity = table_gravity
+        self.rng_state = rng_state
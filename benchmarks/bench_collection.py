@@ -0,0 +1,90 @@
+import argparse
+import copy
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from trajectory_collection import collect_trajectories, get_columns
+from trajectory_dataset import TrajectoryDataset, TrajectoryWriter
+from vec_env import make_air_hockey_vec_env
+
+
+def make_params(air_hockey_cfg):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['max_timesteps'] = 200
+    return air_hockey_params
+
+
+def make_vec_env(air_hockey_params, num_envs, num_workers):
+    if num_envs == 1:
+        env = AirHockeyEnv.from_dict(air_hockey_params)
+        return DummyVecEnv([lambda: env])
+    return make_air_hockey_vec_env(air_hockey_params, num_envs, num_workers=num_workers, seed=0)
+
+
+def check_dataset(dataset):
+    """
+    Every episode is contiguous, comes from one env and episode id, has timesteps 0..length-1 and each
+    next_obs is the following row's obs.
+    Returns the number of distinct (env id, episode id) pairs and of distinct first observations.
+    """
+    env_ids, episode_ids = dataset.get_column('env_id')[:, 0], dataset.get_column('episode_id')[:, 0]
+    timesteps = dataset.get_column('timestep')[:, 0]
+    first_obs = set()
+    for i, (start, stop) in enumerate(dataset.get_episode_bounds()):
+        assert np.all(env_ids[start:stop] == env_ids[start]) and np.all(episode_ids[start:stop] == episode_ids[start])
+        assert np.array_equal(timesteps[start:stop], np.arange(stop - start))
+        episode = dataset.get_episode(i)
+        assert np.array_equal(episode['next_obs'][:-1], episode['obs'][1:])
+        first_obs.add(dataset.get_column('obs', start, start + 1).tobytes())
+    assert dataset.episode_ends[-1] == len(dataset)
+    return len(set(zip(env_ids, episode_ids))), len(first_obs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check and time batched multi-env trajectory collection.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_steps', type=int, default=20000, help='Transitions collected per run.')
+    parser.add_argument('--num_envs', type=int, nargs='+', default=[1, 4, 16], help='Env counts to compare.')
+    parser.add_argument('--num_workers', type=int, default=None, help='Worker processes (default: cpu count).')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    air_hockey_params = make_params(air_hockey_cfg)
+    # an untrained policy costs the same to run as a trained one
+    model = PPO('MlpPolicy', AirHockeyEnv.from_dict(air_hockey_params), seed=0)
+    policy = lambda obs: model.predict(obs, deterministic=True)[0]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for num_envs in args.num_envs:
+            vec_env = make_vec_env(air_hockey_params, num_envs, args.num_workers)
+            path = os.path.join(tmp_dir, f'trajs_{num_envs}')
+            writer = TrajectoryWriter(path, get_columns(vec_env), chunk_size=8192)
+            start = time.perf_counter()
+            n_episodes = collect_trajectories(policy, vec_env, writer, args.n_steps)
+            writer.close()
+            elapsed = time.perf_counter() - start
+            vec_env.close()
+            dataset = TrajectoryDataset(path)
+            n_ids, n_first_obs = check_dataset(dataset)
+            print(f"num_envs={num_envs:3d}: {len(dataset) / elapsed:8.0f} transitions/s, {n_episodes} episodes "
+                  f"({n_ids} distinct env/episode ids, {n_first_obs} distinct first observations)")
+    finally:
+        shutil.rmtree(tmp_dir)
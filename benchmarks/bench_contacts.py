@@ -0,0 +1,97 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from contacts import EVENT_NAMES, PADDLE_PUCK
+from state_layout import EGO_X, PUCK_X
+
+
+def make_env(air_hockey_cfg, simulator):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['task'] = 'puck_touch'
+    air_hockey_params['simulator'] = simulator
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def chase_action(state, noise):
+    # move the paddle at the puck so episodes have paddle-puck hits
+    return np.clip((state[PUCK_X:PUCK_X + 2] - state[EGO_X:EGO_X + 2]) * 3 + noise, -1, 1)
+
+
+def rollout(env, noises):
+    """
+    Returns per-step contact flags, the number of ego paddle-puck hits in the step infos, and the hit counts of every
+    finished episode.
+    """
+    env.reset(seed=0)
+    step_contacts, ego_hits, hit_counts = [], 0, []
+    for noise in noises:
+        _, _, terminated, truncated, info = env.step(chase_action(env.current_state, noise))
+        step_contacts.append('contacts' in info)
+        ego_hits += any(event['kind'] == PADDLE_PUCK and event['a'] == 0 and event['begin']
+                        for event in info.get('contacts', ()))
+        if terminated or truncated:
+            hit_counts.append(info['hit_counts'])
+            env.reset()
+    return np.array(step_contacts), ego_hits, hit_counts
+
+
+def time_steps(env, noises, n_repeats=5):
+    """
+    Best of n_repeats median us per env step: over all steps, steps with contact events and steps without.
+    """
+    best_all, best_with, best_without = np.inf, np.inf, np.inf
+    for _ in range(n_repeats):
+        env.reset(seed=0)
+        with_contacts, without_contacts = [], []
+        for noise in noises:
+            action = chase_action(env.current_state, noise)
+            start = time.perf_counter()
+            _, _, terminated, truncated, info = env.step(action)
+            elapsed = time.perf_counter() - start
+            (with_contacts if 'contacts' in info else without_contacts).append(elapsed)
+            if terminated or truncated:
+                env.reset()
+        best_all = min(best_all, np.median(with_contacts + without_contacts) * 1e6)
+        if with_contacts:
+            best_with = min(best_with, np.median(with_contacts) * 1e6)
+        if without_contacts:
+            best_without = min(best_without, np.median(without_contacts) * 1e6)
+    return best_all, best_with, best_without
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check contact event recording and time env steps with and without contacts.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_steps', type=int, default=3000, help='Env steps per run.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    noises = np.random.RandomState(0).normal(scale=0.2, size=(args.n_steps, 2))
+    for simulator in ['box2d', 'numpy_batch']:
+        env = make_env(air_hockey_cfg, simulator)
+        step_contacts, ego_hits, hit_counts = rollout(env, noises)
+        hits = {name: sum(counts[name] for counts in hit_counts) for name in EVENT_NAMES}
+        print(f"{simulator}: {len(hit_counts)} episodes, steps with contacts {step_contacts.mean():.1%}, "
+              f"ego hits in step infos {ego_hits}, episode hit counts {hits}")
+        all_steps, with_contacts, without_contacts = time_steps(env, noises)
+        print(f"  env step {all_steps:.1f} us, steps with contacts {with_contacts:.1f} us, without {without_contacts:.1f} us")
+        if simulator == 'box2d':
+            # the same run with the listener detached (reset keeps the world), the buffer then stays empty
+            env.simulator.world.contactListener = None
+            print(f"  env step without the contact listener {time_steps(env, noises)[0]:.1f} us")
@@ -0,0 +1,151 @@
+import argparse
+import copy
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from env_server import AirHockeyEnvClient, AirHockeyEnvServer
+from vec_env import get_env_seeds
+
+
+def get_params(air_hockey_cfg, num_paddles=1, task=None):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['simulator_params']['num_paddles'] = num_paddles
+    if task is not None:
+        air_hockey_params['task'] = task
+    return air_hockey_params
+
+
+def run_server(air_hockey_params, num_envs, address, remote):
+    server = AirHockeyEnvServer(air_hockey_params, num_envs, address)
+    remote.send(server.address)
+    server.serve()
+
+
+def start_server(air_hockey_params, num_envs, address):
+    """
+    Runs a server in a child process. Returns the process and the address it listens on (TCP port 0
+    picks a free port).
+    """
+    ctx = mp.get_context('fork')
+    remote, work_remote = ctx.Pipe()
+    process = ctx.Process(target=run_server, args=(air_hockey_params, num_envs, address, work_remote), daemon=True)
+    process.start()
+    return process, remote.recv()
+
+
+def get_actions(client, n_steps, seed=0):
+    shape = (n_steps, *client.action_space.shape)
+    return np.random.default_rng(seed).uniform(-0.05, 0.05, size=shape)
+
+
+def flatten(obs):
+    return np.concatenate([obs[key].reshape(len(obs[key]), -1) for key in sorted(obs)], axis=1) \
+        if isinstance(obs, dict) else obs.reshape(len(obs), -1)
+
+
+def check_equivalence(client, air_hockey_params, n_steps):
+    """
+    Steps the served envs and the same envs in this process (same seeds, same actions, reset in the
+    same step) side by side: observations, rewards, flags and final observations must be identical.
+    Returns the number of episodes that ended.
+    """
+    envs = [AirHockeyEnv.from_dict(dict(air_hockey_params, seed=env_seed))
+            for env_seed in get_env_seeds(0, client.num_envs)]
+    obs, _ = client.reset(seed=0)
+    local = [env.reset(seed=i)[0] for i, env in enumerate(envs)]
+    assert np.array_equal(flatten(obs), flatten(stack(local)))
+    n_done = 0
+    for actions in get_actions(client, n_steps):
+        obs, rewards, terminated, truncated, infos = client.step(actions)
+        for i, env in enumerate(envs):
+            env_obs, reward, env_terminated, env_truncated, _ = env.step(actions[i])
+            assert np.array_equal(rewards[i], reward) and (terminated[i], truncated[i]) == (env_terminated, env_truncated)
+            if env_terminated or env_truncated:
+                assert infos['_final_obs'][i]
+                assert np.array_equal(flatten(stack([infos['final_obs'][i]])), flatten(stack([env_obs])))
+                env_obs, _ = env.reset()
+                n_done += 1
+            local[i] = env_obs
+        assert np.array_equal(flatten(obs), flatten(stack(local)))
+    return n_done
+
+
+def stack(observations):
+    if isinstance(observations[0], dict):
+        return {key: np.stack([obs[key] for obs in observations]) for key in observations[0]}
+    return np.stack(observations)
+
+
+def bench_local(air_hockey_params, num_envs, n_steps):
+    """
+    Returns microseconds per env step of the same pool stepped in this process.
+    """
+    envs = [AirHockeyEnv.from_dict(dict(air_hockey_params, seed=env_seed)) for env_seed in get_env_seeds(0, num_envs)]
+    for env in envs:
+        env.reset(seed=0)
+    shape = (n_steps, num_envs, envs[0].num_agents, 2) if envs[0].multiagent else (n_steps, num_envs, 2)
+    actions = np.random.default_rng(0).uniform(-0.05, 0.05, size=shape)
+    start = time.perf_counter()
+    for batch in actions:
+        for env, action in zip(envs, batch):
+            _, _, terminated, truncated, _ = env.step(action)
+            if terminated or truncated:
+                env.reset()
+    return (time.perf_counter() - start) / (n_steps * num_envs) * 1e6
+
+
+def bench_client(client, n_steps):
+    """
+    Returns the client's stats (see AirHockeyEnvClient.get_stats) over n_steps batched steps.
+    """
+    actions = get_actions(client, n_steps)
+    client.reset(seed=0)
+    client.reset_stats()
+    for batch in actions:
+        client.step(batch)
+    return client.get_stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve envs over a Unix socket and over TCP on localhost, check '
+                                                 'that the client matches in-process envs and report request latency '
+                                                 'and throughput.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_checked', type=int, default=500, help='Batched steps per equivalence check.')
+    parser.add_argument('--n_steps', type=int, default=2000, help='Batched steps per timing.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    socket_path = os.path.join(tempfile.mkdtemp(), 'air_hockey.sock')
+    for num_paddles, task in ((1, None), (1, 'goal_position_velocity'), (2, None)):
+        air_hockey_params = get_params(air_hockey_cfg, num_paddles, task)
+        for num_envs in (1, 8):
+            local_us = bench_local(air_hockey_params, num_envs, args.n_steps // num_envs)
+            for transport, address in (('unix', socket_path), ('tcp', ('127.0.0.1', 0))):
+                name = f"paddles={num_paddles} task={task or air_hockey_params['task']} envs={num_envs} {transport:4s}"
+                process, address = start_server(air_hockey_params, num_envs, address)
+                client = AirHockeyEnvClient(address)
+                n_done = check_equivalence(client, air_hockey_params, args.n_checked // num_envs)
+                stats = bench_client(client, args.n_steps // num_envs)
+                client.close(shutdown=True)
+                process.join()
+                step_us = stats['client']['step']['mean_us']
+                server_us = stats['server']['step']['mean_us']
+                print(f"{name}: same as in-process over {n_done:3d} episodes; {step_us:7.1f} us per request "
+                      f"({server_us:7.1f} us in the server), {stats['env_steps_per_s']:7.0f} env steps/s, "
+                      f"{local_us:5.1f} -> {step_us / num_envs:5.1f} us per env step")
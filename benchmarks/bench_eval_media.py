@@ -0,0 +1,110 @@
+import argparse
+import copy
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import yaml
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import DummyVecEnv, VecNormalize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from eval_media import render_eval_video, start_eval_media
+from render import HeadlessAirHockeyRenderer
+
+
+def make_params(air_hockey_cfg):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['max_timesteps'] = 200
+    return air_hockey_params
+
+
+def save_untrained_model(air_hockey_params, out_dir):
+    # a barely trained policy costs the same to run as a trained one
+    env = VecNormalize(DummyVecEnv([lambda: AirHockeyEnv.from_dict(air_hockey_params)]))
+    model = PPO('MlpPolicy', env, n_steps=64, seed=0)
+    model.learn(64)
+    model_filepath, vec_normalize_filepath = os.path.join(out_dir, 'model'), os.path.join(out_dir, 'vec_normalize.pkl')
+    model.save(model_filepath)
+    env.save(vec_normalize_filepath)
+    return model_filepath, vec_normalize_filepath
+
+
+def list_gifs(air_hockey_params, model_filepath, vec_normalize_filepath, out_dir, n_videos, n_episodes):
+    """
+    The previous trainer loop: videos one after another, frames resized and kept in a list until imageio.mimsave.
+    """
+    import imageio
+    env = AirHockeyEnv.from_dict(air_hockey_params)
+    renderer = HeadlessAirHockeyRenderer(env)
+    env_test = VecNormalize.load(vec_normalize_filepath, DummyVecEnv([lambda: env]))
+    model = PPO.load(model_filepath)
+    for gif_idx in range(n_videos):
+        frames = []
+        for _ in range(n_episodes):
+            obs = env_test.reset()
+            done = False
+            while not done:
+                frame = cv2.cvtColor(renderer.get_frame(), cv2.COLOR_BGR2RGB)
+                aspect_ratio = frame.shape[1] / frame.shape[0]
+                frames.append(cv2.resize(frame, (160, int(160 / aspect_ratio))))
+                action = model.predict(obs, deterministic=True)[0]
+                obs, rew, done, info = env_test.step(action)
+        imageio.mimsave(os.path.join(out_dir, f'list_{gif_idx}.gif'), frames, format='GIF', loop=0, duration=33)
+    env_test.close()
+
+
+def traced_peak(fn, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the old in-memory GIF loop with the background eval media stage.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_videos', type=int, default=5, help='Videos per run.')
+    parser.add_argument('--n_episodes', type=int, default=5, help='Episodes per video.')
+    parser.add_argument('--num_workers', type=int, default=None, help='Worker processes (default: cpu count).')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    air_hockey_params = make_params(air_hockey_cfg)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        model_filepath, vec_normalize_filepath = save_untrained_model(air_hockey_params, tmp_dir)
+        elapsed, peak = traced_peak(list_gifs, air_hockey_params, model_filepath, vec_normalize_filepath, tmp_dir,
+                                    args.n_videos, args.n_episodes)
+        print(f"list + imageio.mimsave:  {elapsed:6.2f} s blocking, peak traced memory {peak:6.1f} MB")
+        elapsed, peak = traced_peak(render_eval_video, air_hockey_params, model_filepath, vec_normalize_filepath,
+                                    os.path.join(tmp_dir, 'single'), n_episodes=args.n_episodes)
+        print(f"one streamed video (gif + mp4) in process: {elapsed:6.2f} s, peak traced memory {peak:6.1f} MB")
+
+        start = time.perf_counter()
+        job = start_eval_media(air_hockey_params, model_filepath, vec_normalize_filepath, tmp_dir,
+                               n_videos=args.n_videos, n_episodes=args.n_episodes, num_workers=args.num_workers)
+        returned = time.perf_counter() - start
+        paths = job.wait()
+        elapsed = time.perf_counter() - start
+        sizes = [os.path.getsize(path) // 1024 for path in paths]
+        print(f"start_eval_media: returned after {returned:.3f} s, {len(paths)} files written after {elapsed:.2f} s "
+              f"({min(sizes)}-{max(sizes)} KB)")
+    finally:
+        shutil.rmtree(tmp_dir)
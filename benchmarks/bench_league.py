@@ -0,0 +1,97 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import VecMonitor, VecNormalize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from league import (LeagueCallback, LeagueEvaluator, LeagueOpponentEnv, NumpyPolicy, OpponentPool,
+                    snapshot_policy)
+from vec_env import make_air_hockey_vec_env
+
+
+def make_params(air_hockey_cfg):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['max_timesteps'] = 200
+    return air_hockey_params
+
+
+def check_pool():
+    """
+    LRU eviction drops the snapshot played least recently, priority eviction the lowest rated one, the
+    newest snapshot always stays and harder opponents are sampled more.
+    """
+    pool = OpponentPool(max_size=3, eviction='lru')
+    for i in range(3):
+        pool.add({'step': i}, step=i)
+    pool.record_result(0, 1)
+    assert pool.add({'step': 3}, step=3)[1] == [1]
+    ids, probs = pool.get_sampling_probs()
+    assert ids == [0, 2, 3] and probs[0] > probs[1] == probs[2]
+
+    pool = OpponentPool(max_size=3, eviction='priority')
+    for i in range(3):
+        pool.add({'step': i}, step=i)
+    pool.update_elo(0, 2, score=0, n_games=4)
+    assert pool.add({'step': 3}, step=3)[1] == [0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the league opponent pool and policies, and time a short '
+                                                 'league training run.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_training_steps', type=int, default=8192, help='Learner steps of the training run.')
+    parser.add_argument('--num_envs', type=int, default=4, help='Envs of the training run.')
+    parser.add_argument('--num_workers', type=int, default=None, help='Env worker processes (default: cpu count).')
+    parser.add_argument('--eval_workers', type=int, default=1, help='Evaluation match processes.')
+    parser.add_argument('--snapshot_interval', type=int, default=1024, help='Learner steps between snapshots.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+    air_hockey_params = make_params(air_hockey_cfg)
+
+    check_pool()
+    print("opponent pool ok")
+
+    # the numpy opponents act like the torch policy, without its per-call overhead
+    env = LeagueOpponentEnv(air_hockey_params)
+    model = PPO('MlpPolicy', env, seed=0, device='cpu')
+    policy = NumpyPolicy(snapshot_policy(model))
+    obs = np.random.RandomState(0).uniform(-1, 1, size=(1000, 8))
+    torch_actions = model.predict(obs, deterministic=True)[0]
+    assert np.abs(policy.predict(obs) - torch_actions).max() < 1e-5
+    for name, predict in (('torch predict', lambda o: model.predict(o, deterministic=True)[0]),
+                          ('numpy predict', policy.predict)):
+        start = time.perf_counter()
+        for o in obs:
+            predict(o)
+        print(f"{name:14s} {(time.perf_counter() - start) / len(obs) * 1e6:8.1f} us per opponent action")
+
+    vec_env = make_air_hockey_vec_env(air_hockey_params, args.num_envs, num_workers=args.num_workers,
+                                      seed=0, make_env=LeagueOpponentEnv)
+    vec_env = VecNormalize(VecMonitor(vec_env))
+    pool = OpponentPool(max_size=4)
+    evaluator = LeagueEvaluator(pool, air_hockey_params, num_workers=args.eval_workers) if args.eval_workers else None
+    callback = LeagueCallback(pool, snapshot_interval=args.snapshot_interval, refresh_interval=256, evaluator=evaluator)
+    model = PPO('MlpPolicy', vec_env, n_steps=256, batch_size=256, n_epochs=2, seed=0, device='cpu')
+    start = time.perf_counter()
+    model.learn(total_timesteps=args.n_training_steps, callback=callback)
+    elapsed = time.perf_counter() - start
+    vec_env.close()
+    print(f"league training: {args.n_training_steps / elapsed:.0f} learner steps/s, "
+          f"{evaluator.n_games if evaluator else 0} evaluation games")
+    for row in pool.get_table():
+        print(row)
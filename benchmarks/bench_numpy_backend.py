@@ -0,0 +1,136 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey_box2d import AirHockeyBox2D
+from airhockey_numpy import AirHockeyNumpyBatch
+from state_layout import EGO_X, PUCK_X
+
+HORIZONS = (1, 5, 10, 20, 40)
+
+
+def make_simulators(air_hockey_cfg):
+    simulator_params = copy.deepcopy(air_hockey_cfg['air_hockey']['simulator_params'])
+    return AirHockeyBox2D.from_dict(simulator_params), AirHockeyNumpyBatch.from_dict(simulator_params)
+
+
+def copy_spawn(box2d, batch):
+    """
+    Puts table 0 of batch in box2d's current state (both keep box2d coordinates, batch in meters), then
+    pushes the pucks out of the far wall like AirHockeyNumpyBatch.reset.
+    """
+    scale = box2d.world_scale
+    body = box2d.paddles['paddle_ego'][0]
+    batch.paddle_pos[0, 0] = tuple(body.position)
+    batch.paddle_vel[0, 0] = tuple(body.linearVelocity)
+    for i, name in enumerate(box2d.puck_names):
+        body = box2d.pucks[name][0]
+        batch.puck_pos[0, i] = tuple(body.position)
+        batch.puck_vel[0, i] = tuple(body.linearVelocity)
+    batch.paddle_pos[0] /= scale
+    batch.paddle_vel[0] /= scale
+    batch.puck_pos[0] /= scale
+    batch.puck_vel[0] /= scale
+    batch.table_gravity[0] = box2d.world.gravity[1] / scale
+    batch.reset_contacts(np.arange(batch.num_tables))
+    assert np.allclose(batch.get_current_state(single=True), box2d.get_current_state())
+    batch.collide_walls(batch.puck_pos, batch.puck_vel, batch.puck_radius)
+
+
+TABLE_COUNTS = (1, 64, 1024, 4096)
+
+
+def chase_action(state, noise):
+    # move the paddle at the puck so episodes have paddle-puck hits, for one state or a batch of them
+    return np.clip((state[..., PUCK_X:PUCK_X + 2] - state[..., EGO_X:EGO_X + 2]) * 3 + noise, -1, 1)
+
+
+def compare(box2d, batch, n_episodes, n_steps, seed=0):
+    """
+    Plays the same chase actions (computed on the box2d state) in both backends from the same spawns.
+
+    Returns:
+        (n_episodes, n_steps) puck and paddle position errors in meters, and the fraction of episodes where
+        the first paddle-puck hit happens in the same step (or in neither).
+    """
+    noises = np.random.default_rng(seed).normal(scale=0.1, size=(n_episodes, n_steps, 2))
+    puck_errors, paddle_errors = np.zeros((n_episodes, n_steps)), np.zeros((n_episodes, n_steps))
+    same_first_hit = 0
+    for episode in range(n_episodes):
+        state = box2d.reset(seed=seed + episode)
+        copy_spawn(box2d, batch)
+        first_hits = [None, None]
+        for t in range(n_steps):
+            action = chase_action(state, noises[episode, t])
+            state = box2d.get_transition(action)
+            batch_state = batch.get_transition(action)
+            puck_errors[episode, t] = np.linalg.norm(state[PUCK_X:PUCK_X + 2] - batch_state[PUCK_X:PUCK_X + 2])
+            paddle_errors[episode, t] = np.linalg.norm(state[EGO_X:EGO_X + 2] - batch_state[EGO_X:EGO_X + 2])
+            for i, hit in enumerate((box2d.contact_events.ego_hit_puck, batch.ego_hit_puck()[0])):
+                if hit and first_hits[i] is None:
+                    first_hits[i] = t
+        same_first_hit += first_hits[0] == first_hits[1]
+    return puck_errors, paddle_errors, same_first_hit / n_episodes
+
+
+def time_steps(simulator, n_steps, seed=0, n_repeats=3):
+    """
+    Returns microseconds per control step of a chase rollout on every table of simulator, the best of
+    n_repeats runs.
+    """
+    num_tables = getattr(simulator, 'num_tables', 1)
+    shape = (n_steps, num_tables, 2) if num_tables > 1 else (n_steps, 2)
+    noises = np.random.default_rng(seed).normal(scale=0.1, size=shape)
+    times = []
+    for _ in range(n_repeats):
+        state = simulator.reset(seed=seed)
+        start = time.perf_counter()
+        for noise in noises:
+            state = simulator.get_transition(chase_action(state, noise))
+        times.append((time.perf_counter() - start) / n_steps * 1e6)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the numpy_batch backend with box2d from the same spawns and '
+                                                 'under the same actions: position errors over time, first hits, and '
+                                                 'step times and table-steps/s for one table and many.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_episodes', type=int, default=100, help='Episodes compared.')
+    parser.add_argument('--n_steps', type=int, default=5000, help='Control steps per timing.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    box2d, batch = make_simulators(air_hockey_cfg)
+    h = batch.physics_time_step
+    # box2d 2.3.0's damping, which numpy_batch uses, and the form of later box2d versions
+    dampings = {'clamp(1 - h c, 0, 1)': (batch.paddle_damping_factor, batch.puck_damping_factor),
+                '1 / (1 + h c)': (1 / (1 + h * batch.paddle_damping), 1 / (1 + h * batch.puck_damping))}
+    for name, (paddle_damping_factor, puck_damping_factor) in dampings.items():
+        batch.paddle_damping_factor, batch.puck_damping_factor = paddle_damping_factor, puck_damping_factor
+        puck_errors, paddle_errors, same_first_hit = compare(box2d, batch, args.n_episodes, max(HORIZONS))
+        print(f"damping {name}: same first hit in {same_first_hit:.0%} of {args.n_episodes} episodes")
+        for horizon in HORIZONS:
+            print(f"  after {horizon:2d} steps: median puck error {np.median(puck_errors[:, horizon - 1]):.2e} m, "
+                  f"median paddle error {np.median(paddle_errors[:, horizon - 1]):.2e} m")
+    # box2d steps one table at a time, numpy_batch pays its per-step overhead once for all its tables
+    box2d_us = time_steps(box2d, args.n_steps)
+    print(f"box2d: {box2d_us:7.1f} us per control step, {1e6 / box2d_us:9.0f} table-steps/s")
+    for num_tables in TABLE_COUNTS:
+        batch = AirHockeyNumpyBatch.from_dict(dict(air_hockey_cfg['air_hockey']['simulator_params'],
+                                                   num_tables=num_tables))
+        batch_us = time_steps(batch, max(args.n_steps // num_tables, 20))
+        print(f"numpy_batch, {num_tables:4d} tables: {batch_us:7.1f} us per control step, "
+              f"{num_tables * 1e6 / batch_us:9.0f} table-steps/s ({box2d_us * num_tables / batch_us:6.1f}x box2d)")
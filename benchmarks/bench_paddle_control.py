@@ -0,0 +1,120 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from contacts import PADDLE_PUCK
+
+
+def make_env(air_hockey_cfg, paddle_control, num_paddles=1, time_frequency=None):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    simulator_params = air_hockey_params['simulator_params']
+    simulator_params['paddle_control'] = paddle_control
+    simulator_params['num_paddles'] = num_paddles
+    if time_frequency is not None:
+        simulator_params['time_frequency'] = time_frequency
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def get_target(simulator, paddle, action):
+    """
+    Where the action asks the ego paddle to go (env coords), on the part of the table a kinematic paddle
+    is kept to (env x is -box2d y, env y is box2d x).
+    """
+    return np.array([np.clip(paddle[0] + action[0], -simulator.paddle_y_max, -simulator.paddle_y_min),
+                     np.clip(paddle[1] + action[1], -simulator.paddle_x_max, simulator.paddle_x_max)])
+
+
+def check_control(env, n_steps, seed=0):
+    """
+    Plays random actions the paddle can follow within one step (at most max_paddle_vel * time_per_step).
+
+    Returns:
+        dict: mean and max distance of the ego paddle from its target after each step, the fraction of
+        steps that ended with the paddle out of bounds (see RewardEngine.termination) or the puck off the
+        table, and the paddle-puck impulses (median, 99th percentile and max) and hits per 1000 steps.
+    """
+    simulator = env.simulator
+    rng = np.random.default_rng(seed)
+    reach = simulator.max_paddle_vel * simulator.time_per_step / np.sqrt(2)
+    radius = simulator.paddle_radius
+    errors, impulses = [], []
+    n_out = n_escaped = 0
+    obs, _ = env.reset(seed=seed)
+    for _ in range(n_steps):
+        action = rng.uniform(-reach, reach, size=2)
+        target = get_target(simulator, obs[0:2], action)
+        obs, _, terminated, truncated, info = env.step(action)
+        errors.append(np.hypot(*(obs[0:2] - target)))
+        n_out += (obs[0] < radius) or (obs[0] > simulator.length / 2 - radius) \
+            or (abs(obs[1]) > simulator.width / 2 - radius)
+        n_escaped += (abs(obs[4]) > simulator.length / 2) or (abs(obs[5]) > simulator.width / 2)
+        contacts = info.get('contacts')
+        if contacts is not None:
+            impulses.extend(contacts['impulse'][contacts['kind'] == PADDLE_PUCK])
+        if terminated or truncated:
+            obs, _ = env.reset()
+    impulses = np.array(impulses) if impulses else np.zeros(1)
+    return {'mean_error': np.mean(errors), 'max_error': np.max(errors), 'out_of_bounds': n_out / n_steps,
+            'escaped': n_escaped / n_steps, 'impulse': np.percentile(impulses, [50, 99, 100]),
+            'hits': len(impulses) / n_steps * 1000}
+
+
+def bench_steps(envs, n_steps, n_repeats=5, seed=0):
+    """
+    Returns microseconds per env step of small random moves for every env, the best of n_repeats runs
+    interleaved between the envs.
+    """
+    rng = np.random.default_rng(seed)
+    actions = rng.uniform(-0.05, 0.05, size=(n_steps, 2, 2) if envs[0].multiagent else (n_steps, 2))
+    times = [[] for _ in envs]
+    for _ in range(n_repeats):
+        for env, env_times in zip(envs, times):
+            env.reset(seed=seed)
+            start = time.perf_counter()
+            for action in actions:
+                _, _, terminated, truncated, _ = env.step(action)
+                if terminated or truncated:
+                    env.reset()
+            env_times.append((time.perf_counter() - start) / n_steps * 1e6)
+    return [min(env_times) for env_times in times]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare force and kinematic paddle control: step times, how '
+                                                 'closely the paddle follows its actions, bounds and puck hits '
+                                                 'at several control frequencies.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_steps', type=int, default=5000, help='Env steps per timing and per check.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    for num_paddles in (1, 2):
+        times = bench_steps([make_env(air_hockey_cfg, paddle_control, num_paddles)
+                             for paddle_control in ('force', 'kinematic')], args.n_steps // 5)
+        print(f"paddles={num_paddles}: force {times[0]:6.1f} us, kinematic {times[1]:6.1f} us per env step")
+
+    for time_frequency in (20, 10, 5):
+        for paddle_control in ('force', 'kinematic'):
+            result = check_control(make_env(air_hockey_cfg, paddle_control, time_frequency=time_frequency),
+                                   args.n_steps)
+            print(f"{time_frequency:2d} Hz {paddle_control:9s}: target error {result['mean_error'] * 100:5.2f}cm "
+                  f"(max {result['max_error'] * 100:5.2f}cm), out of bounds {result['out_of_bounds']:6.2%}, "
+                  f"puck off the table {result['escaped']:6.2%}, {result['hits']:5.1f} hits per 1000 steps, "
+                  "impulse median / p99 / max " + " / ".join(f"{i:.2f}" for i in result['impulse']))
+            # pucks pinned between a paddle and a wall used to be pushed through the wall
+            assert result['escaped'] == 0, f"{time_frequency} Hz {paddle_control}: pucks left the table"
@@ -0,0 +1,154 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey_box2d import AirHockeyBox2D
+from physics_presets import PHYSICS_PRESETS
+from state_layout import EGO_X, PUCK_X
+
+# (physics_substeps, velocity_iterations, position_iterations, action_repeat)
+SETTINGS = [(1, 10, 10, 1), (1, 8, 3, 1), (1, 6, 2, 1), (1, 4, 1, 1), (1, 2, 1, 1), (1, 1, 1, 1),
+            (2, 4, 1, 1), (2, 10, 10, 1), (4, 10, 10, 1), (1, 10, 10, 2), (1, 4, 1, 2), (1, 10, 10, 4)]
+
+
+def make_simulator(simulator_params, physics_substeps, velocity_iterations, position_iterations, action_repeat):
+    simulator_params = copy.deepcopy(simulator_params)
+    simulator_params.update(physics_substeps=physics_substeps, velocity_iterations=velocity_iterations,
+                            position_iterations=position_iterations, action_repeat=action_repeat)
+    return AirHockeyBox2D.from_dict(simulator_params)
+
+
+def chase_action(state, noise):
+    # move the paddle straight at the puck, so most episodes have paddle-puck hits
+    return np.clip(state[PUCK_X:PUCK_X + 2] - state[EGO_X:EGO_X + 2] + noise, -1, 1)
+
+
+def record_episode(simulator, seed, noise, branch_every):
+    """
+    Closed-loop chase rollout, returns snapshots taken every `branch_every` control steps and the actions.
+    """
+    state = simulator.reset(seed=seed)
+    snapshots, actions = [], []
+    for t in range(len(noise)):
+        if t % branch_every == 0:
+            snapshots.append(simulator.snapshot())
+        action = chase_action(state, noise[t])
+        actions.append(action)
+        state = simulator.get_transition(action)
+    return snapshots, np.array(actions)
+
+
+def branch(simulator, snapshot, actions):
+    """
+    Restores snapshot and replays actions open-loop, every action_repeat-th action is held for action_repeat
+    control steps. Returns the puck position after every transition.
+    """
+    simulator.restore(snapshot)
+    puck_positions = []
+    for action in actions[::simulator.action_repeat]:
+        state = simulator.get_transition(action)
+        puck_positions.append(state[PUCK_X:PUCK_X + 2].copy())
+    return np.array(puck_positions)
+
+
+def control_steps_per_sec(simulators, noises, n_repeats=5):
+    """
+    Best of n_repeats closed-loop chase runs (which keep the puck moving and hitting things), interleaved
+    between the simulators so machine noise hits every setting alike.
+
+    Returns, for every simulator, simulated control steps per wall clock second for whole transitions,
+    and for the box2d world steps alone (the part the solver settings change).
+    """
+    physics_time = [0.0]
+
+    def timed(step_physics):
+        def timed_step_physics():
+            start = time.perf_counter()
+            step_physics()
+            physics_time[0] += time.perf_counter() - start
+        return timed_step_physics
+
+    for simulator in simulators:
+        simulator.step_physics = timed(simulator.step_physics)
+    n_steps = noises.shape[0] * noises.shape[1]
+    best, best_physics = [0] * len(simulators), [0] * len(simulators)
+    for _ in range(n_repeats):
+        for i, simulator in enumerate(simulators):
+            physics_time[0] = 0.0
+            start = time.perf_counter()
+            for ep, noise in enumerate(noises):
+                state = simulator.reset(seed=ep)
+                for t in range(0, len(noise), simulator.action_repeat):
+                    state = simulator.get_transition(chase_action(state, noise[t]))
+            best[i] = max(best[i], n_steps / (time.perf_counter() - start))
+            best_physics[i] = max(best_physics[i], n_steps / physics_time[0])
+    for simulator in simulators:
+        del simulator.step_physics
+    return list(zip(best, best_physics))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure puck trajectory drift from a high-fidelity reference vs throughput for physics solver settings.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_episodes', type=int, default=10, help='Number of seeded episodes.')
+    parser.add_argument('--horizon', type=int, default=200, help='Control steps per episode.')
+    parser.add_argument('--branch_every', type=int, default=10, help='Control steps between branch points.')
+    parser.add_argument('--branch_length', type=int, default=8, help='Control steps rolled out from each branch point.')
+    parser.add_argument('--num_obstacles', type=int, default=0, help='Obstacles on the table.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+    simulator_params = air_hockey_cfg['air_hockey']['simulator_params']
+    simulator_params['num_obstacles'] = args.num_obstacles
+
+    rng = np.random.RandomState(0)
+    noises = rng.normal(scale=0.05, size=(args.n_episodes, args.horizon, 2))
+
+    # branch points are states along reference trajectories, every setting replays the reference actions
+    # from each of them, so drift measures the solver alone and does not compound through the policy
+    accurate = tuple(PHYSICS_PRESETS['accurate'].values())
+    reference = make_simulator(simulator_params, *accurate)
+    branches = []
+    for ep in range(args.n_episodes):
+        snapshots, actions = record_episode(reference, ep, noises[ep], args.branch_every)
+        for i, snapshot in enumerate(snapshots):
+            branch_actions = actions[i * args.branch_every:i * args.branch_every + args.branch_length]
+            if len(branch_actions) == args.branch_length:
+                branches.append((snapshot, branch_actions))
+    # the reference replays from the restored snapshot as well, so both sides start from a fresh world
+    references = [branch(reference, snapshot, actions) for snapshot, actions in branches]
+
+    presets = {tuple(p.values()): name for name, p in PHYSICS_PRESETS.items()}
+    print(f"puck position drift (m) from the {accurate} reference after {args.branch_length} control steps, "
+          f"over {len(branches)} branch points")
+    print(f"{'substeps':>8} {'vel_it':>6} {'pos_it':>6} {'repeat':>6} {'mean err':>9} {'p95 err':>9} {'ctrl steps/s':>12} {'speedup':>7} {'physics/s':>10} {'speedup':>7}")
+    simulators, errors = [], []
+    for setting in SETTINGS:
+        simulator = make_simulator(simulator_params, *setting)
+        repeat = setting[-1]
+        setting_errors = []
+        for (snapshot, actions), ref in zip(branches, references):
+            rollout = branch(simulator, snapshot, actions)
+            # compare at the end of the branch (the last full action repeat)
+            setting_errors.append(np.linalg.norm(rollout[-1] - ref[len(rollout) * repeat - 1]))
+        simulators.append(simulator)
+        errors.append(setting_errors)
+    # control steps of simulated time per wall clock second
+    rates = control_steps_per_sec(simulators, noises)
+    default_rate, default_physics_rate = rates[0]
+    for setting, setting_errors, (rate, physics_rate) in zip(SETTINGS, errors, rates):
+        name = presets.get(setting, '')
+        print(f"{setting[0]:8d} {setting[1]:6d} {setting[2]:6d} {setting[3]:6d} {np.mean(setting_errors):9.4f} "
+              f"{np.percentile(setting_errors, 95):9.4f} {rate:12.0f} {rate / default_rate:6.2f}x "
+              f"{physics_rate:10.0f} {physics_rate / default_physics_rate:6.2f}x {name}")
@@ -0,0 +1,76 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+
+
+def make_env(air_hockey_cfg, task, observation_mode, profile):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['task'] = task
+    air_hockey_params['observation_mode'] = observation_mode
+    air_hockey_params['profile'] = profile
+    air_hockey_params['profile_interval'] = 500
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def rollout(env, actions):
+    """
+    Returns the best 50-step block rate of env.step, and the number of infos that carried a profile.
+    """
+    env.reset(seed=0)
+    times, profiles = np.zeros(len(actions)), 0
+    for i, action in enumerate(actions):
+        start = time.perf_counter()
+        _, _, terminated, truncated, info = env.step(action)
+        times[i] = time.perf_counter() - start
+        profiles += 'profile' in info
+        if terminated or truncated:
+            env.reset()
+    return 50 / times[:len(times) // 50 * 50].reshape(-1, 50).sum(axis=1).min(), profiles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Show the per-phase step profile and the cost of profiling.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_steps', type=int, default=2000, help='Env steps per run.')
+    parser.add_argument('--n_repeats', type=int, default=5, help='Interleaved runs per setting, the best one is kept.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    actions = np.random.RandomState(0).uniform(-1, 1, size=(args.n_steps, 2))
+    for task, observation_mode in [('puck_height', 'state'), ('goal_position', 'state'), ('puck_height', 'pixels')]:
+        plain_env = make_env(air_hockey_cfg, task, observation_mode, False)
+        # profile=False leaves every method of the env, its simulator and reward engine untouched, the only
+        # callables set on them are the specialized step and transition and the task's base reward
+        assert not any(callable(value) for obj in (plain_env, plain_env.simulator, plain_env.reward_engine)
+                       for name, value in vars(obj).items() if name not in ('step', 'transition', 'base_reward_fn'))
+        assert not hasattr(plain_env.step, '__wrapped__')
+        profiled_env = make_env(air_hockey_cfg, task, observation_mode, True)
+        rates = {False: 0, True: 0}
+        for _ in range(args.n_repeats):
+            for profile, env in ((False, plain_env), (True, profiled_env)):
+                rate, profiles = rollout(env, actions)
+                rates[profile] = max(rates[profile], rate)
+        print(f"{task} {observation_mode}: {rates[False]:.0f} steps/s without profiling, {rates[True]:.0f} with "
+              f"({rates[True] / rates[False] - 1:+.1%}), infos with a profile per run: {profiles}")
+        profile = profiled_env.get_profile()
+        # the reward phases are timed inside the specialized transition (base rewards are skipped on truncation)
+        assert all(profile[name]['calls'] for name in ('has_finished', 'get_base_reward', 'get_reward_shaping'))
+        step_total = profile['step']['total_s']
+        for name, phase in sorted(profile.items(), key=lambda item: -item[1]['total_s']):
+            print(f"  {name:20s} {phase['calls']:7d} calls {phase['mean_us']:8.1f} us/call {phase['total_s'] / step_total:7.1%} of step time")
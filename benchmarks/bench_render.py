@@ -0,0 +1,77 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from render import AirHockeyRenderer, HeadlessAirHockeyRenderer
+
+
+def make_env(air_hockey_cfg, task, num_obstacles):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['task'] = task
+    air_hockey_params['simulator_params']['num_obstacles'] = num_obstacles
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def render_rollout(env, renderers, n_frames, episode_length):
+    """
+    Random rollout rendering every step with every renderer.
+
+    Returns the seconds spent in each renderer's get_frame, the per-frame count of pixels that differ
+    between the first two renderers, and the number of frames a renderer failed to draw.
+    """
+    env.reset(seed=0)
+    rng = np.random.RandomState(0)
+    times = np.zeros(len(renderers))
+    mismatches = []
+    failures = 0
+    for t in range(n_frames):
+        env.step(rng.uniform(-1, 1, size=2))
+        frames = []
+        for i, renderer in enumerate(renderers):
+            start = time.perf_counter()
+            try:
+                frames.append(renderer.get_frame())
+            except IndexError:
+                # AirHockeyRenderer cannot draw a sprite that is partly off the frame (a puck pushed off the table)
+                failures += 1
+                frames.append(None)
+            times[i] += time.perf_counter() - start
+        if len(frames) > 1 and frames[0] is not None and frames[1] is not None:
+            mismatches.append(np.any(frames[0] != frames[1], axis=-1).sum())
+        if (t + 1) % episode_length == 0:
+            env.reset()
+    return times, np.array(mismatches), failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare frames/sec and output of AirHockeyRenderer and HeadlessAirHockeyRenderer.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_frames', type=int, default=1000, help='Frames per run.')
+    parser.add_argument('--episode_length', type=int, default=100, help='Steps between resets.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    for task, num_obstacles in [('puck_height', 0), ('goal_position', 0), ('goal_position', 3)]:
+        env = make_env(air_hockey_cfg, task, num_obstacles)
+        renderers = [AirHockeyRenderer(env), HeadlessAirHockeyRenderer(env)]
+        times, mismatches, failures = render_rollout(env, renderers, args.n_frames, args.episode_length)
+        fps = args.n_frames / times
+        # the headless renderer draws pucks over blocks and obstacles, that is the only expected difference
+        print(f"{task:14s} obstacles={num_obstacles}  AirHockeyRenderer {fps[0]:7.0f} fps  "
+              f"HeadlessAirHockeyRenderer {fps[1]:7.0f} fps ({fps[1] / fps[0]:4.1f}x)  "
+              f"frames that differ {np.mean(mismatches > 0):.1%}, max {mismatches.max()} px, failed frames {failures}")
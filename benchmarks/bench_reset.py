@@ -0,0 +1,85 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+
+
+def make_env(air_hockey_cfg, pooled_reset, num_blocks, num_obstacles):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['simulator_params']['pooled_reset'] = pooled_reset
+    air_hockey_params['simulator_params']['num_blocks'] = num_blocks
+    air_hockey_params['simulator_params']['num_obstacles'] = num_obstacles
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def bench_resets(env, n_resets, episode_length):
+    """
+    Returns resets per second, and env steps per second for short episodes of `episode_length` steps.
+    """
+    start = time.time()
+    for i in range(n_resets):
+        env.reset(seed=i)
+    resets_per_sec = n_resets / (time.time() - start)
+
+    action = np.zeros(2)
+    start = time.time()
+    for i in range(n_resets):
+        env.reset(seed=i)
+        for _ in range(episode_length):
+            env.step(action)
+    steps_per_sec = n_resets * (episode_length + 1) / (time.time() - start)
+    return resets_per_sec, steps_per_sec
+
+
+def max_state_diff(air_hockey_cfg, num_blocks, num_obstacles, n_episodes=20, episode_length=20):
+    """
+    Largest state difference between pooled and rebuilt resets over the same seeded rollouts.
+
+    This is 0 unless pucks spawn overlapping several obstacles at once: box2d resolves those overlaps
+    in contact order, which depends on broadphase history (a rebuilt world differs from a fresh one too).
+    """
+    envs = [make_env(air_hockey_cfg, pooled, num_blocks, num_obstacles) for pooled in (True, False)]
+    diff = 0.0
+    for ep in range(n_episodes):
+        states = [env.reset(seed=ep)[0] for env in envs]
+        diff = max(diff, np.abs(states[0] - states[1]).max())
+        for _ in range(episode_length):
+            action = np.random.uniform(-0.05, 0.05, size=2)
+            states = [env.step(action.copy())[0] for env in envs]
+            diff = max(diff, np.abs(states[0] - states[1]).max())
+    return diff
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark pooled vs destroy/recreate resets.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_resets', type=int, default=2000, help='Number of resets per measurement.')
+    parser.add_argument('--episode_length', type=int, default=5, help='Steps per short episode.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    for num_blocks, num_obstacles in [(0, 0), (2, 4)]:
+        results = {}
+        for pooled_reset in (False, True):
+            env = make_env(air_hockey_cfg, pooled_reset, num_blocks, num_obstacles)
+            results[pooled_reset] = bench_resets(env, args.n_resets, args.episode_length)
+        diff = max_state_diff(air_hockey_cfg, num_blocks, num_obstacles)
+        print(f"blocks={num_blocks} obstacles={num_obstacles}")
+        print(f"  rebuild: {results[False][0]:10.0f} resets/s  {results[False][1]:10.0f} steps/s (episodes of {args.episode_length})")
+        print(f"  pooled:  {results[True][0]:10.0f} resets/s  {results[True][1]:10.0f} steps/s (episodes of {args.episode_length})")
+        print(f"  speedup: {results[True][0] / results[False][0]:.2f}x resets, max state diff pooled vs rebuild: {diff:.2e}")
@@ -0,0 +1,98 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from rewards import TASKS
+
+
+def make_env(air_hockey_cfg, task):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['task'] = task
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def collect_transitions(env, n_steps):
+    """
+    Random rollout, returns the env rewards and termination flags with the stacked arguments of RewardEngine.compute
+    (up to hit_a_puck).
+    """
+    env.reset(seed=0)
+    states, old_states, timesteps, goal_pos, goal_vel, goal_radius, hit_a_puck = [], [], [], [], [], [], []
+    rewards, terminated, truncated = [], [], []
+    for _ in range(n_steps):
+        timestep = env.current_timestep
+        old_state = env.current_state.copy()
+        goal_args = env.get_goal_args()
+        _, reward, term, trunc, _ = env.step(np.random.uniform(-1, 1, size=2))
+        states.append(env.current_state.copy())
+        # the shaping only reads the previous state from the second step on
+        old_states.append(old_state if timestep > 0 else env.old_state.copy())
+        timesteps.append(timestep)
+        # puck_touch's reward, the contact events are cleared on the next step
+        hit_a_puck.append(env.simulator.contact_events.ego_hit_puck)
+        if goal_args[0] is not None:
+            goal_pos.append(goal_args[0])
+            goal_vel.append(goal_args[1] if goal_args[1] is not None else np.zeros(2))
+            goal_radius.append(goal_args[2])
+        rewards.append(reward)
+        terminated.append(term)
+        truncated.append(trunc)
+        if term or trunc:
+            env.reset()
+    goals = (np.array(goal_pos), np.array(goal_vel), np.array(goal_radius)) if goal_pos else (None, None, None)
+    return (np.array(states), np.array(old_states), np.array(timesteps)) + goals + (np.array(hit_a_puck),), \
+        (np.array(rewards), np.array(terminated), np.array(truncated))
+
+
+def single(args, i):
+    return [arg[i] if isinstance(arg, np.ndarray) else arg for arg in args]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the batched reward engine against AirHockeyEnv.step and time it.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_steps', type=int, default=2000, help='Transitions per task.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    # goal_discrete has no observation space, its rewards are checked with goal_position transitions
+    for task in TASKS:
+        env = make_env(air_hockey_cfg, 'goal_position' if task == 'goal_discrete' else task)
+        compute_args, (rewards, terminated, truncated) = collect_transitions(env, args.n_steps)
+        engine = env.reward_engine if task != 'goal_discrete' else copy.copy(env.reward_engine)
+        engine.base_reward_fn = getattr(engine, task + '_reward')
+        engine.task = task
+
+        start = time.time()
+        batch = engine.compute(*compute_args)
+        batch_time = time.time() - start
+        start = time.time()
+        singles = [engine.compute(*single(compute_args, i)) for i in range(args.n_steps)]
+        single_time = time.time() - start
+
+        for key in batch:
+            assert np.array_equal(batch[key], np.array([result[key] for result in singles])), (task, key)
+        if task != 'goal_discrete':
+            # per-row goals, as in a vec env where every env has its own goal and radius
+            assert np.array_equal(batch['reward'], rewards), task
+            assert np.array_equal(batch['terminated'], terminated) and np.array_equal(batch['truncated'], truncated), task
+        if task == 'puck_touch':
+            # so the hits are compared too
+            assert batch['base_reward'].any(), "no puck hits, increase --n_steps"
+        print(f"{task:24s} batch == single{'' if task == 'goal_discrete' else ' == env.step'}, "
+              f"batch {batch_time / args.n_steps * 1e6:5.2f} us/state, single {single_time / args.n_steps * 1e6:5.2f} us/state")
@@ -0,0 +1,137 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from contacts import PADDLE_PUCK
+from league import get_score
+from puck_predictor import PuckPredictor
+from scripted_opponent import ScriptedOpponent
+
+
+def make_params(air_hockey_cfg):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['simulator_params']['num_paddles'] = 2
+    return air_hockey_params
+
+
+class StillPolicy:
+    def predict(self, obs):
+        return np.zeros(2)
+
+
+class RandomPolicy:
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+
+    def predict(self, obs):
+        return self.rng.uniform(-1, 1, size=2)
+
+
+def check_predictor(env, air_hockey_params, n_episodes, horizons=(5, 10, 20)):
+    """
+    Max error of the predicted puck positions against box2d, in both frames, until a paddle touches the
+    puck (paddles hold still).
+    """
+    errors = {}
+    for player, frame in enumerate(('ego', 'alt')):
+        predictor = PuckPredictor.from_dict(air_hockey_params['simulator_params'], frame=frame)
+        errors[frame] = np.zeros(len(horizons))
+        for episode in range(n_episodes):
+            obs, _ = env.reset(seed=episode)
+            positions, _ = predictor.cast(obs[player, 4:6], obs[player, 6:8], max(horizons))
+            for t in range(max(horizons)):
+                obs, _, terminated, truncated, info = env.step(np.zeros((2, 2)))
+                if terminated or truncated or (info.get('contacts') is not None
+                                               and (info['contacts']['kind'] == PADDLE_PUCK).any()):
+                    break
+                error = np.abs(positions[t] - obs[player, 4:6]).max()
+                errors[frame] = np.maximum(errors[frame], np.where(t < np.array(horizons), error, 0))
+    return errors
+
+
+def bench_predictor(predictor, n_pucks, horizon, n_calls=200):
+    """
+    Returns microseconds per cast and per intercept of n_pucks pucks.
+    """
+    rng = np.random.default_rng(0)
+    pos = rng.uniform(-0.4, 0.4, size=(n_pucks, 2))
+    vel = rng.uniform(-2, 2, size=(n_pucks, 2))
+    times = []
+    for fn in (lambda: predictor.cast(pos, vel, horizon), lambda: predictor.intercept(pos, vel, 0.8, horizon)):
+        start = time.perf_counter()
+        for _ in range(n_calls):
+            fn()
+        times.append((time.perf_counter() - start) / n_calls * 1e6)
+    return times
+
+
+def play(env, ego_policy, alt_policy, n_episodes, seed=0):
+    """
+    Ego score (wins plus half the draws) and microseconds per alt action, the alt paddle always played by
+    alt_policy (scripted opponents are built for one side).
+    """
+    score = 0.0
+    alt_time = 0.0
+    n_steps = 0
+    joint_action = np.zeros((2, 2))
+    for episode in range(n_episodes):
+        obs, _ = env.reset(seed=seed + episode)
+        done = False
+        while not done:
+            joint_action[0] = ego_policy.predict(obs[0])
+            start = time.perf_counter()
+            joint_action[1] = alt_policy.predict(obs[1])
+            alt_time += time.perf_counter() - start
+            n_steps += 1
+            obs, _, terminated, truncated, info = env.step(joint_action)
+            done = terminated or truncated
+        score += get_score(info['winner'], 0)
+    return score / n_episodes, alt_time / n_steps * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the puck predictor against box2d, time it, and play the '
+                                                 'scripted opponents against simple baselines.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_episodes', type=int, default=20, help='Episodes per accuracy check and per match.')
+    parser.add_argument('--horizon', type=int, default=30, help='Predicted steps of the timings.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+    air_hockey_params = make_params(air_hockey_cfg)
+    env = AirHockeyEnv.from_dict(air_hockey_params)
+
+    for frame, errors in check_predictor(env, air_hockey_params, args.n_episodes).items():
+        print(f"{frame} frame max error after 5/10/20 steps: " + " / ".join(f"{e * 100:.1f}cm" for e in errors))
+
+    predictor = PuckPredictor.from_dict(air_hockey_params['simulator_params'])
+    for n_pucks in (1, 1000):
+        cast_us, intercept_us = bench_predictor(predictor, n_pucks, args.horizon)
+        print(f"{n_pucks:5d} pucks: cast {cast_us:8.1f} us, intercept {intercept_us:8.1f} us "
+              f"({cast_us / n_pucks:.2f} us per puck)")
+
+    def scripted(mode, frame):
+        return ScriptedOpponent.from_dict(air_hockey_params, frame=frame, mode=mode)
+    matches = (('still', StillPolicy(), scripted('defend', 'alt')),
+               ('still', StillPolicy(), scripted('attack', 'alt')),
+               ('random', RandomPolicy(), scripted('attack', 'alt')),
+               ('defend', scripted('defend', 'ego'), scripted('attack', 'alt')),
+               ('still', StillPolicy(), StillPolicy()))
+    for ego_name, ego_policy, alt_policy in matches:
+        alt_name = getattr(alt_policy, 'mode', 'still')
+        score, alt_us = play(env, ego_policy, alt_policy, args.n_episodes)
+        print(f"{ego_name:>6s} vs {alt_name:6s}: ego score {score:.3f}, {alt_us:6.1f} us per {alt_name} action")
@@ -0,0 +1,102 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+from stable_baselines3 import PPO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from vec_env import make_air_hockey_vec_env
+
+
+def make_params(air_hockey_cfg, num_paddles):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['simulator_params']['num_paddles'] = num_paddles
+    return air_hockey_params
+
+
+def check_mirror(env, n_steps):
+    """
+    The alt observation is the ego observation of the table turned around: turning the joint state
+    around twice gives the state back, and row 1 of the joint state starts with the alt observation.
+    """
+    obs, _ = env.reset(seed=0)
+    rng = np.random.RandomState(0)
+    for _ in range(n_steps):
+        state = env.current_state
+        joint_state = env.get_joint_state(state, np.zeros((2, len(state))))
+        assert np.array_equal(joint_state[1][:obs.shape[1]], obs[1])
+        assert np.array_equal(env.get_joint_state(joint_state[1], np.zeros((2, len(state))))[1], state)
+        obs, reward, terminated, truncated, _ = env.step(rng.uniform(-1, 1, size=(2, 2)))
+        assert obs.shape == (2, 8) and reward.shape == (2,)
+        if terminated or truncated:
+            obs, _ = env.reset()
+
+
+def samples_per_s(env, policy_fn, n_steps):
+    """
+    Agent samples (env steps times players) per second of stepping env with policy_fn(obs) -> action.
+    """
+    obs, _ = env.reset(seed=0)
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        obs, _, terminated, truncated, _ = env.step(policy_fn(obs))
+        if terminated or truncated:
+            obs, _ = env.reset()
+    return n_steps * env.num_agents / (time.perf_counter() - start)
+
+
+def vec_samples_per_s(vec_env, predict, n_ticks):
+    obs = vec_env.reset()
+    start = time.perf_counter()
+    for _ in range(n_ticks):
+        obs, _, dones, infos = vec_env.step(predict(obs))
+    return n_ticks * vec_env.num_envs / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check two player stepping and compare self-play throughput '
+                                                 'with single-agent throughput.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_steps', type=int, default=5000, help='Env steps per in-process run.')
+    parser.add_argument('--num_slots', type=int, default=8, help='Policy slots of the vec env runs (envs or 2 * tables).')
+    parser.add_argument('--n_ticks', type=int, default=1000, help='Vec env steps per vec env run.')
+    parser.add_argument('--num_workers', type=int, default=None, help='Worker processes (default: cpu count).')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    single_params, self_play_params = make_params(air_hockey_cfg, 1), make_params(air_hockey_cfg, 2)
+    single_env, self_play_env = AirHockeyEnv.from_dict(single_params), AirHockeyEnv.from_dict(self_play_params)
+    check_mirror(self_play_env, args.n_steps)
+    print("mirrored observations ok")
+
+    # an untrained policy costs the same to run as a trained one, both envs have the same spaces
+    model = PPO('MlpPolicy', single_env, seed=0, device='cpu')
+    predict = lambda obs: model.predict(obs, deterministic=True)[0]
+    rates = {
+        'single agent': samples_per_s(single_env, predict, args.n_steps),
+        'self-play, one batched predict': samples_per_s(self_play_env, predict, args.n_steps),
+        'self-play, one predict per paddle': samples_per_s(
+            self_play_env, lambda obs: np.stack([predict(obs[0]), predict(obs[1])]), args.n_steps),
+    }
+    for name, rate in rates.items():
+        print(f"{name:36s} {rate:8.0f} agent samples/s")
+
+    for name, params, num_envs in (('single agent vec env', single_params, args.num_slots),
+                                   ('self-play vec env', self_play_params, args.num_slots // 2)):
+        vec_env = make_air_hockey_vec_env(params, num_envs, num_workers=args.num_workers, seed=0)
+        rate = vec_samples_per_s(vec_env, predict, args.n_ticks)
+        vec_env.close()
+        print(f"{name:36s} {rate:8.0f} agent samples/s ({vec_env.num_envs} slots)")
@@ -0,0 +1,106 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+
+
+def make_env(air_hockey_cfg, skip_resting, num_paddles=1, paddle_control='force'):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    # with the default termination the episode ends as soon as the puck stops
+    air_hockey_params['terminate_on_puck_stop'] = False
+    simulator_params = air_hockey_params['simulator_params']
+    simulator_params['num_paddles'] = num_paddles
+    simulator_params['paddle_control'] = paddle_control
+    simulator_params['skip_resting'] = skip_resting
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def get_actions(env, n_steps, move_prob, seed=0):
+    """
+    A mostly idle player: zero actions, and a random move with probability move_prob.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (n_steps, 2, 2) if env.multiagent else (n_steps, 2)
+    moves = rng.random(shape[:-1]) < move_prob
+    return rng.uniform(-0.05, 0.05, size=shape) * moves[..., None]
+
+
+def check_equivalence(env, ref, actions):
+    """
+    Steps env (skip_resting) and ref (the same, with every control step running the full world step)
+    side by side: observations, rewards, flags and contact infos must be identical.
+
+    Returns:
+        (int, float): the number of episodes played and the fraction of steps that ended at rest.
+    """
+    ref.simulator.is_resting = lambda: False
+    env.reset(seed=0)
+    ref.reset(seed=0)
+    n_episodes, n_resting = 1, 0
+    for action in actions:
+        obs, reward, terminated, truncated, info = env.step(action)
+        ref_obs, ref_reward, ref_terminated, ref_truncated, ref_info = ref.step(action)
+        assert np.array_equal(obs, ref_obs) and np.array_equal(reward, ref_reward)
+        assert (terminated, truncated) == (ref_terminated, ref_truncated) and info.keys() == ref_info.keys()
+        if 'contacts' in info:
+            assert np.array_equal(info['contacts'], ref_info['contacts'])
+        assert info.get('hit_counts') == ref_info.get('hit_counts')
+        n_resting += env.simulator.is_resting()
+        if terminated or truncated:
+            env.reset()
+            ref.reset()
+            n_episodes += 1
+    return n_episodes, n_resting / len(actions)
+
+
+def bench_steps(envs, actions, n_repeats=5):
+    """
+    Returns microseconds per env step for every env, the best of n_repeats runs interleaved between the envs.
+    """
+    times = [[] for _ in envs]
+    for _ in range(n_repeats):
+        for env, env_times in zip(envs, times):
+            env.reset(seed=0)
+            start = time.perf_counter()
+            for action in actions:
+                _, _, terminated, truncated, _ = env.step(action)
+                if terminated or truncated:
+                    env.reset()
+            env_times.append((time.perf_counter() - start) / len(actions) * 1e6)
+    return [min(env_times) for env_times in times]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that skip_resting matches the full world step, and time '
+                                                 'it for mostly idle players.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_checked', type=int, default=5000, help='Env steps per equivalence check.')
+    parser.add_argument('--n_steps', type=int, default=2000, help='Env steps per timing.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    for num_paddles, paddle_control in ((1, 'force'), (1, 'kinematic'), (2, 'force')):
+        for move_prob in (0.01, 0.1, 1.0):
+            name = f"paddles={num_paddles} {paddle_control:9s} moves={move_prob:4.2f}"
+            env = make_env(air_hockey_cfg, True, num_paddles, paddle_control)
+            ref = make_env(air_hockey_cfg, True, num_paddles, paddle_control)
+            n_episodes, resting = check_equivalence(env, ref, get_actions(env, args.n_checked, move_prob))
+            plain_us, skip_us = bench_steps([make_env(air_hockey_cfg, False, num_paddles, paddle_control), env],
+                                            get_actions(env, args.n_steps, move_prob, seed=1))
+            print(f"{name}: same as the full step over {n_episodes:3d} episodes, {resting:6.1%} of steps at rest; "
+                  f"{plain_us:6.1f} -> {skip_us:6.1f} us per env step")
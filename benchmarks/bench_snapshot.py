@@ -0,0 +1,77 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+
+
+def make_env(air_hockey_cfg, simulator, num_obstacles):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['simulator'] = simulator
+    air_hockey_params['simulator_params']['num_obstacles'] = num_obstacles
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def rollout(env, actions):
+    states = []
+    for action in actions:
+        env.step(action.copy())
+        states.append(env.current_state.copy())
+    return np.array(states)
+
+
+def bench_calls(fn, n_calls):
+    start = time.time()
+    for _ in range(n_calls):
+        fn()
+    return (time.time() - start) / n_calls * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark env snapshot/restore and check rollouts are bit-identical.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_calls', type=int, default=2000, help='Number of snapshot/restore calls to time.')
+    parser.add_argument('--horizon', type=int, default=50, help='Length of the rollouts branched from a snapshot.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    for simulator, num_obstacles in [('box2d', 0), ('box2d', 3), ('numpy_batch', 0)]:
+        env = make_env(air_hockey_cfg, simulator, num_obstacles)
+        env.reset(seed=0)
+        rng = np.random.RandomState(0)
+        # branch from the middle of an episode, with the puck in play
+        for _ in range(15):
+            env.step(rng.uniform(-0.05, 0.05, size=2))
+        snapshot = env.snapshot()
+        actions = rng.uniform(-0.05, 0.05, size=(args.horizon, 2))
+
+        reference = rollout(env, actions)
+        env.restore(snapshot)
+        first = rollout(env, actions)
+        # take a different branch in between, then go back
+        env.restore(snapshot)
+        rollout(env, -actions)
+        env.restore(snapshot)
+        second = rollout(env, actions)
+
+        snapshot_us = bench_calls(env.snapshot, args.n_calls)
+        restore_us = bench_calls(lambda: env.restore(snapshot), args.n_calls)
+        reset_us = bench_calls(env.reset, args.n_calls)
+        print(f"{simulator} obstacles={num_obstacles}")
+        print(f"  snapshot: {snapshot_us:7.1f} us/call  restore: {restore_us:7.1f} us/call  (reset: {reset_us:7.1f} us/call)")
+        print(f"  restored rollouts bit-identical: {np.array_equal(first, second)}, "
+              f"max diff to the uninterrupted rollout: {np.abs(first - reference).max():.2e}")
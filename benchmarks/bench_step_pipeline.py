@@ -0,0 +1,182 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from rewards import SHAPING_TERMS, TASKS, RewardEngine
+
+# config overrides, on top of the config file
+FLAG_SETS = {'config': {},
+             'lean': {'terminate_on_out_of_bounds': False, 'terminate_on_enemy_goal': False,
+                      'terminate_on_puck_stop': False, 'wall_bumping_rew': 0, 'direction_change_rew': 0,
+                      'horizontal_vel_rew': 0, 'diagonal_motion_rew': 0, 'stand_still_rew': 0}}
+
+
+def make_env(air_hockey_cfg, task, num_paddles=1, flags=None):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['task'] = task
+    air_hockey_params['simulator_params']['num_paddles'] = num_paddles
+    air_hockey_params.update(flags or {})
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def make_engine(env, task):
+    """
+    A RewardEngine like env's, for another task.
+    """
+    e = env.reward_engine
+    return RewardEngine(task, e.width, e.length, e.paddle_radius, e.puck_radius, e.max_paddle_vel, e.max_timesteps,
+                        e.terminate_on_out_of_bounds, e.terminate_on_enemy_goal, e.terminate_on_puck_stop,
+                        e.truncate_rew, e.wall_bumping_rew, e.direction_change_rew, e.horizontal_vel_rew,
+                        e.diagonal_motion_rew, e.stand_still_rew)
+
+
+def make_generic(env):
+    """
+    Turns env back into the generic pipeline: a step branching on the env's kind on every call, and
+    RewardEngine.compute with every check and shaping term.
+    """
+    engine = env.reward_engine
+
+    def transition(state, old_state, timestep, hit_a_puck, goal_pos, goal_vel, goal_radius):
+        result = engine.compute(state, old_state, timestep, goal_pos, goal_vel, goal_radius, hit_a_puck, env.multiagent)
+        return result['reward'], result['terminated'], result['truncated'], result['puck_within_home'], \
+            result['puck_within_alt_home']
+    env.transition = transition
+
+    def step(action):
+        if env.multiagent:
+            return env.multi_step(action)
+        if env.goal_conditioned:
+            return env.goal_step(action)
+        return env.single_agent_step(action)
+    env.step = step
+    return env
+
+
+def get_actions(env, n_steps, seed=0):
+    shape = (n_steps, 2, 2) if env.multiagent else (n_steps, 2)
+    return np.random.default_rng(seed).uniform(-0.05, 0.05, size=shape)
+
+
+def check_equivalence(env, generic, n_steps):
+    """
+    Plays the same actions in both envs, every step must give exactly the same observation, reward, flags
+    and winner. Returns the number of episodes played.
+    """
+    env.reset(seed=0)
+    generic.reset(seed=0)
+    n_episodes = 1
+    for action in get_actions(env, n_steps):
+        obs, reward, terminated, truncated, info = env.step(action)
+        ref_obs, ref_reward, ref_terminated, ref_truncated, ref_info = generic.step(action)
+        if isinstance(obs, dict):
+            obs, ref_obs = obs['observation'], ref_obs['observation']
+        assert np.array_equal(obs, ref_obs) and np.array_equal(reward, ref_reward), (reward, ref_reward)
+        assert (terminated, truncated, info.get('winner')) == (ref_terminated, ref_truncated, ref_info.get('winner'))
+        if terminated or truncated:
+            env.reset()
+            generic.reset()
+            n_episodes += 1
+    return n_episodes
+
+
+def check_engine(engine, n_states, multiagent=False, python_floats=False, seed=0):
+    """
+    make_transition_fn against compute on random states, also for tasks the env cannot play (goal_discrete).
+    The numpy transition must match exactly, the python_floats one (zero_alloc envs) up to rounding.
+    """
+    rng = np.random.default_rng(seed)
+    states = rng.uniform(-1, 1, size=(n_states, 2, 8)) * [1, 0.5, 2, 2, 1, 0.5, 2, 2]
+    transition = engine.make_transition_fn(multiagent, python_floats=python_floats)
+    tolerance = 1e-12 if python_floats else 0
+    goal_pos, goal_vel, goal_radius = np.array([-0.5, 0.1]), np.array([-1.0, 0.5]), 0.3
+    for i, (state, old_state) in enumerate(states):
+        timestep, hit_a_puck = i % 3, bool(i % 2)
+        result = engine.compute(state, old_state, timestep, goal_pos, goal_vel, goal_radius, hit_a_puck, multiagent)
+        reward, terminated, truncated, _, _ = transition(state, old_state, timestep, hit_a_puck, goal_pos, goal_vel,
+                                                         goal_radius)
+        assert abs(reward - result['reward']) <= tolerance, (reward, result['reward'])
+        assert (terminated, truncated) == (result['terminated'], result['truncated'])
+
+
+def bench_steps(env, n_steps, n_repeats=3):
+    """
+    Returns microseconds per env step, the best of n_repeats runs.
+    """
+    actions = get_actions(env, n_steps)
+    times = []
+    for _ in range(n_repeats):
+        env.reset(seed=0)
+        start = time.perf_counter()
+        for action in actions:
+            _, _, terminated, truncated, _ = env.step(action)
+            if terminated or truncated:
+                env.reset()
+        times.append((time.perf_counter() - start) / n_steps * 1e6)
+    return min(times)
+
+
+def bench_rewards(env, n_steps, n_repeats=3):
+    """
+    Returns microseconds per reward and termination of a single state (one player), the best of n_repeats runs.
+    """
+    env.reset(seed=0)
+    state, old_state = env.current_state, env.current_state.copy()
+    goal_pos, goal_vel, goal_radius = env.get_goal_args()
+    transition = env.transition
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        for timestep in range(n_steps):
+            transition(state, old_state, timestep, False, goal_pos, goal_vel, goal_radius)
+        times.append((time.perf_counter() - start) / n_steps * 1e6)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that the specialized step pipeline matches the generic one '
+                                                 'and compare their step and reward times for every task.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_checked', type=int, default=2000, help='Env steps per equivalence check.')
+    parser.add_argument('--n_steps', type=int, default=5000, help='Env steps per timing.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    for flag_name, flags in FLAG_SETS.items():
+        env = make_env(air_hockey_cfg, 'puck_height', flags=flags)
+        for multiagent in (False, True):
+            for task in TASKS:
+                for python_floats in (False, True):
+                    check_engine(make_engine(env, task), args.n_checked, multiagent, python_floats)
+        print(f"flags={flag_name}: specialized rewards (numpy and python floats) match compute for every task, "
+              f"{sum(w != 0 for w in env.reward_engine.shaping_weights)} of {len(SHAPING_TERMS)} shaping terms on")
+
+        # goal_discrete has no goal observation, see get_desired_goal
+        cases = [(task, 1) for task in TASKS if task != 'goal_discrete'] + \
+            [(task, 2) for task in TASKS if 'goal' not in task]
+        for task, num_paddles in cases:
+            name = f"flags={flag_name:6s} paddles={num_paddles} task={task:22s}"
+            n_episodes = check_equivalence(make_env(air_hockey_cfg, task, num_paddles, flags),
+                                           make_generic(make_env(air_hockey_cfg, task, num_paddles, flags)),
+                                           args.n_checked)
+            generic = make_generic(make_env(air_hockey_cfg, task, num_paddles, flags))
+            env = make_env(air_hockey_cfg, task, num_paddles, flags)
+            generic_us, specialized_us = bench_steps(generic, args.n_steps), bench_steps(env, args.n_steps)
+            generic_reward_us, reward_us = bench_rewards(generic, args.n_steps), bench_rewards(env, args.n_steps)
+            print(f"{name}: same over {n_episodes:3d} episodes; {generic_us:6.1f} -> {specialized_us:6.1f} us per env "
+                  f"step, {generic_reward_us:5.1f} -> {reward_us:5.1f} us per reward and termination")
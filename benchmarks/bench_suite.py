@@ -0,0 +1,247 @@
+import argparse
+import copy
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from render import AirHockeyRenderer, HeadlessAirHockeyRenderer
+
+# case name -> (simulator_params overrides, air_hockey overrides), every case changes one thing from the default
+CASES = {
+    'default': ({}, {}),
+    'pucks_2': ({'num_pucks': 2}, {}),
+    'pucks_4': ({'num_pucks': 4}, {}),
+    'obstacles_3': ({'num_obstacles': 3}, {}),
+    'blocks_3': ({'num_blocks': 3}, {}),
+    'multiagent': ({'num_paddles': 2}, {}),
+    'goal_conditioned': ({}, {'task': 'goal_position'}),
+    'time_frequency_10': ({'time_frequency': 10}, {}),
+    'time_frequency_60': ({'time_frequency': 60}, {}),
+}
+METRICS = ('transitions_per_s', 'steps_per_s', 'resets_per_s', 'frames_per_s', 'headless_frames_per_s', 'rollout_steps_per_s')
+
+
+def make_env(air_hockey_cfg, simulator, simulator_overrides, overrides):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['simulator'] = simulator
+    air_hockey_params['simulator_params'].update(simulator_overrides)
+    air_hockey_params.update(overrides)
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def best_rate(fn, n_calls, n_repeats, block_size):
+    """
+    Calls/sec of the fastest block of block_size consecutive calls over n_repeats runs, after one untimed
+    warm-up run. fn(n_calls) does the work and returns the seconds of every call.
+
+    Other load on the machine slows down whole stretches of a run, the fastest block is far more stable
+    from run to run than the mean or median.
+    """
+    fn(n_calls)
+    n_blocks = n_calls // block_size
+    best = min(fn(n_calls)[:n_blocks * block_size].reshape(n_blocks, block_size).sum(axis=1).min()
+               for _ in range(n_repeats))
+    return block_size / best
+
+
+def bench_case(env, actions, episode_length, n_repeats, block_size, metrics=METRICS):
+    """
+    Returns metric -> calls/sec for one env, and metric -> reason for the metrics that could not run.
+
+    transitions: raw simulator.get_transition, steps: env.step, resets: env.reset, frames: get_frame of
+    AirHockeyRenderer and HeadlessAirHockeyRenderer, with the env reset every episode_length calls
+    outside the timed calls. rollout: env.step plus env.reset when an episode finishes, both timed and
+    over the whole run (a best block would leave the resets out).
+    """
+    n = len(actions)
+    transition = env.simulator.get_transition
+    if env.multiagent:
+        # (2, 2) joint actions, the alt paddle replays the actions backwards
+        actions = np.stack([actions, actions[::-1]], axis=1)
+        transition = lambda action: env.simulator.get_transition(action[0], action[1])
+
+    def transitions(n_calls):
+        times = np.zeros(n_calls)
+        env.reset(seed=0)
+        for i in range(n_calls):
+            start = time.perf_counter()
+            transition(actions[i])
+            times[i] = time.perf_counter() - start
+            if (i + 1) % episode_length == 0:
+                env.reset()
+        return times
+
+    def steps(n_calls):
+        times = np.zeros(n_calls)
+        env.reset(seed=0)
+        for i in range(n_calls):
+            start = time.perf_counter()
+            _, _, terminated, truncated, _ = env.step(actions[i])
+            times[i] = time.perf_counter() - start
+            if terminated or truncated or (i + 1) % episode_length == 0:
+                env.reset()
+        return times
+
+    def resets(n_calls):
+        times = np.zeros(n_calls)
+        for i in range(n_calls):
+            start = time.perf_counter()
+            env.reset(seed=i)
+            times[i] = time.perf_counter() - start
+        return times
+
+    def frames(renderer):
+        def run(n_calls):
+            times = np.zeros(n_calls)
+            env.reset(seed=0)
+            for i in range(n_calls):
+                # move the bodies with the raw simulator, so the renderers can be timed without env.step
+                env.current_state = transition(actions[i])
+                start = time.perf_counter()
+                renderer.get_frame()
+                times[i] = time.perf_counter() - start
+                if (i + 1) % episode_length == 0:
+                    env.reset()
+            return times
+        return run
+
+    def rollout(n_calls):
+        times = np.zeros(n_calls)
+        env.reset(seed=0)
+        for i in range(n_calls):
+            start = time.perf_counter()
+            _, _, terminated, truncated, _ = env.step(actions[i])
+            if terminated or truncated:
+                env.reset()
+            times[i] = time.perf_counter() - start
+        return times
+
+    benches = {
+        'transitions_per_s': lambda: (transitions, block_size),
+        'steps_per_s': lambda: (steps, block_size),
+        'resets_per_s': lambda: (resets, block_size),
+        'frames_per_s': lambda: (frames(AirHockeyRenderer(env)), block_size),
+        'headless_frames_per_s': lambda: (frames(HeadlessAirHockeyRenderer(env)), block_size),
+        'rollout_steps_per_s': lambda: (rollout, n),
+    }
+    results, skipped = {}, {}
+    for metric in metrics:
+        try:
+            fn, metric_block_size = benches[metric]()
+            results[metric] = best_rate(fn, n, n_repeats, metric_block_size)
+        except (NotImplementedError, TypeError, IndexError) as e:
+            # e.g. AirHockeyRenderer cannot draw a puck off the table
+            skipped[metric] = f"{type(e).__name__}: {e}"
+    return results, skipped
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.realpath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def compare(results, baseline, tolerance, verbose=True):
+    """
+    Returns the (case, metric, ratio) of the regressions, rates that dropped by more than tolerance (a
+    fraction) from the baseline, and prints every metric next to the baseline if verbose.
+    """
+    regressions = []
+    if verbose:
+        print(f"{'case':18s} {'metric':22s} {'baseline':>12s} {'current':>12s} {'ratio':>7s}")
+    for case, metrics in results['results'].items():
+        for metric, value in metrics.items():
+            base = baseline['results'].get(case, {}).get(metric)
+            if base is None:
+                continue
+            ratio = value / base
+            flag = ''
+            if ratio < 1 - tolerance:
+                flag = 'REGRESSION'
+                regressions.append((case, metric, ratio))
+            elif ratio > 1 + tolerance:
+                flag = 'faster'
+            if verbose:
+                print(f"{case:18s} {metric:22s} {base:12.0f} {value:12.0f} {ratio:7.2f} {flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Throughput suite for the simulator, env, renderers and rollouts, '
+                                                 'with JSON output and a regression check against a baseline.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--simulator', type=str, default='box2d', help='Simulator to benchmark.')
+    parser.add_argument('--cases', type=str, nargs='+', default=list(CASES), help=f'Cases to run, from {list(CASES)}.')
+    parser.add_argument('--n_calls', type=int, default=1000, help='Timed calls per metric and repeat.')
+    parser.add_argument('--n_repeats', type=int, default=5, help='Repeats per metric.')
+    parser.add_argument('--block_size', type=int, default=50, help='Calls per block, the fastest block gives the rate.')
+    parser.add_argument('--episode_length', type=int, default=100, help='Calls between resets.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', type=str, default=None, help='Results JSON to compare against, exits with 1 on regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Relative slowdown that counts as a regression.')
+    parser.add_argument('--n_rechecks', type=int, default=2, help='Times a metric that looks regressed is measured again.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    actions = np.random.RandomState(0).uniform(-1, 1, size=(args.n_calls, 2))
+    results = {
+        'meta': {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'cfg': air_hockey_cfg_fp,
+            'args': vars(args),
+        },
+        'results': {},
+        'skipped': {},
+    }
+    envs = {}
+    for case in args.cases:
+        simulator_overrides, overrides = CASES[case]
+        env = envs[case] = make_env(air_hockey_cfg, args.simulator, simulator_overrides, overrides)
+        rates, skipped = bench_case(env, actions, args.episode_length, args.n_repeats, args.block_size)
+        results['results'][case] = rates
+        if skipped:
+            results['skipped'][case] = skipped
+        print(f"{case:18s} " + '  '.join(f"{metric} {rate:8.0f}" for metric, rate in rates.items())
+              + (f"  skipped {sorted(skipped)}" if skipped else ''))
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        # a slow stretch of the machine can still hit a whole metric, regressed ones are measured again
+        # and keep their best rate
+        for _ in range(args.n_rechecks):
+            for case, metric, _ in compare(results, baseline, args.tolerance, verbose=False):
+                rates, _ = bench_case(envs[case], actions, args.episode_length, args.n_repeats, args.block_size, [metric])
+                results['results'][case][metric] = max(results['results'][case][metric], rates[metric])
+        regressions = compare(results, baseline, args.tolerance)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print(f"{len(regressions)} regressions: " + ', '.join(f"{case}/{metric} ({ratio:.2f}x)" for case, metric, ratio in regressions))
+        sys.exit(1)
@@ -0,0 +1,119 @@
+import argparse
+import copy
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from trajectory_dataset import TrajectoryDataset, TrajectoryWriter
+
+
+def make_env(air_hockey_cfg):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def collect(env, n_steps, writer=None):
+    """
+    Random rollout in the get_trained_agent_trajs row layout (s, a, r, s', timestep). Rows go to the writer,
+    or to a list that is turned into one array at the end (the old way) when there is no writer.
+
+    Returns the rows (list version only) and the episode ends.
+    """
+    rng = np.random.RandomState(0)
+    obs, _ = env.reset(seed=0)
+    trajs, episode_ends = [], []
+    timestep = 0
+    for i in range(n_steps):
+        action = rng.uniform(-1, 1, size=env.action_space.shape)
+        next_obs, rew, terminated, truncated, _ = env.step(action)
+        if writer is None:
+            trajs.append(np.concatenate([obs, action, [rew], next_obs, [timestep]]))
+        else:
+            writer.append(obs=obs, action=action, reward=rew, next_obs=next_obs, timestep=timestep)
+        obs = next_obs
+        timestep += 1
+        if terminated or truncated:
+            episode_ends.append(i + 1)
+            if writer is not None:
+                writer.end_episode()
+            obs, _ = env.reset()
+            timestep = 0
+    if writer is None:
+        return np.array(trajs), episode_ends
+    writer.close()
+    return None, episode_ends
+
+
+def synthetic_peak(path, n_rows, row_size, chunk_size):
+    """
+    Peak traced MB of storing n_rows constant rows as a list + np.array, and with the writer.
+    """
+    row = np.ones(row_size)
+    tracemalloc.start()
+    trajs = [row.copy() for _ in range(n_rows)]
+    trajs = np.array(trajs)
+    list_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    del trajs
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    writer = TrajectoryWriter(path, {'row': row_size}, chunk_size=chunk_size)
+    for _ in range(n_rows):
+        writer.append(row=row)
+    writer.close()
+    writer_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return list_peak, writer_peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the trajectory dataset round trip and compare collection memory with a python list.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_steps', type=int, default=5000, help='Env steps collected for the round trip check.')
+    parser.add_argument('--chunk_size', type=int, default=1024, help='Rows per shard.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        env = make_env(air_hockey_cfg)
+        obs_dim, action_dim = env.observation_space.shape[0], env.action_space.shape[0]
+        start = time.perf_counter()
+        expected, episode_ends = collect(env, args.n_steps)
+        list_time = time.perf_counter() - start
+        columns = {'obs': obs_dim, 'action': action_dim, 'reward': 1, 'next_obs': obs_dim, 'timestep': 1}
+        path = os.path.join(tmp_dir, 'trajs')
+        start = time.perf_counter()
+        collect(env, args.n_steps, TrajectoryWriter(path, columns, chunk_size=args.chunk_size))
+        writer_time = time.perf_counter() - start
+
+        dataset = TrajectoryDataset(path)
+        assert len(dataset) == args.n_steps and np.array_equal(dataset.get_rows(), expected)
+        assert list(dataset.episode_ends) == episode_ends
+        start, stop = dataset.get_episode_bounds()[-1]
+        assert np.array_equal(dataset.get_episode(len(episode_ends) - 1)['obs'], expected[start:stop, :obs_dim])
+        print(f"round trip ok: {len(dataset)} rows in {len(dataset.shard_files)} shards, {len(episode_ends)} episodes; "
+              f"collection {list_time:.2f} s with a list, {writer_time:.2f} s with the writer")
+
+        row_size = 2 * obs_dim + action_dim + 2
+        for n_rows in [50000, 200000]:
+            list_peak, writer_peak = synthetic_peak(os.path.join(tmp_dir, 'synthetic'), n_rows, row_size, 16384)
+            print(f"{n_rows} rows: peak traced memory {list_peak:.1f} MB with a list, {writer_peak:.1f} MB with the writer")
+    finally:
+        shutil.rmtree(tmp_dir)
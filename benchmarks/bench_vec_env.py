@@ -0,0 +1,103 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+from vec_env import get_env_seeds, make_air_hockey_vec_env
+
+
+def get_params(air_hockey_cfg, task=None):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    if task is not None:
+        air_hockey_params['task'] = task
+    return air_hockey_params
+
+
+def make_dummy_vec_env(air_hockey_params, num_envs, seed=0):
+    """
+    The same envs as make_air_hockey_vec_env (same seeds), stepped one after the other in this process.
+    """
+    return DummyVecEnv([lambda env_seed=env_seed: AirHockeyEnv.from_dict(dict(air_hockey_params, seed=env_seed))
+                        for env_seed in get_env_seeds(seed, num_envs)])
+
+
+def get_actions(vec_env, n_steps, seed=0):
+    # float32, like the shared action buffer and the policies
+    shape = (n_steps, vec_env.num_envs, *vec_env.action_space.shape)
+    return np.random.default_rng(seed).uniform(-1, 1, size=shape).astype(np.float32)
+
+
+def assert_obs_equal(obs, ref_obs):
+    if isinstance(ref_obs, dict):
+        assert obs.keys() == ref_obs.keys()
+        for key in ref_obs:
+            assert np.array_equal(obs[key], ref_obs[key]), key
+    else:
+        assert np.array_equal(obs, ref_obs)
+
+
+def check_equivalence(vec_env, ref_env, n_steps):
+    """
+    Steps both vec envs with the same actions: observations, rewards, dones and terminal observations must
+    be identical. Returns the number of episodes that ended.
+    """
+    vec_env.seed(0)
+    ref_env.seed(0)
+    assert_obs_equal(vec_env.reset(), ref_env.reset())
+    n_done = 0
+    for actions in get_actions(ref_env, n_steps):
+        obs, rewards, dones, infos = vec_env.step(actions)
+        ref_obs, ref_rewards, ref_dones, ref_infos = ref_env.step(actions)
+        assert_obs_equal(obs, ref_obs)
+        assert np.array_equal(rewards, ref_rewards) and np.array_equal(dones, ref_dones)
+        for i in np.flatnonzero(ref_dones):
+            assert_obs_equal(infos[i]['terminal_observation'], ref_infos[i]['terminal_observation'])
+            n_done += 1
+    return n_done
+
+
+def bench_steps(vec_env, n_steps):
+    """
+    Returns microseconds per env step.
+    """
+    actions = get_actions(vec_env, n_steps)
+    vec_env.reset()
+    start = time.perf_counter()
+    for batch in actions:
+        vec_env.step(batch)
+    return (time.perf_counter() - start) / (n_steps * vec_env.num_envs) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check make_air_hockey_vec_env against DummyVecEnv, for state and '
+                                                 'goal (dict observation) tasks, and compare their step times.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--num_envs', type=int, default=4, help='Envs per vec env.')
+    parser.add_argument('--n_checked', type=int, default=1000, help='Batched steps per equivalence check.')
+    parser.add_argument('--n_steps', type=int, default=1000, help='Batched steps per timing.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    for task in (None, 'goal_position', 'goal_position_velocity'):
+        air_hockey_params = get_params(air_hockey_cfg, task)
+        vec_env = make_air_hockey_vec_env(air_hockey_params, args.num_envs)
+        ref_env = make_dummy_vec_env(air_hockey_params, args.num_envs)
+        n_done = check_equivalence(vec_env, ref_env, args.n_checked)
+        vec_us, ref_us = bench_steps(vec_env, args.n_steps), bench_steps(ref_env, args.n_steps)
+        vec_env.close()
+        print(f"task={task or air_hockey_params['task']:22s} envs={args.num_envs}: same as DummyVecEnv over "
+              f"{n_done:3d} episodes; {ref_us:6.1f} -> {vec_us:6.1f} us per env step")
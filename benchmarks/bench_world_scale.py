@@ -0,0 +1,145 @@
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+
+
+def make_env(air_hockey_cfg, world_scale, bullet, physics_substeps=None):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    simulator_params = air_hockey_params['simulator_params']
+    simulator_params['world_scale'] = world_scale
+    simulator_params['bullet'] = bullet
+    simulator_params['num_paddles'] = 1
+    if physics_substeps is not None:
+        simulator_params['physics_substeps'] = physics_substeps
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def stress_tunneling(env, speeds, n_shots, seed=0):
+    """
+    Shoots the puck straight at the still ego paddle from across the table, slightly off center, and counts
+    the shots where it comes out behind the paddle instead of bouncing back, or leaves the table.
+
+    Returns:
+        dict: speed -> (fraction of shots through the paddle, fraction of shots off the table).
+    """
+    simulator = env.simulator
+    scale = simulator.world_scale
+    rng = np.random.default_rng(seed)
+    paddle_y = -simulator.length / 4
+    contact = simulator.paddle_radius + simulator.puck_radius
+    results = {}
+    for speed in speeds:
+        n_through = n_off = 0
+        for _ in range(n_shots):
+            env.reset()
+            x = rng.uniform(-0.2, 0.2)
+            paddle = simulator.paddles['paddle_ego'][0]
+            puck = simulator.pucks['puck0'][0]
+            # box2d coords, the paddle's home is at -y
+            paddle.transform = ((x * scale, paddle_y * scale), 0)
+            paddle.linearVelocity = (0, 0)
+            puck.transform = (((x + rng.uniform(-0.5, 0.5) * contact) * scale, simulator.length / 4 * scale), 0)
+            puck.linearVelocity = (0, -speed * scale)
+            n_steps = int(np.ceil(simulator.length / 2 / (speed * simulator.time_per_step))) + 2
+            for _ in range(n_steps):
+                state = simulator.get_transition(np.zeros(2))
+                # env coords: x = -box2d y, y = box2d x. a puck that hit the paddle moves back up (the
+                # paddle is 25 times heavier), one behind it went through (before the wall sends it back)
+                puck_x, puck_y = state[4], state[5]
+                if abs(puck_x) > simulator.length / 2 or abs(puck_y) > simulator.width / 2:
+                    n_off += 1
+                    break
+                if puck_x > -paddle_y:
+                    n_through += 1
+                    break
+        results[speed] = (n_through / n_shots, n_off / n_shots)
+    return results
+
+
+def check_bounces(env, speeds):
+    """
+    Shoots the puck at a side wall without gravity. box2d drops the restitution of contacts slower than
+    b2_velocityThreshold (1 unit/s), which is 1 / world_scale m/s.
+
+    Returns:
+        dict: speed -> speed after the bounce over the speed before it (0 if the puck stuck to the wall).
+    """
+    simulator = env.simulator
+    scale = simulator.world_scale
+    results = {}
+    for speed in speeds:
+        env.reset()
+        simulator.world.gravity = (0, 0)
+        puck = simulator.pucks['puck0'][0]
+        # box2d coords, the side walls are at x = +-width / 2
+        puck.transform = ((simulator.width / 4 * scale, 0), 0)
+        puck.linearVelocity = (speed * scale, 0)
+        # env y is box2d x
+        velocities = [simulator.get_transition(np.zeros(2))[7]
+                      for _ in range(int(np.ceil(simulator.width / (speed * simulator.time_per_step))) + 2)]
+        after = np.argmax(np.array(velocities) < 0)
+        results[speed] = -velocities[after] / velocities[after - 1] if after > 0 else 0.0
+    return results
+
+
+def bench_steps(env, n_steps, n_repeats=3, seed=0):
+    """
+    Returns microseconds per env step of small random moves, the best of n_repeats runs.
+    """
+    actions = np.random.default_rng(seed).uniform(-0.05, 0.05, size=(n_steps, 2))
+    times = []
+    for _ in range(n_repeats):
+        env.reset(seed=seed)
+        start = time.perf_counter()
+        for action in actions:
+            _, _, terminated, truncated, _ = env.step(action)
+            if terminated or truncated:
+                env.reset()
+        times.append((time.perf_counter() - start) / n_steps * 1e6)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bounce pucks off a wall at several world scales, shoot them at a '
+                                                 'paddle with and without bullet bodies at several world scales and '
+                                                 'substeps, and compare env step times.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_shots', type=int, default=50, help='Shots per speed.')
+    parser.add_argument('--n_steps', type=int, default=5000, help='Env steps per timing.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    for world_scale in (1, 4):
+        env = make_env(air_hockey_cfg, world_scale, True)
+        print(f"scale={world_scale} wall bounces: " + ", ".join(f"{speed} m/s restitution {restitution:.2f}" for speed, restitution
+                                                       in check_bounces(env, (0.25, 0.5, 2)).items()))
+
+    speeds = (2, 4, 8)
+    for physics_substeps in (1, 4):
+        for world_scale in (1, 4):
+            for bullet in (True, False):
+                env = make_env(air_hockey_cfg, world_scale, bullet, physics_substeps)
+                results = stress_tunneling(env, speeds, args.n_shots)
+                step_us = bench_steps(env, args.n_steps)
+                # box2d clamps the travel of a body to b2_maxTranslation (2 units) per world step
+                max_speed = 2 / (world_scale * env.simulator.physics_time_step)
+                print(f"substeps={physics_substeps} scale={world_scale} bullet={bullet!s:5s}: "
+                      + ", ".join(f"{speed} m/s {through:4.0%} through {off:4.0%} off" for speed, (through, off)
+                                  in results.items())
+                      + f"; {step_us:6.1f} us per env step, speed limit {max_speed:5.1f} m/s")
@@ -0,0 +1,214 @@
+import argparse
+import collections
+import copy
+import ctypes
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from airhockey import AirHockeyEnv
+
+
+def make_env(air_hockey_cfg, zero_alloc, num_paddles=1, task=None):
+    air_hockey_params = copy.deepcopy(air_hockey_cfg['air_hockey'])
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    air_hockey_params['seed'] = 0
+    air_hockey_params['zero_alloc'] = zero_alloc
+    air_hockey_params['simulator_params']['num_paddles'] = num_paddles
+    if task is not None:
+        air_hockey_params['task'] = task
+    return AirHockeyEnv.from_dict(air_hockey_params)
+
+
+def get_actions(env, n_steps, seed=0):
+    shape = (n_steps, 2, 2) if env.multiagent else (n_steps, 2)
+    return np.random.default_rng(seed).uniform(-0.05, 0.05, size=shape)
+
+
+class AllocationCounter:
+    """
+    Counts every numpy array data allocation (temporaries freed right away included) and the python line
+    that made it, by installing a counting memory handler (numpy's PyDataMem_SetHandler, through ctypes)
+    that hands the memory on to libc. Every allocation calls back into python, so use it for checks only.
+    """
+    libc = ctypes.CDLL(None)
+    libc.malloc.restype = libc.calloc.restype = libc.realloc.restype = ctypes.c_void_p
+    libc.malloc.argtypes = [ctypes.c_size_t]
+    libc.calloc.argtypes = [ctypes.c_size_t, ctypes.c_size_t]
+    libc.realloc.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    libc.free.argtypes = [ctypes.c_void_p]
+    malloc_fn = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+    calloc_fn = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_size_t)
+    realloc_fn = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+    free_fn = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+
+    class Allocator(ctypes.Structure):
+        _fields_ = [('ctx', ctypes.c_void_p), ('malloc', ctypes.c_void_p), ('calloc', ctypes.c_void_p),
+                    ('realloc', ctypes.c_void_p), ('free', ctypes.c_void_p)]
+
+    class Handler(ctypes.Structure):
+        _fields_ = [('name', ctypes.c_char * 127), ('version', ctypes.c_uint8)]
+
+    # PyDataMem_SetHandler in the numpy C API table, see numpy/__multiarray_api.h
+    SET_HANDLER_INDEX = 304
+
+    def __init__(self):
+        # allocations per source line, file:line
+        self.lines = collections.Counter()
+        self.callbacks = (self.malloc_fn(self.malloc), self.calloc_fn(self.calloc), self.realloc_fn(self.realloc),
+                          self.free_fn(self.free))
+        handler_type = type('Handler', (self.Handler,), {'_fields_': [('allocator', self.Allocator)]})
+        self.handler = handler_type(b'counting_allocator', 1, self.Allocator(
+            None, *(ctypes.cast(callback, ctypes.c_void_p) for callback in self.callbacks)))
+        capsule_new = ctypes.pythonapi.PyCapsule_New
+        capsule_new.restype, capsule_new.argtypes = ctypes.py_object, [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_void_p]
+        self.capsule = capsule_new(ctypes.addressof(self.handler), b'mem_handler', None)
+        get_pointer = ctypes.pythonapi.PyCapsule_GetPointer
+        get_pointer.restype, get_pointer.argtypes = ctypes.c_void_p, [ctypes.py_object, ctypes.c_char_p]
+        api = ctypes.cast(get_pointer(np._core._multiarray_umath._ARRAY_API, None), ctypes.POINTER(ctypes.c_void_p))
+        self.set_handler = ctypes.PYFUNCTYPE(ctypes.py_object, ctypes.py_object)(api[self.SET_HANDLER_INDEX])
+
+    def record(self):
+        frame = sys._getframe(2)
+        self.lines[f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno}"] += 1
+
+    def malloc(self, ctx, size):
+        self.record()
+        return self.libc.malloc(size)
+
+    def calloc(self, ctx, n_elements, element_size):
+        self.record()
+        return self.libc.calloc(n_elements, element_size)
+
+    def realloc(self, ctx, pointer, size):
+        self.record()
+        return self.libc.realloc(pointer, size)
+
+    def free(self, ctx, pointer, size):
+        self.libc.free(pointer)
+
+    def __enter__(self):
+        self.previous = self.set_handler(self.capsule)
+        return self
+
+    def __exit__(self, *exc_info):
+        # arrays allocated here keep the handler (and so this counter) alive until they are freed
+        self.set_handler(self.previous)
+
+
+def count_allocations(env, n_steps):
+    """
+    Numpy arrays allocated by env.step over n_steps steps, temporaries included (steps that end an episode
+    and the resets after them are left out).
+
+    Returns:
+        collections.Counter: arrays allocated per source line (file:line).
+    """
+    actions = get_actions(env, n_steps)
+    counter = AllocationCounter()
+    lines = collections.Counter()
+    # warm up, e.g. the contact buffer grows on the first contacts
+    env.reset(seed=0)
+    for action in actions[:50]:
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            env.reset()
+    with counter:
+        for action in actions:
+            counter.lines = collections.Counter()
+            _, _, terminated, truncated, _ = env.step(action)
+            if terminated or truncated:
+                env.reset()
+                continue
+            lines.update(counter.lines)
+    return lines
+
+
+def check_rewards(env, n_steps):
+    """
+    Steps env and checks its rewards and flags against RewardEngine.compute on the same transitions. zero_alloc
+    envs compute them on python floats, which can differ from numpy in the last bit (and the multi-agent
+    rewards are float32), so rewards must match within a tolerance. Returns the number of episodes played.
+    """
+    engine = env.reward_engine
+    env.reset(seed=0)
+    n_episodes = 1
+    for action in get_actions(env, n_steps):
+        _, reward, terminated, truncated, _ = env.step(action)
+        timestep, contact_events = env.current_timestep - 1, env.simulator.contact_events
+        if env.multiagent:
+            results = [engine.compute(env.joint_state[i], env.joint_old_state[i], timestep, hit_a_puck=hit_a_puck,
+                                      multiagent=True)
+                       for i, hit_a_puck in enumerate((contact_events.ego_hit_puck, contact_events.alt_hit_puck))]
+            ref_terminated = any(result['terminated'] for result in results)
+            ref_truncated = any(result['truncated'] for result in results) and not ref_terminated
+        else:
+            goal_pos, goal_vel, goal_radius = env.get_goal_args()
+            results = [engine.compute(env.current_state, env.old_state, timestep, goal_pos, goal_vel, goal_radius,
+                                      contact_events.ego_hit_puck)]
+            ref_terminated, ref_truncated = results[0]['terminated'], results[0]['truncated']
+        ref_reward = [result['reward'] for result in results] if env.multiagent else results[0]['reward']
+        assert np.allclose(reward, ref_reward, rtol=1e-6, atol=1e-9), (reward, ref_reward)
+        assert (terminated, truncated) == (ref_terminated, ref_truncated)
+        if terminated or truncated:
+            env.reset()
+            n_episodes += 1
+    return n_episodes
+
+
+def bench_steps(envs, n_steps, n_repeats=5):
+    """
+    Returns microseconds per env step for every env, the best of n_repeats runs interleaved between the envs.
+    """
+    actions = get_actions(envs[0], n_steps)
+    times = [[] for _ in envs]
+    for _ in range(n_repeats):
+        for env, env_times in zip(envs, times):
+            env.reset(seed=0)
+            start = time.perf_counter()
+            for action in actions:
+                _, _, terminated, truncated, _ = env.step(action)
+                if terminated or truncated:
+                    env.reset()
+            env_times.append((time.perf_counter() - start) / n_steps * 1e6)
+    return [min(env_times) for env_times in times]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Count the numpy arrays env steps allocate (temporaries included), check that '
+                                                 'zero_alloc envs allocate none and that their rewards match '
+                                                 'RewardEngine.compute, and compare step times with and without '
+                                                 'zero_alloc.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--n_checked', type=int, default=300, help='Env steps per allocation check.')
+    parser.add_argument('--n_rewards', type=int, default=5000, help='Env steps per reward check.')
+    parser.add_argument('--n_steps', type=int, default=5000, help='Env steps per timing.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    for num_paddles, task in ((1, None), (2, None), (1, 'goal_position_velocity'), (1, 'puck_catch')):
+        name = f"paddles={num_paddles} task={task or air_hockey_cfg['air_hockey']['task']}"
+        envs = [make_env(air_hockey_cfg, zero_alloc, num_paddles, task) for zero_alloc in (False, True)]
+        for env in envs:
+            lines = count_allocations(env, args.n_checked)
+            if env.zero_alloc:
+                # the reward terms included, they run on python floats
+                assert not lines, f"{name}: arrays allocated per {args.n_checked} steps at {dict(lines)}"
+                n_episodes = check_rewards(env, args.n_rewards)
+                print(f"{name} with zero_alloc: no arrays allocated, rewards match RewardEngine.compute over "
+                      f"{n_episodes} episodes")
+            else:
+                print(f"{name} without zero_alloc: {sum(lines.values()) / args.n_checked:5.1f} arrays per step "
+                      f"(temporaries included) from {sorted(lines)}")
+        times = bench_steps(envs, args.n_steps)
+        print(f"{name}: {times[0]:6.1f} -> {times[1]:6.1f} us per env step with zero_alloc")
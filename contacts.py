@@ -0,0 +1,96 @@
+"""
+Contact events recorded by the simulators over one env step.
+
+Every event is one pair of bodies that touched during the step, with the total normal impulse between
+them and whether the contact began during the step (a hit) or was already touching before (e.g. a paddle
+pushing the puck along). Bodies are identified by kind and index:
+
+    paddle_puck:  a = paddle index (0 ego, 1 alt), b = puck index
+    puck_wall:    a = puck index,                 b = -1
+    puck_target:  a = puck index,                 b = target index
+    paddle_wall:  a = paddle index,               b = -1
+"""
+import numpy as np
+
+# body kinds, box2d bodies carry (kind, index) as userData
+BODY_WALL = 0
+BODY_PADDLE = 1
+BODY_PUCK = 2
+BODY_BLOCK = 3
+BODY_OBSTACLE = 4
+BODY_TARGET = 5
+
+# event kinds
+PADDLE_PUCK = 0
+PUCK_WALL = 1
+PUCK_TARGET = 2
+PADDLE_WALL = 3
+EVENT_NAMES = ('paddle_puck', 'puck_wall', 'puck_target', 'paddle_wall')
+
+# (body kind, body kind) -> (event kind, whether the bodies are swapped w.r.t. the a/b order above)
+EVENT_LOOKUP = {}
+for _event, (_kind_a, _kind_b) in enumerate([(BODY_PADDLE, BODY_PUCK), (BODY_PUCK, BODY_WALL),
+                                             (BODY_PUCK, BODY_TARGET), (BODY_PADDLE, BODY_WALL)]):
+    EVENT_LOOKUP[(_kind_a, _kind_b)] = (_event, False)
+    EVENT_LOOKUP[(_kind_b, _kind_a)] = (_event, True)
+
+EVENT_DTYPE = np.dtype([('kind', np.int8), ('a', np.int16), ('b', np.int16), ('begin', np.bool_), ('impulse', np.float64)])
+
+
+class ContactEventBuffer:
+    """
+    Preallocated per-step event buffer, plus hit counts (events that began) over the episode.
+
+    The simulators clear it at the start of every env step and add to it only when bodies touch,
+    so steps without contacts cost one clear() call.
+    """
+
+    def __init__(self, capacity=16):
+        self.buffer = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self.n = 0
+        # (kind, a, b) -> row, events of the same pair are merged over substeps and action repeats
+        self.rows = {}
+        self.ego_hit_puck = False
+        self.alt_hit_puck = False
+        self.hit_counts = np.zeros(len(EVENT_NAMES), dtype=int)
+
+    def clear(self):
+        if self.n:
+            self.n = 0
+            self.rows.clear()
+        self.ego_hit_puck = False
+        self.alt_hit_puck = False
+
+    def reset_counts(self):
+        self.clear()
+        self.hit_counts[:] = 0
+
+    def add(self, kind, a, b, begin, impulse):
+        key = (kind, a, b)
+        row = self.rows.get(key)
+        if row is None:
+            if self.n == len(self.buffer):
+                self.buffer = np.concatenate([self.buffer, np.zeros(len(self.buffer), dtype=EVENT_DTYPE)])
+            row = self.rows[key] = self.n
+            self.buffer[row] = (kind, a, b, False, 0.0)
+            self.n += 1
+        event = self.buffer[row]
+        if begin and not event['begin']:
+            event['begin'] = True
+            self.hit_counts[kind] += 1
+            if kind == PADDLE_PUCK:
+                if a == 0:
+                    self.ego_hit_puck = True
+                else:
+                    self.alt_hit_puck = True
+        event['impulse'] += impulse
+
+    def get_events(self, copy=True):
+        """
+        This step's events, an EVENT_DTYPE array. With copy=False a view of the buffer, overwritten by the next step.
+        """
+        events = self.buffer[:self.n]
+        return events.copy() if copy else events
+
+    def get_hit_counts(self):
+        return {name: int(count) for name, count in zip(EVENT_NAMES, self.hit_counts)}
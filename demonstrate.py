@@ -113,9 +113,9 @@ class Demonstrator:
         """
         Plays the air hockey game against an agent.
 
-        Iterates through a loop, capturing user input and updating the game state.
+        Iterates through a loop, capturing user input for the ego paddle while the agent plays the alt paddle.
         Prints the frames per second (fps) every 1000 iterations.
-        Resets the game state every 300 iterations.
+        Resets the game state every 300 iterations or when an episode ends.
 
         Parameters:
         policy (function): The policy function of the agent.
@@ -123,22 +123,48 @@ class Demonstrator:
         Returns:
         None
         """
-        goal_pos = np.array([self.air_hockey.length / 2, 0]) # this is the home base, will be reversed for the alt policy
-        (ego_obs, alt_obs), _ = self.air_hockey.reset(alt_goal_pos=goal_pos, ego_goal_pos=goal_pos, goal_radius_type='home')
+        (ego_obs, alt_obs), _ = self.air_hockey.reset()
         start = time.time()
         for i in range(1000000):
             if i % 1000 == 0:
                 print("fps", 1000 / (time.time() - start))
                 start = time.time()
             action = self.demonstrate()
+            # the alt observation and action are in the alt player's frame, the env turns them around
             other_action = policy.predict(alt_obs, deterministic=True)[0]
-            # invert other action because it's upside down
-            other_action = np.array([-other_action[0], -other_action[1]])
-            joint_action = (action, other_action)
+            joint_action = np.stack([action, other_action])
             (ego_obs, alt_obs), (ego_rew, alt_rew), is_finished, truncated, info = self.air_hockey.step(joint_action)
-            if i % 300 == 0:
-                self.air_hockey.reset()
+            if self.print_reward:
+                print("reward: ", ego_rew, alt_rew)
+            if is_finished or truncated or i % 300 == 0:
+                (ego_obs, alt_obs), _ = self.air_hockey.reset()
+
+    def watch_self_play(self, policy):
+        """
+        Shows the agent playing against itself.
+
+        Both paddles act from a single batched policy.predict call on the (2, 8) observations per frame.
+
+        Parameters:
+        policy (function): The policy function of the agent.
 
+        Returns:
+        None
+        """
+        obs, _ = self.air_hockey.reset()
+        start = time.time()
+        for i in range(1000000):
+            if i % 1000 == 0:
+                print("fps", 1000 / (time.time() - start))
+                start = time.time()
+            cv2.imshow('Air Hockey 2D Demonstration', self.renderer.get_frame())
+            cv2.waitKey(20)
+            joint_action = policy.predict(obs, deterministic=True)[0]
+            obs, rew, is_finished, truncated, info = self.air_hockey.step(joint_action)
+            if self.print_reward:
+                print("reward: ", rew)
+            if is_finished or truncated:
+                obs, _ = self.air_hockey.reset()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Demonstrate the air hockey game.')
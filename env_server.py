@@ -0,0 +1,368 @@
+"""
+Env-as-a-service: AirHockeyEnvServer hosts a pool of AirHockeyEnv instances behind a local TCP or Unix
+socket, and AirHockeyEnvClient drives the whole pool from another process as a gymnasium VectorEnv.
+
+Every request and reply is one message: a header (payload bytes, command, number of arrays) followed by
+the arrays, each as its dtype code, its shape and its raw bytes (see send_message), so observations,
+actions and rewards cross the socket without pickling. Both ends are meant for the same machine (arrays
+use the native byte order).
+
+The server steps its envs in order, in one process, for one client at a time, and resets finished envs
+in the same step (gymnasium's same-step autoreset, the final observations go in infos['final_obs']).
+Run one server per core for more throughput. Per-step env infos (contacts, hit counts, winners) stay on
+the server. Both ends time every request with a StepProfiler, see AirHockeyEnvClient.get_stats.
+"""
+import argparse
+import os
+import socket
+import struct
+import time
+
+import numpy as np
+import yaml
+from gymnasium import spaces
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+
+from airhockey import AirHockeyEnv
+from profiler import StepProfiler
+
+# commands, and the status of replies
+SPACES, RESET, STEP, STATS, SHUTDOWN = range(5)
+OK, ERROR = 0, 255
+
+HEADER = struct.Struct('<IBB')  # payload bytes, command, number of arrays
+ARRAY_HEADER = struct.Struct('<cB')  # dtype code, ndim, followed by ndim uint32 sizes
+
+
+def send_message(sock, command, arrays=()):
+    parts = []
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        parts += [ARRAY_HEADER.pack(array.dtype.char.encode(), array.ndim),
+                  struct.pack(f'<{array.ndim}I', *array.shape), array.tobytes()]
+    payload = b''.join(parts)
+    sock.sendall(HEADER.pack(len(payload), command, len(arrays)) + payload)
+
+
+def recv_exactly(sock, n_bytes):
+    buffer = bytearray(n_bytes)
+    view = memoryview(buffer)
+    received = 0
+    while received < n_bytes:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("Connection closed.")
+        received += n
+    return buffer
+
+
+def recv_message(sock):
+    """
+    Returns:
+        (int, list): the command and the arrays of the next message, views of its payload.
+    """
+    size, command, n_arrays = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    payload = recv_exactly(sock, size)
+    arrays = []
+    offset = 0
+    for _ in range(n_arrays):
+        code, ndim = ARRAY_HEADER.unpack_from(payload, offset)
+        offset += ARRAY_HEADER.size
+        shape = struct.unpack_from(f'<{ndim}I', payload, offset)
+        offset += 4 * ndim
+        dtype = np.dtype(code.decode())
+        count = int(np.prod(shape))
+        arrays.append(np.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(shape))
+        offset += count * dtype.itemsize
+    return command, arrays
+
+
+def encode_text(text):
+    return np.frombuffer(text.encode(), dtype=np.uint8)
+
+
+def decode_text(array):
+    return array.tobytes().decode()
+
+
+def make_socket(address):
+    """
+    A socket for address: a path (str) for a Unix socket, or a (host, port) tuple for TCP.
+    """
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # requests are small and answered one at a time, don't wait to batch them
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def stack_space(space, num_agents):
+    """
+    The space of one env of num_agents players, whose (per player) Box space is space: two player envs
+    take and return one row per player, see AirHockeyEnv.multi_step.
+    """
+    if num_agents == 1:
+        return space
+    return spaces.Box(np.stack([space.low] * num_agents), np.stack([space.high] * num_agents), dtype=space.dtype)
+
+
+def get_space_keys(space):
+    # observation keys in message order, [None] for a single Box
+    return list(space.spaces) if isinstance(space, spaces.Dict) else [None]
+
+
+class AirHockeyEnvServer:
+    """
+    A pool of envs served over a socket, see the module docstring.
+
+    Args:
+        air_hockey_params (dict): AirHockeyEnv parameters, as passed to AirHockeyEnv.from_dict.
+        num_envs (int): number of envs in the pool.
+        address (str or tuple): Unix socket path, or (host, port) for TCP (port 0 picks a free one).
+        seed (int, optional): base seed, envs get the seeds of make_air_hockey_vec_env. Defaults to 0.
+        make_env (callable, optional): builds one env from its parameters. Defaults to AirHockeyEnv.from_dict.
+    """
+
+    def __init__(self, air_hockey_params, num_envs, address, seed=0, make_env=AirHockeyEnv.from_dict):
+        # same seeds as the worker processes of make_air_hockey_vec_env
+        from vec_env import get_env_seeds
+        self.envs = [make_env(dict(air_hockey_params, seed=env_seed)) for env_seed in get_env_seeds(seed, num_envs)]
+        self.num_envs = num_envs
+        num_agents = getattr(self.envs[0], 'num_agents', 1)
+        self.observation_space = stack_space(self.envs[0].observation_space, num_agents)
+        self.action_space = stack_space(self.envs[0].action_space, num_agents)
+        self.keys = get_space_keys(self.observation_space)
+        single_spaces = self.observation_space.spaces if None not in self.keys else {None: self.observation_space}
+        # batch buffers, rewritten by every request
+        self.obs = {key: np.zeros((num_envs, *space.shape), dtype=space.dtype) for key, space in single_spaces.items()}
+        self.rewards = np.zeros((num_envs, num_agents) if num_agents > 1 else num_envs)
+        self.terminated = np.zeros(num_envs, dtype=bool)
+        self.truncated = np.zeros(num_envs, dtype=bool)
+
+        self.profiler = StepProfiler()
+        self.handlers = {SPACES: self.handle_spaces,
+                         RESET: self.profiler.wrap('reset', self.handle_reset),
+                         STEP: self.profiler.wrap('step', self.handle_step),
+                         STATS: self.handle_stats}
+
+        self.address = address
+        if isinstance(address, str) and os.path.exists(address):
+            os.remove(address)
+        self.sock = make_socket(address)
+        if not isinstance(address, str):
+            # restarting on the same port should not wait for the last connections to time out
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(address)
+        self.sock.listen(1)
+        if not isinstance(address, str):
+            self.address = self.sock.getsockname()[:2]
+
+    def write_obs(self, buffers, i, obs):
+        for key, buffer in buffers.items():
+            buffer[i] = obs if key is None else obs[key]
+
+    def handle_spaces(self, arrays):
+        # the client rebuilds the spaces from their bounds
+        single_spaces = self.observation_space.spaces if None not in self.keys else {None: self.observation_space}
+        replies = [np.array([self.num_envs]), encode_text('\n'.join(key or '' for key in self.keys))]
+        for space in (*single_spaces.values(), self.action_space):
+            replies += [space.low, space.high]
+        return replies
+
+    def handle_reset(self, arrays):
+        seeds, = arrays
+        for i, env in enumerate(self.envs):
+            # negative seeds stand for None
+            obs, _ = env.reset(seed=int(seeds[i])) if seeds[i] >= 0 else env.reset()
+            self.write_obs(self.obs, i, obs)
+        return list(self.obs.values())
+
+    def handle_step(self, arrays):
+        actions, = arrays
+        done_index, final_obs = [], []
+        for i, env in enumerate(self.envs):
+            obs, reward, terminated, truncated, _ = env.step(actions[i])
+            self.rewards[i], self.terminated[i], self.truncated[i] = reward, terminated, truncated
+            if terminated or truncated:
+                done_index.append(i)
+                final_obs.append({key: np.copy(obs if key is None else obs[key]) for key in self.keys})
+                obs, _ = env.reset()
+            self.write_obs(self.obs, i, obs)
+        # final observations of the finished envs only, in the order of done_index
+        final = [np.stack([obs[key] for obs in final_obs]) if final_obs else self.obs[key][:0] for key in self.keys]
+        return [*self.obs.values(), self.rewards, self.terminated, self.truncated,
+                np.array(done_index, dtype=np.int64), *final]
+
+    def handle_stats(self, arrays):
+        profile = self.profiler.get_profile()
+        return [encode_text('\n'.join(profile)),
+                np.array([[stats['total_s'], stats['calls']] for stats in profile.values()])]
+
+    def serve(self):
+        """
+        Answers requests, one client connection at a time, until a client sends SHUTDOWN.
+        """
+        try:
+            while True:
+                conn, _ = self.sock.accept()
+                with conn:
+                    if not isinstance(self.address, str):
+                        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    if not self.serve_connection(conn):
+                        return
+        finally:
+            self.close()
+
+    def serve_connection(self, conn):
+        # False once the client asked for a shutdown
+        while True:
+            try:
+                command, arrays = recv_message(conn)
+            except ConnectionError:
+                return True
+            if command == SHUTDOWN:
+                send_message(conn, OK)
+                return False
+            try:
+                replies = self.handlers[command](arrays)
+            except Exception as e:
+                send_message(conn, ERROR, [encode_text(f"{type(e).__name__}: {e}")])
+            else:
+                send_message(conn, OK, replies)
+
+    def close(self):
+        self.sock.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+        for env in self.envs:
+            env.close()
+
+
+class AirHockeyEnvClient(VectorEnv):
+    """
+    Gymnasium VectorEnv of the envs of an AirHockeyEnvServer.
+
+    Finished envs are reset in the same step (AutoresetMode.SAME_STEP): their final observations are in
+    infos['final_obs'], masked by infos['_final_obs']. Two player envs take and return one row per player,
+    and their rewards are (num_envs, 2).
+    Observations and rewards are views of the last reply, copy them to keep them past the next request.
+
+    Args:
+        address (str or tuple): the server's Unix socket path or (host, port).
+        timeout (float, optional): seconds to keep retrying the connection while the server starts.
+    """
+    metadata = {'autoreset_mode': AutoresetMode.SAME_STEP}
+
+    def __init__(self, address, timeout=10.0):
+        self.sock = make_socket(address)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.sock.connect(address)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+        replies = self.request(SPACES)
+        self.num_envs = int(replies[0][0])
+        self.keys = [key or None for key in decode_text(replies[1]).split('\n')]
+        bounds = replies[2:]
+        boxes = [spaces.Box(low, high, dtype=low.dtype) for low, high in zip(bounds[0::2], bounds[1::2])]
+        self.single_observation_space = boxes[0] if self.keys == [None] else spaces.Dict(dict(zip(self.keys, boxes)))
+        self.single_action_space = boxes[-1]
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+
+        # round trips, from sending the request to decoding the reply
+        self.profiler = StepProfiler()
+        self.timed_reset = self.profiler.wrap('reset', self.request)
+        self.timed_step = self.profiler.wrap('step', self.request)
+
+    def request(self, command, arrays=()):
+        send_message(self.sock, command, arrays)
+        status, replies = recv_message(self.sock)
+        if status == ERROR:
+            raise RuntimeError(f"Env server: {decode_text(replies[0])}")
+        return replies
+
+    def get_obs(self, arrays):
+        return arrays[0] if self.keys == [None] else dict(zip(self.keys, arrays))
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        if seed is None:
+            seeds = np.full(self.num_envs, -1, dtype=np.int64)
+        elif isinstance(seed, int):
+            seeds = seed + np.arange(self.num_envs, dtype=np.int64)
+        else:
+            seeds = np.array([-1 if s is None else s for s in seed], dtype=np.int64)
+        return self.get_obs(self.timed_reset(RESET, [seeds])), {}
+
+    def step(self, actions):
+        # sent as given, the envs see the same actions as in process
+        replies = self.timed_step(STEP, [np.asarray(actions)])
+        n_keys = len(self.keys)
+        obs = self.get_obs(replies[:n_keys])
+        rewards, terminated, truncated, done_index = replies[n_keys:n_keys + 4]
+        final = replies[n_keys + 4:]
+        infos = {}
+        for row, i in enumerate(done_index):
+            infos = self._add_info(infos, {'final_obs': self.get_obs([array[row] for array in final])}, int(i))
+        return obs, rewards, terminated, truncated, infos
+
+    def get_stats(self):
+        """
+        Request latency and throughput, on the client (round trips) and on the server (handling only).
+
+        Returns:
+            dict: 'client' and 'server' profiles ({'reset', 'step'} -> {'calls', 'total_s', 'mean_us'},
+            see StepProfiler.get_profile), and 'env_steps_per_s', env steps per second of step round trips.
+        """
+        names, totals = self.request(STATS)
+        server = {name: {'calls': int(calls), 'total_s': float(total),
+                         'mean_us': float(total / calls * 1e6) if calls else 0.0}
+                  for name, (total, calls) in zip(decode_text(names).split('\n'), totals)}
+        client = self.profiler.get_profile()
+        step = client['step']
+        return {'client': client, 'server': server,
+                'env_steps_per_s': step['calls'] * self.num_envs / step['total_s'] if step['total_s'] else 0.0}
+
+    def reset_stats(self):
+        self.profiler.reset()
+
+    def close_extras(self, shutdown=False, **kwargs):
+        """
+        Disconnects, the server then waits for the next client. shutdown=True stops the server too.
+        """
+        if shutdown:
+            self.request(SHUTDOWN)
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve a pool of air hockey envs over a local socket.')
+    parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--num_envs', type=int, default=None, help='Envs in the pool, defaults to num_envs of the config.')
+    parser.add_argument('--socket', type=str, default=None, help='Unix socket path, instead of TCP.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='TCP host.')
+    parser.add_argument('--port', type=int, default=5555, help='TCP port.')
+    args = parser.parse_args()
+    if args.cfg is None:
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        air_hockey_cfg_fp = os.path.join(dir_path, 'configs', 'train_ppo.yaml')
+    else:
+        air_hockey_cfg_fp = args.cfg
+    with open(air_hockey_cfg_fp, 'r') as f:
+        air_hockey_cfg = yaml.safe_load(f)
+
+    air_hockey_params = air_hockey_cfg['air_hockey']
+    air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    address = args.socket if args.socket is not None else (args.host, args.port)
+    server = AirHockeyEnvServer(air_hockey_params, args.num_envs or air_hockey_cfg['num_envs'], address,
+                                seed=air_hockey_cfg['seed'])
+    print(f"serving {server.num_envs} envs on {server.address}")
+    server.serve()
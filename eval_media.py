@@ -0,0 +1,224 @@
+"""
+Evaluation videos of a trained policy, rendered in background worker processes.
+
+Every video is one job: a worker builds its own env (with its own seed), loads the saved model and
+VecNormalize stats, runs the episodes and streams each frame straight into the encoders (GIF and/or
+MP4), so only the current frame is ever held in memory. start_eval_media returns right away, the
+training script can go on with the next seed and call EvalMediaJob.wait() before it exits.
+"""
+import copy
+import multiprocessing as mp
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+MEDIA_FORMATS = ('gif', 'mp4')
+
+
+class GifStreamWriter:
+    """
+    Looping GIF that is written frame by frame.
+
+    The palette of the first frame (which shows the table, paddles and pucks) is the global palette,
+    later frames are mapped onto it without dithering.
+
+    Args:
+        path (str): output file.
+        fps (float): frames per second.
+    """
+
+    def __init__(self, path, fps):
+        from PIL import Image, GifImagePlugin
+        self.Image = Image
+        self.GifImagePlugin = GifImagePlugin
+        self.file = open(path, 'wb')
+        self.duration = int(1000 / fps)
+        self.palette_image = None
+
+    def append(self, frame):
+        """
+        Adds one RGB (height, width, 3) uint8 frame.
+        """
+        image = self.Image.fromarray(frame)
+        if self.palette_image is None:
+            self.palette_image = image.quantize(colors=256, dither=self.Image.Dither.NONE)
+            header, _ = self.GifImagePlugin.getheader(self.palette_image, info={'loop': 0})
+            self.file.write(b''.join(header))
+            image = self.palette_image
+        else:
+            image = image.quantize(palette=self.palette_image, dither=self.Image.Dither.NONE)
+        self.file.write(b''.join(self.GifImagePlugin.getdata(image, duration=self.duration)))
+
+    def close(self):
+        self.file.write(b';')
+        self.file.close()
+
+
+class Mp4StreamWriter:
+    """
+    MP4 (mpeg-4 part 2) written frame by frame with cv2.VideoWriter.
+
+    Args:
+        path (str): output file.
+        fps (float): frames per second.
+        size (tuple): (height, width) of the frames.
+    """
+
+    def __init__(self, path, fps, size):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (size[1], size[0]))
+        if not self.writer.isOpened():
+            raise RuntimeError(f"cv2.VideoWriter could not open {path}")
+
+    def append(self, frame):
+        """
+        Adds one RGB (height, width, 3) uint8 frame.
+        """
+        self.writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+    def close(self):
+        self.writer.release()
+
+
+def render_eval_video(air_hockey_params, model_filepath, vec_normalize_filepath, out_path, n_episodes=5,
+                      width=160, fps=30, formats=MEDIA_FORMATS, seed=0):
+    """
+    Runs n_episodes of the saved policy and writes them as one video per format.
+
+    Args:
+        air_hockey_params (dict): AirHockeyEnv parameters, as passed to AirHockeyEnv.from_dict.
+        model_filepath (str): saved SAC (goal tasks) or PPO model.
+        vec_normalize_filepath (str): saved VecNormalize stats.
+        out_path (str): output path without extension, formats are appended.
+        n_episodes (int, optional): episodes in the video. Defaults to 5.
+        width (int, optional): frame width, the height keeps the table aspect ratio. Defaults to 160.
+        fps (float, optional): frames per second. Defaults to 30.
+        formats (tuple, optional): any of 'gif' and 'mp4'. Defaults to both.
+        seed (int, optional): env seed. Defaults to 0.
+
+    Returns:
+        (list) paths of the written files.
+    """
+    import torch
+    from stable_baselines3 import PPO, SAC
+    from stable_baselines3.common.vec_env import DummyVecEnv, VecNormalize
+    from airhockey import AirHockeyEnv
+    from render import HeadlessAirHockeyRenderer
+
+    # the jobs run side by side, one thread each
+    torch.set_num_threads(1)
+    env_params = dict(air_hockey_params)
+    env_params['seed'] = seed
+    env = AirHockeyEnv.from_dict(env_params)
+    # frames are drawn at the video size directly instead of resizing full size frames, the height is
+    # kept even for the mp4 encoder
+    full_shape = HeadlessAirHockeyRenderer(env).get_frame().shape
+    size = (2 * int(width * full_shape[0] / full_shape[1] / 2), width)
+    renderer = HeadlessAirHockeyRenderer(env, size=size)
+
+    if env.multiagent:
+        # self-play policy: both paddles act from one predict on the (2, 8) observations, the saved
+        # VecNormalize is only used for its observation statistics
+        with open(vec_normalize_filepath, 'rb') as f:
+            vec_normalize = pickle.load(f)
+        model = PPO.load(model_filepath)
+
+        def reset():
+            return vec_normalize.normalize_obs(env.reset()[0])
+
+        def step(obs):
+            action = model.predict(obs, deterministic=True)[0]
+            obs, _, terminated, truncated, _ = env.step(action)
+            return vec_normalize.normalize_obs(obs), terminated or truncated
+        close = env.close
+    else:
+        env_test = DummyVecEnv([lambda: env])
+        env_test = VecNormalize.load(vec_normalize_filepath, env_test)
+        if 'goal' in air_hockey_params['task']:
+            model = SAC.load(model_filepath, env=env_test)
+        else:
+            model = PPO.load(model_filepath)
+
+        def reset():
+            return env_test.reset()
+
+        def step(obs):
+            action = model.predict(obs, deterministic=True)[0]
+            obs, rew, done, info = env_test.step(action)
+            return obs, done
+        close = env_test.close
+
+    paths = [f'{out_path}.{media_format}' for media_format in formats]
+    writers = []
+    for path, media_format in zip(paths, formats):
+        if media_format == 'gif':
+            writers.append(GifStreamWriter(path, fps))
+        elif media_format == 'mp4':
+            writers.append(Mp4StreamWriter(path, fps, size))
+        else:
+            raise ValueError(f"Unknown media format {media_format}, expected one of {MEDIA_FORMATS}")
+    try:
+        for _ in range(n_episodes):
+            obs = reset()
+            done = False
+            while not done:
+                frame = cv2.cvtColor(renderer.get_frame(), cv2.COLOR_BGR2RGB)
+                for writer in writers:
+                    writer.append(frame)
+                obs, done = step(obs)
+    finally:
+        for writer in writers:
+            writer.close()
+        close()
+    return paths
+
+
+class EvalMediaJob:
+    """
+    Handle of the eval videos being rendered in the background.
+    """
+
+    def __init__(self, executor, futures):
+        self.executor = executor
+        self.futures = futures
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def wait(self):
+        """
+        Blocks until every video is written, re-raises worker errors.
+
+        Returns:
+            (list) paths of the written files.
+        """
+        try:
+            return [path for future in self.futures for path in future.result()]
+        finally:
+            self.executor.shutdown()
+
+
+def start_eval_media(air_hockey_params, model_filepath, vec_normalize_filepath, out_dir, n_videos=5,
+                     n_episodes=5, width=160, fps=30, formats=MEDIA_FORMATS, num_workers=None, seed=0):
+    """
+    Starts rendering n_videos eval videos (eval_<i>.<format> in out_dir) on a pool of worker processes.
+
+    See render_eval_video for the arguments. Video i uses seed + i and num_workers defaults to
+    min(n_videos, cpu count). Workers are spawned, not forked, so they do not inherit the trainer's
+    torch threads.
+
+    Returns:
+        (EvalMediaJob) call wait() on it to block until the files are written.
+    """
+    if num_workers is None:
+        num_workers = mp.cpu_count()
+    num_workers = max(1, min(num_workers, n_videos))
+    # the caller may change its params (e.g. for the next seed) before the jobs are sent to the workers
+    air_hockey_params = copy.deepcopy(air_hockey_params)
+    executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=mp.get_context('spawn'))
+    futures = [executor.submit(render_eval_video, air_hockey_params, model_filepath, vec_normalize_filepath,
+                               os.path.join(out_dir, f'eval_{i}'), n_episodes=n_episodes, width=width, fps=fps,
+                               formats=tuple(formats), seed=seed + i)
+               for i in range(n_videos)]
+    return EvalMediaJob(executor, futures)
@@ -2,6 +2,9 @@ from stable_baselines3 import PPO, SAC
 from stable_baselines3.common.vec_env import DummyVecEnv, VecNormalize
 from airhockey import AirHockeyEnv
 from render import AirHockeyRenderer
+from trajectory_collection import collect_trajectories, get_columns
+from trajectory_dataset import TrajectoryWriter
+from vec_env import make_air_hockey_vec_env
 from matplotlib import pyplot as plt
 import threading
 import time
@@ -13,7 +16,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from tensorboard.backend.event_processing import event_accumulator
 
-def evaluate_air_hockey_model(air_hockey_cfg, log_dir):
+def evaluate_air_hockey_model(air_hockey_cfg, log_dir, n_steps=1000000, chunk_size=65536, num_envs=1, num_workers=None):
     """
     Evaluate the performance of an air hockey model using Stable Baselines.
     Note: This evalutes the latest training directory in the tensorboard log directory. 
@@ -21,6 +24,8 @@ def evaluate_air_hockey_model(air_hockey_cfg, log_dir):
 
     This script loads a trained model and evaluates its performance in the air hockey environment.
     It uses a configuration file to specify the environment parameters and the file path of the trained model.
+    With num_envs > 1 the envs run in worker processes (each with its own seed) and every step is one
+    batched model.predict over all of them.
     """
     
     # randomly generate seeds, should be different from training..
@@ -29,10 +34,13 @@ def evaluate_air_hockey_model(air_hockey_cfg, log_dir):
     model_fp = os.path.join(log_dir, air_hockey_cfg['model_save_filepath'])
     air_hockey_cfg['air_hockey']['max_timesteps'] = 200
     
-    env_test = AirHockeyEnv.from_dict(air_hockey_params)
-    # renderer = AirHockeyRenderer(env_test)
-    
-    env_test = DummyVecEnv([lambda : env_test])
+    if num_envs > 1:
+        env_test = make_air_hockey_vec_env(air_hockey_params, num_envs, num_workers=num_workers,
+                                           seed=int(air_hockey_cfg['seed']))
+    else:
+        env_test = AirHockeyEnv.from_dict(air_hockey_params)
+        # renderer = AirHockeyRenderer(env_test)
+        env_test = DummyVecEnv([lambda : env_test])
     env_test = VecNormalize.load(os.path.join(log_dir, air_hockey_cfg['vec_normalize_save_filepath']), env_test)
     
     # if goal-conditioned use SAC
@@ -41,43 +49,29 @@ def evaluate_air_hockey_model(air_hockey_cfg, log_dir):
     else:
         model = PPO.load(model_fp)
 
-    obs = env_test.reset()
-    start = time.time()
-    done = False
     # let's save
-    # s,a,r,s', timestep
-    trajs = []
-    timestep = 0
-    
-    for i in tqdm.tqdm(range(1000000)):
-        # Draw the world
-        # renderer.render()
-        action = model.predict(obs, deterministic=True)[0]
-        next_obs, rew, done, info = env_test.step(action)
-        s = obs.flatten()
-        a = action.flatten()
-        r = np.array(rew)
-        s_prime = next_obs.flatten()
-        t = np.array([timestep])
-        
-        trajs.append(np.concatenate([s, a, r, s_prime, t]))
-        obs = next_obs
-        timestep += 1
-        if done:
-            obs = env_test.reset()
-            timestep = 0
+    # s,a,r,s', timestep, env id, episode id, streamed to shards under log_dir/trajs (read back with TrajectoryDataset)
+    writer = TrajectoryWriter(os.path.join(log_dir, 'trajs'), get_columns(env_test), chunk_size=chunk_size,
+                              metadata={'task': air_hockey_cfg['air_hockey']['task'], 'seed': int(air_hockey_cfg['seed']),
+                                        'num_envs': num_envs})
+    with tqdm.tqdm(total=n_steps) as progress:
+        collect_trajectories(lambda obs: model.predict(obs, deterministic=True)[0], env_test, writer, n_steps,
+                             progress=progress.update)
+    writer.close()
     env_test.close()
-    
-    trajs = np.array(trajs)
-    np.save(os.path.join(log_dir, 'trajs.npy'), trajs)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Demonstrate the air hockey game.')
     parser.add_argument('--log_dir', type=str, default=None, help='Path to the tensorboard log directory.')
+    parser.add_argument('--n_steps', type=int, default=1000000, help='Number of transitions to collect.')
+    parser.add_argument('--chunk_size', type=int, default=65536, help='Transitions per shard file.')
+    parser.add_argument('--num_envs', type=int, default=1, help='Number of envs collected from in parallel.')
+    parser.add_argument('--num_workers', type=int, default=None, help='Worker processes for the envs (default: cpu count).')
     args = parser.parse_args()
     log_dir = args.log_dir
     air_hockey_cfg_fp = os.path.join(log_dir, 'model_cfg.yaml')
     with open(air_hockey_cfg_fp, 'r') as f:
         air_hockey_cfg = yaml.safe_load(f)
 
-    evaluate_air_hockey_model(air_hockey_cfg, log_dir)
+    evaluate_air_hockey_model(air_hockey_cfg, log_dir, n_steps=args.n_steps, chunk_size=args.chunk_size,
+                              num_envs=args.num_envs, num_workers=args.num_workers)
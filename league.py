@@ -0,0 +1,436 @@
+"""
+League self-play: the learner (ego paddle) trains against a pool of its own past snapshots (alt paddle).
+
+OpponentPool keeps at most pool_size snapshots in memory, evicts the least recently used or the lowest
+rated one, and samples opponents by the learner's win rate against them (prioritized fictitious
+self-play: opponents the learner loses to come up more often). Snapshots are plain numpy copies of the
+actor and its observation normalization, played by NumpyPolicy, so the env workers need no torch and
+build every opponent once per process (see get_cached_policy) instead of loading it every episode.
+LeagueEvaluator plays the snapshots against each other on a pool of worker processes in the background
+and keeps the Elo ratings of the pool up to date. LeagueCallback runs all of it during model.learn.
+"""
+import copy
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from gymnasium import Env
+from stable_baselines3.common.callbacks import BaseCallback
+
+from airhockey import AirHockeyEnv
+from scripted_opponent import ScriptedOpponent
+
+ACTIVATIONS = {'Tanh': np.tanh, 'ReLU': lambda x: np.maximum(x, 0)}
+INITIAL_ELO = 1200.0
+
+# opponents built in this process, keyed by pool id. shared by all envs of a vec env worker (or by the
+# matches of an eval worker) and reused across episodes
+_POLICY_CACHE = {}
+
+
+def snapshot_policy(model, vec_normalize=None):
+    """
+    Copies the actor of a PPO MlpPolicy, and the observation statistics of vec_normalize, into numpy arrays.
+
+    Returns:
+        dict: 'weights' and 'biases' of every layer (weights as (in, out)), the 'activation' name, and
+        'obs_mean', 'obs_var', 'clip_obs', 'epsilon' (None when observations are not normalized).
+    """
+    state_dict = model.policy.state_dict()
+    layers = sorted({int(key.split('.')[2]) for key in state_dict if key.startswith('mlp_extractor.policy_net.')})
+    names = [f'mlp_extractor.policy_net.{i}' for i in layers] + ['action_net']
+    snapshot = {'weights': [state_dict[name + '.weight'].cpu().numpy().T.copy() for name in names],
+                'biases': [state_dict[name + '.bias'].cpu().numpy().copy() for name in names],
+                'activation': model.policy.activation_fn.__name__,
+                'obs_mean': None, 'obs_var': None, 'clip_obs': None, 'epsilon': None}
+    if vec_normalize is not None and vec_normalize.norm_obs:
+        snapshot.update(obs_mean=vec_normalize.obs_rms.mean.copy(), obs_var=vec_normalize.obs_rms.var.copy(),
+                        clip_obs=vec_normalize.clip_obs, epsilon=vec_normalize.epsilon)
+    return snapshot
+
+
+class NumpyPolicy:
+    """
+    Deterministic actions of a snapshot_policy snapshot, model.predict(obs, deterministic=True) up to
+    float rounding, for one observation or a batch of them.
+    """
+
+    def __init__(self, snapshot):
+        self.weights = snapshot['weights']
+        self.biases = snapshot['biases']
+        self.activation = ACTIVATIONS[snapshot['activation']]
+        self.obs_mean = snapshot['obs_mean']
+        self.obs_std = None if snapshot['obs_var'] is None else np.sqrt(snapshot['obs_var'] + snapshot['epsilon'])
+        self.clip_obs = snapshot['clip_obs']
+
+    def predict(self, obs):
+        if self.obs_mean is not None:
+            obs = np.clip((obs - self.obs_mean) / self.obs_std, -self.clip_obs, self.clip_obs)
+        # float32 like the torch policy
+        x = np.asarray(obs, dtype=np.float32)
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            x = self.activation(x @ weight + bias)
+        return np.clip(x @ self.weights[-1] + self.biases[-1], -1, 1)
+
+
+def get_cached_policy(opponent_id, snapshot=None):
+    """
+    The NumpyPolicy of opponent_id in this process, built from snapshot the first time.
+    """
+    policy = _POLICY_CACHE.get(opponent_id)
+    if policy is None:
+        policy = _POLICY_CACHE[opponent_id] = NumpyPolicy(snapshot)
+    return policy
+
+
+def keep_cached_policies(opponent_ids):
+    """
+    Drops the cached opponents that are not in opponent_ids (e.g. evicted from the pool).
+    """
+    for opponent_id in set(_POLICY_CACHE) - set(opponent_ids):
+        del _POLICY_CACHE[opponent_id]
+
+
+def get_score(winner, player):
+    """
+    Score of player (0 ego, 1 alt) for an episode won by winner (see AirHockeyEnv.multi_step): 1 for a win,
+    0.5 for a draw, 0 for a loss.
+    """
+    return 0.5 if winner == -1 else float(winner == player)
+
+
+class OpponentPool:
+    """
+    Policy snapshots of the learner with their Elo ratings and the learner's results against them.
+
+    Args:
+        max_size (int, optional): snapshots kept, the newest one is never evicted. Defaults to 16.
+        eviction (str, optional): 'lru' evicts the snapshot played least recently, 'priority' the lowest
+            rated one. Defaults to 'lru'.
+        pfsp_power (float, optional): snapshot i is sampled with weight (1 - learner win rate against i) ** pfsp_power,
+            0 samples uniformly. Defaults to 2.
+        elo_k (float, optional): Elo K-factor, per game. Defaults to 16.
+    """
+
+    def __init__(self, max_size=16, eviction='lru', pfsp_power=2.0, elo_k=16.0):
+        if eviction not in ('lru', 'priority'):
+            raise ValueError("Invalid eviction. Must be 'lru' or 'priority'.")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self.max_size = max_size
+        self.eviction = eviction
+        self.pfsp_power = pfsp_power
+        self.elo_k = elo_k
+        # id -> snapshot / learner timestep / rating / learner [wins, draws, losses] / last use
+        self.snapshots = {}
+        self.steps = {}
+        self.elo = {}
+        self.results = {}
+        self.last_used = {}
+        self.newest_id = None
+        self.next_id = 0
+        self.clock = 0
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def ids(self):
+        return list(self.snapshots)
+
+    def touch(self, opponent_id):
+        self.clock += 1
+        self.last_used[opponent_id] = self.clock
+
+    def add(self, snapshot, step=0):
+        """
+        Adds a snapshot, rated like the newest snapshot so far, and evicts down to max_size.
+
+        Returns:
+            (int, list) id of the snapshot and ids of the evicted snapshots.
+        """
+        opponent_id = self.next_id
+        self.next_id += 1
+        self.elo[opponent_id] = self.elo[self.newest_id] if self.newest_id is not None else INITIAL_ELO
+        self.snapshots[opponent_id] = snapshot
+        self.steps[opponent_id] = step
+        self.results[opponent_id] = np.zeros(3, dtype=int)
+        self.touch(opponent_id)
+        self.newest_id = opponent_id
+        evicted = []
+        while len(self.snapshots) > self.max_size:
+            evicted.append(self.evict())
+        return opponent_id, evicted
+
+    def evict(self):
+        candidates = [i for i in self.snapshots if i != self.newest_id]
+        victim = min(candidates, key=self.last_used.get if self.eviction == 'lru' else self.elo.get)
+        for table in (self.snapshots, self.steps, self.elo, self.results, self.last_used):
+            del table[victim]
+        return victim
+
+    def record_result(self, opponent_id, winner):
+        """
+        Counts a training episode of the learner (ego) against opponent_id (alt), winner as in
+        AirHockeyEnv.multi_step. Episodes against evicted snapshots are ignored.
+        """
+        if opponent_id not in self.snapshots:
+            return
+        self.results[opponent_id][{0: 0, -1: 1, 1: 2}[winner]] += 1
+        self.touch(opponent_id)
+
+    def get_win_rates(self):
+        """
+        Returns:
+            (list, numpy.ndarray) ids and the learner's win rate against each (draws count half), starting
+            from one draw so new snapshots are neither sure wins nor sure losses.
+        """
+        ids = self.ids()
+        results = np.array([self.results[i] for i in ids], dtype=float).reshape(-1, 3)
+        return ids, (results[:, 0] + 0.5 * results[:, 1] + 0.5) / (results.sum(axis=1) + 1)
+
+    def get_sampling_probs(self):
+        ids, win_rates = self.get_win_rates()
+        weights = (1 - win_rates) ** self.pfsp_power
+        return ids, weights / weights.sum()
+
+    def update_elo(self, a, b, score, n_games):
+        """
+        Elo update for n_games between a and b where a scored score (wins + draws / 2).
+        """
+        if a not in self.elo or b not in self.elo:
+            return
+        expected = 1 / (1 + 10 ** ((self.elo[b] - self.elo[a]) / 400))
+        delta = self.elo_k * (score - n_games * expected)
+        self.elo[a] += delta
+        self.elo[b] -= delta
+
+    def get_table(self):
+        """
+        One dict per snapshot with its id, learner step, Elo and the learner's wins / draws / losses against it.
+        """
+        return [{'id': i, 'step': int(self.steps[i]), 'elo': float(self.elo[i]),
+                 'wins': int(self.results[i][0]), 'draws': int(self.results[i][1]), 'losses': int(self.results[i][2])}
+                for i in self.ids()]
+
+
+class LeagueOpponentEnv(Env):
+    """
+    Single-agent view of a two-paddle AirHockeyEnv: the learner plays the ego paddle and an opponent from
+    the pool the alt paddle.
+
+    Every reset draws the opponent from opponent_sampling, (ids, probabilities) set by LeagueCallback,
+    among the opponents sent with add_opponent. Until then the alt paddle holds still, or is played by a
+    ScriptedOpponent. Episodes against a pool opponent end with info['league'] = (opponent id, winner),
+    winner as in AirHockeyEnv.multi_step.
+
+    Args:
+        air_hockey_params (dict): AirHockeyEnv parameters, num_paddles is set to 2.
+        scripted_opponent (str, optional): mode of the ScriptedOpponent that plays before the pool has
+            opponents (see scripted_opponent.MODES), e.g. through functools.partial in make_env. Defaults to
+            None, holding still.
+    """
+
+    def __init__(self, air_hockey_params, scripted_opponent=None):
+        params = copy.deepcopy(air_hockey_params)
+        params['simulator_params']['num_paddles'] = 2
+        self.env = AirHockeyEnv.from_dict(params)
+        self.observation_space = self.env.observation_space
+        self.action_space = self.env.action_space
+        self.max_timesteps = self.env.max_timesteps
+        self.rng = np.random.default_rng(params['seed'])
+        self.opponent_sampling = ([], None)
+        self.opponent_id = None
+        self.opponent = None
+        if scripted_opponent is not None:
+            self.opponent = ScriptedOpponent.from_dict(params, frame='alt', mode=scripted_opponent)
+        self.joint_action = np.zeros((2, 2))
+        self.alt_obs = None
+
+    def add_opponent(self, opponent_id, snapshot):
+        # envs of the same worker share the policy, the snapshot is only built once per process
+        get_cached_policy(opponent_id, snapshot)
+
+    def remove_opponent(self, opponent_id):
+        _POLICY_CACHE.pop(opponent_id, None)
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        ids, probs = self.opponent_sampling
+        if ids:
+            self.opponent_id = ids[self.rng.choice(len(ids), p=probs)]
+            self.opponent = _POLICY_CACHE[self.opponent_id]
+        obs, info = self.env.reset(seed=seed)
+        self.alt_obs = obs[1]
+        return obs[0], info
+
+    def step(self, action):
+        joint_action = self.joint_action
+        joint_action[0] = action
+        joint_action[1] = self.opponent.predict(self.alt_obs) if self.opponent is not None else 0
+        obs, reward, terminated, truncated, info = self.env.step(joint_action)
+        self.alt_obs = obs[1]
+        if (terminated or truncated) and self.opponent_id is not None:
+            info['league'] = (self.opponent_id, info['winner'])
+        return obs[0], float(reward[0]), terminated, truncated, info
+
+    def close(self):
+        self.env.close()
+
+
+_MATCH_ENV = None
+
+
+def _init_match_worker(air_hockey_params):
+    global _MATCH_ENV
+    params = copy.deepcopy(air_hockey_params)
+    params['simulator_params']['num_paddles'] = 2
+    _MATCH_ENV = AirHockeyEnv.from_dict(params)
+
+
+def play_match(env, policy_a, policy_b, n_episodes, seed=0):
+    """
+    Plays n_episodes of policy_a against policy_b on a two-paddle env, swapping paddles every episode.
+
+    Returns:
+        (float) a's score, wins plus half the draws.
+    """
+    score = 0.0
+    joint_action = np.zeros((2, 2))
+    for episode in range(n_episodes):
+        a_player = episode % 2
+        players = (policy_a, policy_b) if a_player == 0 else (policy_b, policy_a)
+        obs, _ = env.reset(seed=seed + episode)
+        done = False
+        while not done:
+            joint_action[0] = players[0].predict(obs[0])
+            joint_action[1] = players[1].predict(obs[1])
+            obs, _, terminated, truncated, info = env.step(joint_action)
+            done = terminated or truncated
+        score += get_score(info['winner'], a_player)
+    return score
+
+
+def _run_match(a, a_snapshot, b, b_snapshot, n_episodes, seed, pool_ids):
+    keep_cached_policies(pool_ids)
+    return play_match(_MATCH_ENV, get_cached_policy(a, a_snapshot), get_cached_policy(b, b_snapshot), n_episodes, seed)
+
+
+class LeagueEvaluator:
+    """
+    Keeps num_workers evaluation matches between pool snapshots running in background processes and
+    applies their results to the pool's Elo ratings.
+
+    Each match pits the newest snapshot against the one it has played least. The snapshots travel with the
+    match (tens of kB), the workers build each opponent once and keep it while it is in the pool.
+
+    Args:
+        pool (OpponentPool): rated snapshots.
+        air_hockey_params (dict): AirHockeyEnv parameters of the match envs.
+        num_workers (int, optional): processes. Defaults to the cpu count.
+        n_episodes (int, optional): episodes per match. Defaults to 4.
+        seed (int, optional): env seed of the first match, later matches count up. Defaults to 0.
+    """
+
+    def __init__(self, pool, air_hockey_params, num_workers=None, n_episodes=4, seed=0):
+        if num_workers is None:
+            num_workers = mp.cpu_count()
+        self.pool = pool
+        self.num_workers = max(1, num_workers)
+        self.n_episodes = n_episodes
+        self.seed = seed
+        # workers are spawned, not forked, so they do not inherit the trainer's torch threads
+        self.executor = ProcessPoolExecutor(max_workers=self.num_workers, mp_context=mp.get_context('spawn'),
+                                            initializer=_init_match_worker, initargs=(copy.deepcopy(air_hockey_params),))
+        self.pending = []
+        self.n_matches = {}
+        self.n_games = 0
+
+    def schedule(self):
+        pool = self.pool
+        while len(self.pending) < self.num_workers and len(pool) > 1:
+            a = pool.newest_id
+            b = min((i for i in pool.ids() if i != a), key=lambda i: self.n_matches.get((a, i), 0))
+            self.n_matches[(a, b)] = self.n_matches.get((a, b), 0) + 1
+            future = self.executor.submit(_run_match, a, pool.snapshots[a], b, pool.snapshots[b],
+                                          self.n_episodes, self.seed, pool.ids())
+            self.seed += self.n_episodes
+            self.pending.append((future, a, b))
+
+    def poll(self, wait=False):
+        """
+        Applies the finished matches (all of them with wait) to the Elo ratings and returns how many.
+        """
+        finished = [match for match in self.pending if wait or match[0].done()]
+        for match in finished:
+            future, a, b = match
+            self.pool.update_elo(a, b, future.result(), self.n_episodes)
+            self.n_games += self.n_episodes
+            self.pending.remove(match)
+        return len(finished)
+
+    def close(self):
+        self.poll(wait=True)
+        self.executor.shutdown()
+
+
+class LeagueCallback(BaseCallback):
+    """
+    Runs the league while model.learn trains on a vec env of LeagueOpponentEnv.
+
+    The learner is added to the pool at the start and every snapshot_interval steps, and sent to the env
+    workers. The episode results in the infos update the learner's win rates, and the opponent sampling
+    probabilities of the envs are refreshed every refresh_interval steps. With an evaluator, evaluation
+    matches run in the background the whole time.
+    """
+
+    def __init__(self, pool, snapshot_interval=20000, refresh_interval=2000, evaluator=None, verbose=0):
+        super().__init__(verbose)
+        self.pool = pool
+        self.snapshot_interval = snapshot_interval
+        self.refresh_interval = refresh_interval
+        self.evaluator = evaluator
+        self.last_snapshot = 0
+        self.last_refresh = 0
+
+    def _on_training_start(self):
+        self.add_snapshot()
+
+    def add_snapshot(self):
+        snapshot = snapshot_policy(self.model, self.model.get_vec_normalize_env())
+        opponent_id, evicted = self.pool.add(snapshot, self.num_timesteps)
+        self.training_env.env_method('add_opponent', opponent_id, snapshot)
+        # envs stop drawing the evicted snapshots before the workers drop them
+        self.refresh()
+        for evicted_id in evicted:
+            self.training_env.env_method('remove_opponent', evicted_id)
+        self.last_snapshot = self.num_timesteps
+
+    def refresh(self):
+        self.training_env.set_attr('opponent_sampling', self.pool.get_sampling_probs())
+        self.last_refresh = self.num_timesteps
+
+    def _on_step(self):
+        for info in self.locals['infos']:
+            if 'league' in info:
+                self.pool.record_result(*info['league'])
+        if self.num_timesteps - self.last_snapshot >= self.snapshot_interval:
+            self.add_snapshot()
+        elif self.num_timesteps - self.last_refresh >= self.refresh_interval:
+            self.refresh()
+        if self.evaluator is not None:
+            self.evaluator.poll()
+            self.evaluator.schedule()
+        return True
+
+    def _on_rollout_end(self):
+        ids, win_rates = self.pool.get_win_rates()
+        self.logger.record('league/pool_size', len(self.pool))
+        self.logger.record('league/mean_win_rate', float(np.mean(win_rates)))
+        self.logger.record('league/newest_elo', self.pool.elo[self.pool.newest_id])
+        if self.evaluator is not None:
+            self.logger.record('league/eval_games', self.evaluator.n_games)
+
+    def _on_training_end(self):
+        if self.evaluator is not None:
+            self.evaluator.close()
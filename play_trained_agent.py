@@ -5,27 +5,32 @@ import os
 from demonstrate import Demonstrator
 
 
-def play_air_hockey_model(air_hockey_cfg):
+def play_air_hockey_model(air_hockey_cfg, self_play=False):
     """
     Evaluate the performance of an air hockey model using Stable Baselines.
 
     This script loads a trained model and evaluates its performance in the air hockey environment.
     It uses a configuration file to specify the environment parameters and the file path of the trained model.
+    With self_play the model plays both paddles, otherwise you play the ego paddle against it.
     """
     
     air_hockey_params = air_hockey_cfg['air_hockey']
-    air_hockey_params['num_paddles'] = 2
-    air_hockey_params['gravity'] = 0
+    air_hockey_params['simulator_params']['num_paddles'] = 2
+    air_hockey_params['simulator_params']['gravity'] = 0
     model_fp = air_hockey_cfg['model_save_filepath']
     
     model = PPO.load(model_fp)
 
     demonstrator = Demonstrator(air_hockey_cfg)
-    demonstrator.play_against_agent(model)
+    if self_play:
+        demonstrator.watch_self_play(model)
+    else:
+        demonstrator.play_against_agent(model)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Demonstrate the air hockey game.')
     parser.add_argument('--cfg', type=str, default=None, help='Path to the configuration file.')
+    parser.add_argument('--self_play', action='store_true', help='Let the model play both paddles.')
     args = parser.parse_args()
     if args.cfg is None:
         dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -35,4 +40,4 @@ if __name__ == '__main__':
     with open(air_hockey_cfg_fp, 'r') as f:
         air_hockey_cfg = yaml.safe_load(f)
     
-    play_air_hockey_model(air_hockey_cfg)
+    play_air_hockey_model(air_hockey_cfg, self_play=args.self_play)
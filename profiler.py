@@ -0,0 +1,54 @@
+"""
+Cumulative per-phase timers for AirHockeyEnv (profile=True), see AirHockeyEnv.get_profile.
+
+Phases are timed by replacing bound methods with timing wrappers on the instances, so an env that is
+not profiled runs exactly the same code as before and pays nothing.
+"""
+import time
+
+
+class StepProfiler:
+    """
+    Total seconds and call counts of named phases.
+    """
+
+    def __init__(self):
+        # name -> [total seconds, calls], the wrappers keep a reference to their own list
+        self.timers = {}
+
+    def wrap(self, name, fn):
+        """
+        Returns fn with its calls timed under name.
+        """
+        timer = self.timers.setdefault(name, [0.0, 0])
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timer[0] += perf_counter() - start
+                timer[1] += 1
+        timed.__wrapped__ = fn
+        return timed
+
+    def instrument(self, obj, attr, name):
+        """
+        Times every call of obj.attr (a method or callable attribute) from now on.
+        """
+        setattr(obj, attr, self.wrap(name, getattr(obj, attr)))
+
+    def get_profile(self):
+        """
+        Returns:
+            dict: phase -> {'calls', 'total_s', 'mean_us'}. Phases nest (e.g. 'step' includes
+            'get_transition'), so the totals do not add up.
+        """
+        return {name: {'calls': calls, 'total_s': total, 'mean_us': total / calls * 1e6 if calls else 0.0}
+                for name, (total, calls) in self.timers.items()}
+
+    def reset(self):
+        for timer in self.timers.values():
+            timer[0] = 0.0
+            timer[1] = 0
@@ -0,0 +1,296 @@
+"""
+Closed-form puck paths, for many pucks at once.
+
+Between wall hits a puck follows the same discrete update as a box2d world step: gravity is integrated
+into the velocity, linear damping scales it by d = 1 - h * damping (box2d 2.3.0, which pybox2d wraps, not
+the 1 / (1 + h * damping) of later versions), and the position moves by h * velocity. After k world steps
+that is
+
+    v_k = d^k v_0 + a h S_k,    x_k = x_0 + h v_0 S_k + a h^2 SS_k,    S_k = d + ... + d^k, SS_k = S_1 + ... + S_k
+
+so a whole horizon is a few array operations on precomputed coefficients. Wall hits restart the closed form
+from the bounced state: the puck is mirrored back onto the table like box2d's continuous collision does,
+hits slower than box2d's restitution threshold stop the normal velocity, and wall friction trades
+tangential velocity for spin (which the next hits trade back). Paddles are ignored: the path is where the
+puck goes if nobody hits it.
+
+Everything is in env coordinates (x along the length, y across it), in the frame of the player whose
+observations are passed in, see PuckPredictor.from_dict.
+"""
+import numpy as np
+
+from physics_presets import get_physics_params
+
+# box2d defaults: b2_velocityThreshold, and the friction of the puck and wall fixtures
+RESTITUTION_THRESHOLD = 1.0
+WALL_FRICTION = 0.2
+
+
+class PuckPredictor:
+    """
+    Args:
+        length (float): table length.
+        width (float): table width.
+        puck_radius (float): puck radius.
+        puck_damping (float): puck linear damping.
+        acceleration (float): puck acceleration along x in this frame (gravity, -world gravity in the ego frame).
+        time_step (float): seconds per predicted step (one env step).
+        substeps (int, optional): world steps per predicted step. Defaults to 1.
+        max_steps (int, optional): longest horizon, in predicted steps. Defaults to 100.
+        max_bounces (int, optional): wall hits followed per path, the rest of the path is clamped to the
+            table after that. Defaults to 8.
+    """
+
+    def __init__(self, length, width, puck_radius, puck_damping, acceleration, time_step, substeps=1,
+                 max_steps=100, max_bounces=8):
+        self.bounds = np.array([length / 2 - puck_radius, width / 2 - puck_radius])
+        self.puck_radius = puck_radius
+        self.acceleration = acceleration
+        self.time_step = time_step
+        self.substeps = substeps
+        self.max_steps = max_steps
+        self.max_bounces = max_bounces
+        self.h = time_step / substeps
+        # coefficients of the closed form for k = 0 .. max world steps
+        d = min(max(1.0 - self.h * puck_damping, 0.0), 1.0)
+        powers = d ** np.arange(max_steps * substeps + 1)
+        self.decay = powers
+        self.decay_sum = np.concatenate(([0.0], np.cumsum(powers[1:])))
+        self.decay_sum_sum = np.cumsum(self.decay_sum)
+
+    @staticmethod
+    def from_dict(simulator_params, frame='ego', **kwargs):
+        """
+        A predictor for a simulator config, in the ego or the alt player's frame. A gravity range is
+        replaced by its middle.
+        """
+        gravity = simulator_params.get('gravity', -5)
+        if type(gravity) == list:
+            gravity = sum(gravity) / 2
+        physics_params = get_physics_params(simulator_params.get('physics_preset', 'default'),
+                                            physics_substeps=simulator_params.get('physics_substeps'),
+                                            velocity_iterations=simulator_params.get('velocity_iterations'),
+                                            position_iterations=simulator_params.get('position_iterations'),
+                                            action_repeat=simulator_params.get('action_repeat'))
+        # box2d y is env -x, and the alt frame is the table turned around
+        acceleration = -gravity if frame == 'ego' else gravity
+        substeps = physics_params['physics_substeps'] * physics_params['action_repeat']
+        return PuckPredictor(length=simulator_params['length'],
+                             width=simulator_params['width'],
+                             puck_radius=simulator_params['puck_radius'],
+                             puck_damping=simulator_params['puck_damping'],
+                             acceleration=acceleration,
+                             time_step=physics_params['action_repeat'] / simulator_params.get('time_frequency', 20),
+                             substeps=substeps,
+                             **kwargs)
+
+    def cast(self, pos, vel, n_steps, spin=None):
+        """
+        Args:
+            pos (numpy.ndarray): (N, 2) or (2,) puck positions.
+            vel (numpy.ndarray): (N, 2) or (2,) puck velocities.
+            n_steps (int): predicted steps, at most max_steps.
+            spin (numpy.ndarray, optional): (N,) puck angular velocities (observations do not have them).
+                Defaults to 0.
+
+        Returns:
+            (positions, velocities), (n_steps, N, 2) arrays (n_steps, 2 for a single puck), after every step.
+        """
+        if n_steps > self.max_steps:
+            raise ValueError(f"n_steps must be at most max_steps ({self.max_steps}), got {n_steps}.")
+        single = np.ndim(pos) == 1
+        pos = np.array(pos, dtype=float, ndmin=2)
+        vel = np.array(vel, dtype=float, ndmin=2)
+        n = len(pos)
+        spin = np.zeros(n) if spin is None else np.array(spin, dtype=float, ndmin=1)
+        if n == 1:
+            # a few float operations per step beat the array calls of the closed form for one puck
+            positions, velocities = self.step_single(pos[0], vel[0], spin[0], n_steps)
+            if single:
+                return positions, velocities
+            return positions[:, None], velocities[:, None]
+        n_world_steps = n_steps * self.substeps
+        k = np.arange(1, n_world_steps + 1)[:, None]
+
+        # every path is a chain of closed-form segments split at wall hits: the world step each segment
+        # starts at (past the horizon for pucks that hit fewer walls), and its state at that step
+        starts, origins, origin_vels = [np.zeros(n, dtype=int)], [pos], [vel]
+        start = np.zeros(n, dtype=int)
+        pucks = np.arange(n)
+        p, v = pos, vel
+        for _ in range(self.max_bounces):
+            step = self.first_hit(p, v, k - start[pucks])
+            hit = step <= n_world_steps - start[pucks]
+            if not hit.any():
+                break
+            pucks, step, p, v = pucks[hit], step[hit], p[hit], v[hit]
+            p, v = self.evaluate(p, v, step)
+            spin[pucks] = self.bounce(p, v, spin[pucks])
+            start[pucks] += step
+            starts.append(np.full(n, n_world_steps + 1))
+            starts[-1][pucks] = start[pucks]
+            origins.append(np.zeros((n, 2)))
+            origins[-1][pucks] = p
+            origin_vels.append(np.zeros((n, 2)))
+            origin_vels[-1][pucks] = v
+
+        # the segment of every puck at every predicted step
+        k = np.arange(self.substeps, n_world_steps + 1, self.substeps)[:, None]
+        starts = np.array(starts)
+        segment = (starts[:, None, :] <= k).sum(axis=0) - 1
+        columns = np.arange(n)
+        positions, velocities = self.evaluate(np.array(origins)[segment, columns], np.array(origin_vels)[segment, columns],
+                                              k - starts[segment, columns])
+        # resting pucks, and pucks still going after max_bounces hits, stay on the table
+        outside = np.abs(positions) > self.bounds
+        positions[outside] = np.copysign(np.broadcast_to(self.bounds, positions.shape)[outside], positions[outside])
+        velocities[outside] = 0
+        if single:
+            return positions[:, 0], velocities[:, 0]
+        return positions, velocities
+
+    def step_single(self, pos, vel, spin, n_steps):
+        """
+        cast of one puck, world step by world step with python floats. Same updates, walls and outputs as
+        the closed form, up to float rounding.
+        """
+        h, a, r = self.h, self.acceleration, self.puck_radius
+        d = self.decay[1]
+        bx, by = self.bounds
+        x, y, vx, vy = (float(value) for value in (pos[0], pos[1], vel[0], vel[1]))
+        spin = float(spin)
+        bounces = 0
+        # see first_hit for resting pucks, checked again after every hit like at the start of a segment
+        resting = vx == 0 and x * a >= bx * abs(a)
+        positions = np.empty((n_steps, 2))
+        velocities = np.empty((n_steps, 2))
+        for step in range(n_steps):
+            for _ in range(self.substeps):
+                vx = (vx + a * h) * d
+                vy = vy * d
+                x += h * vx
+                y += h * vy
+                if bounces == self.max_bounces:
+                    continue
+                if (abs(x) > bx and not resting) or abs(y) > by:
+                    bounces += 1
+                    # same order as bounce, the x wall first
+                    if abs(x) > bx:
+                        side = 1.0 if x > 0 else -1.0
+                        normal_vel = max(side * vx, 0.0)
+                        elastic = normal_vel >= RESTITUTION_THRESHOLD
+                        impulse = 2 * normal_vel if elastic else normal_vel
+                        x = 2 * side * bx - x if elastic else side * bx
+                        vx -= side * impulse
+                        arm = side * r
+                        friction = min(max(-(vy + spin * arm) / 3, -WALL_FRICTION * impulse), WALL_FRICTION * impulse)
+                        vy += friction
+                        spin += 2 * arm * friction / (r * r)
+                    if abs(y) > by:
+                        side = 1.0 if y > 0 else -1.0
+                        normal_vel = max(side * vy, 0.0)
+                        elastic = normal_vel >= RESTITUTION_THRESHOLD
+                        impulse = 2 * normal_vel if elastic else normal_vel
+                        y = 2 * side * by - y if elastic else side * by
+                        vy -= side * impulse
+                        arm = -side * r
+                        friction = min(max(-(vx + spin * arm) / 3, -WALL_FRICTION * impulse), WALL_FRICTION * impulse)
+                        vx += friction
+                        spin += 2 * arm * friction / (r * r)
+                    resting = vx == 0 and x * a >= bx * abs(a)
+            positions[step] = x, y
+            velocities[step] = vx, vy
+        # resting pucks stay on the table
+        outside = np.abs(positions) > self.bounds
+        positions[outside] = np.copysign(np.broadcast_to(self.bounds, positions.shape)[outside], positions[outside])
+        velocities[outside] = 0
+        return positions, velocities
+
+    def evaluate(self, pos, vel, steps):
+        """
+        Closed-form positions and velocities of (..., 2) pucks after steps (...) world steps, walls ignored.
+        """
+        h = self.h
+        decay_sum = self.decay_sum[steps]
+        pos = pos + h * vel * decay_sum[..., None]
+        pos[..., 0] += self.acceleration * h * h * self.decay_sum_sum[steps]
+        vel = vel * self.decay[steps][..., None]
+        vel[..., 0] += self.acceleration * h * decay_sum
+        return pos, vel
+
+    def first_hit(self, pos, vel, steps):
+        """
+        The first world step (from 1) at which (N, 2) pucks are past a wall, or a step past steps (K, N)
+        (the world steps left of every puck, one per row) when they are not.
+        """
+        h = self.h
+        # across the table the path is monotonic, its crossing step is looked up in the decay sums
+        crossing = np.divide(np.copysign(self.bounds[1], vel[:, 1]) - pos[:, 1], h * vel[:, 1],
+                             out=np.full(len(pos), np.inf), where=vel[:, 1] != 0)
+        y_step = np.maximum(np.searchsorted(self.decay_sum, crossing, side='right'), 1)
+        # along the table gravity can turn the puck around, check every step. pucks that gravity holds
+        # against an end wall (after a hit below the restitution threshold) stay there
+        resting = (vel[:, 0] == 0) & (pos[:, 0] * self.acceleration >= self.bounds[0] * abs(self.acceleration))
+        steps = np.maximum(steps, 0)
+        x = pos[:, 0] + h * vel[:, 0] * self.decay_sum[steps] + self.acceleration * h * h * self.decay_sum_sum[steps]
+        out = (steps > 0) & (np.abs(x) > self.bounds[0]) & ~resting
+        first = np.argmax(out, axis=0)
+        x_step = np.where(out.any(axis=0), steps[first, np.arange(len(pos))], len(steps) + 1)
+        return np.minimum(x_step, y_step)
+
+    def bounce(self, pos, vel, spin):
+        """
+        Puts (N, 2) pucks that went through a wall back onto the table, in place, like a box2d wall contact:
+        restitution 1 above RESTITUTION_THRESHOLD (0 below), and friction on a solid disc.
+
+        Returns:
+            numpy.ndarray: (N,) spins after the hit.
+        """
+        r = self.puck_radius
+        spin = spin.copy()
+        for axis in (0, 1):
+            over = np.flatnonzero(np.abs(pos[:, axis]) > self.bounds[axis])
+            if len(over) == 0:
+                continue
+            bound = np.copysign(self.bounds[axis], pos[over, axis])
+            side = np.sign(bound)
+            # speed into the wall, pucks already moving away are only put back on the table
+            normal_vel = np.maximum(side * vel[over, axis], 0)
+            elastic = normal_vel >= RESTITUTION_THRESHOLD
+            impulse = np.where(elastic, 2 * normal_vel, normal_vel)
+            pos[over, axis] = np.where(elastic, 2 * bound - pos[over, axis], bound)
+            vel[over, axis] -= side * impulse
+            # the contact point slides at the tangential velocity plus the spin, friction stops it (the
+            # tangential mass of a disc is m / 3) up to WALL_FRICTION times the normal impulse
+            other = 1 - axis
+            arm = side * r if axis == 0 else -side * r
+            friction = np.clip(-(vel[over, other] + spin[over] * arm) / 3, -WALL_FRICTION * impulse, WALL_FRICTION * impulse)
+            vel[over, other] += friction
+            spin[over] += 2 * arm * friction / (r * r)
+        return spin
+
+    def intercept(self, pos, vel, line_x, n_steps, direction=1):
+        """
+        Where and when pucks first cross the line x = line_x moving in direction (1: towards +x, the own
+        home of the frame's player, -1: away from it), within n_steps.
+
+        Returns:
+            (points, times, hit): (N, 2) crossing points (interpolated between steps), (N,) seconds from now
+            and an (N,) bool array of pucks that cross. Points and times of the others are nan and inf.
+        """
+        single = np.ndim(pos) == 1
+        positions, _ = self.cast(np.atleast_2d(pos), np.atleast_2d(vel), n_steps)
+        start = np.atleast_2d(np.asarray(pos, dtype=float))[None]
+        path = np.concatenate([start, positions])
+        offset = direction * (path[:, :, 0] - line_x)
+        crossed = (offset[:-1] < 0) & (offset[1:] >= 0)
+        hit = crossed.any(axis=0)
+        step = np.argmax(crossed, axis=0)
+        pucks = np.arange(path.shape[1])
+        before, after = path[step, pucks], path[step + 1, pucks]
+        frac = offset[step, pucks] / (offset[step, pucks] - offset[step + 1, pucks])
+        points = np.where(hit[:, None], before + frac[:, None] * (after - before), np.nan)
+        times = np.where(hit, (step + frac) * self.time_step, np.inf)
+        if single:
+            return points[0], times[0], hit[0]
+        return points, times, hit
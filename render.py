@@ -1,6 +1,7 @@
 import numpy as np
 import cv2
 import os
+from state_layout import EGO_PADDLE, POS_X, POS_Y, alt_paddle_offset, puck_offset
 
 TARGET_FPS = 60
 
@@ -32,6 +33,8 @@ class AirHockeyRenderer:
         self.length = self.airhockey_sim.length
         self.screen_width, self.screen_height = 120, 120
         self.ppm = self.airhockey_sim.ppm 
+        # box2d bodies are in meters times world_scale, see AirHockeyBox2D
+        self.world_scale = getattr(self.airhockey_sim, 'world_scale', 1)
         
         # get directory where this file is
         dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -50,8 +53,13 @@ class AirHockeyRenderer:
         # rotate clockwise 90 deg
         self.air_hockey_table_img = cv2.rotate(self.air_hockey_table_img, cv2.ROTATE_90_CLOCKWISE)
         self.air_hockey_table_img = cv2.resize(self.air_hockey_table_img, (self.render_length, self.render_width))
-        
-    
+
+        # envs made with profile=True time the frames of their renderers
+        profiler = getattr(airhockey_env, 'profiler', None)
+        if profiler is not None:
+            profiler.instrument(self, 'get_frame', 'render')
+
+
     def draw_circle(self, body_attrs):
         """
         Draws a circle on the frame.
@@ -62,9 +70,9 @@ class AirHockeyRenderer:
         body, color = body_attrs
         for fixture in body.fixtures:
             shape = fixture.shape
-            center = np.array(body.position) + np.array((self.width / 2, self.length / 2))
+            center = np.array(body.position) / self.world_scale + np.array((self.width / 2, self.length / 2))
             center = np.array((center[1], center[0])) * self.ppm  # Default horizontal orientation
-            radius = int(shape.radius * self.ppm)
+            radius = int(shape.radius / self.world_scale * self.ppm)
             cv2.circle(self.frame, center.astype(int), radius, color, -1)
             
     def draw_circle_with_image(self, body_attrs, circle_type='puck'):
@@ -79,9 +87,9 @@ class AirHockeyRenderer:
         for fixture in body.fixtures:
             shape = fixture.shape
             # center = np.array(body.position) + np.array((self.width / 2, self.length / 2))
-            center = np.array(body.position) + np.array((self.width / 2, self.length / 2))
+            center = np.array(body.position) / self.world_scale + np.array((self.width / 2, self.length / 2))
             center = np.array((center[1], center[0])) * self.ppm  # Default horizontal orientation
-            radius = int(shape.radius * self.ppm)
+            radius = int(shape.radius / self.world_scale * self.ppm)
             
             # Calculate top-left corner of the image for overlay
             top_left = (center - radius).astype(int)
@@ -91,14 +99,14 @@ class AirHockeyRenderer:
             if circle_type == 'puck':
                 if self.current_puck_shape != shape:
                     self.current_puck_shape = shape
-                    radius = int(shape.radius * self.ppm)
+                    radius = int(shape.radius / self.world_scale * self.ppm)
                     diameter = int(radius * 2)
                     self.puck_img = cv2.resize(self.puck_img, (diameter, diameter))
                 resized_img = self.puck_img
             elif circle_type == 'paddle':
                 if self.current_paddle_shape != shape:
                     self.current_paddle_shape = shape
-                    radius = int(shape.radius * self.ppm)
+                    radius = int(shape.radius / self.world_scale * self.ppm)
                     diameter = int(radius * 2)
                     self.paddle_img = cv2.resize(self.paddle_img, (diameter, diameter))
                 resized_img = self.paddle_img
@@ -148,7 +156,7 @@ class AirHockeyRenderer:
             shape = fixture.shape
             rotation = np.stack([body.transform.R.x_axis, body.transform.R.y_axis], axis = 1)
             vertices = [np.matmul(rotation, v) for v in shape.vertices]
-            vertices = [body.position + v for v in vertices]
+            vertices = [(body.position + v) / self.world_scale for v in vertices]
             vertices = [np.array(v) + np.array((self.width / 2, self.length / 2)) for v in vertices]
             vertices = [np.array((v[1], v[0])) * self.ppm for v in vertices]  # Default horizontal orientation
             vertices = np.array(vertices).astype(int)
@@ -202,3 +210,174 @@ class AirHockeyRenderer:
         cv2.imshow('Air Hockey 2D', frame)
         cv2.waitKey(20)
 
+
+class HeadlessAirHockeyRenderer(AirHockeyRenderer):
+    """
+    Fast offscreen renderer for eval GIFs and pixel datasets, draws the same frames as AirHockeyRenderer.
+
+    The table, goals, blocks and obstacles only change on reset, so they are drawn once into a background
+    that is already in the final orientation. Every frame copies the background into a reused buffer and
+    blits the pucks and paddles with sprites and masks that were resized and rotated up front. Puck and
+    paddle positions are read from the env state, so the numpy_batch simulator can be rendered too.
+    Unlike AirHockeyRenderer, pucks are drawn on top of blocks and obstacles.
+
+    Args:
+        airhockey_env (AirHockeyEnv): The air hockey environment.
+        orientation (str, optional): The orientation of the game table. Defaults to 'vertical'.
+        size (tuple, optional): (height, width) of the frames, the table is scaled per axis to fill it.
+            Defaults to the simulator's render size.
+        grayscale (bool, optional): draw single channel (height, width) frames. Defaults to False.
+    """
+
+    def __init__(self, airhockey_env, orientation='vertical', size=None, grayscale=False):
+        super().__init__(airhockey_env, orientation)
+        self.vertical = orientation == 'vertical'
+        self.grayscale = grayscale
+        # sprites are shrunk a lot for small frames, area averaging keeps their edges and the
+        # half-transparent border pixels are left out so they stay round
+        self.interpolation = cv2.INTER_LINEAR if size is None else cv2.INTER_AREA
+        self.alpha_threshold = 0 if size is None else 127
+        # everything is drawn in the horizontal layout (rows across the table width, columns along its
+        # length) like AirHockeyRenderer, and mapped to the final orientation once
+        if size is None:
+            self.layout_shape = (self.render_width, self.render_length)
+            # pixels per meter along the layout (columns, rows)
+            self.scale = np.array((self.ppm, self.ppm))
+            table_img = self.air_hockey_table_img
+        else:
+            height, width = size
+            self.layout_shape = (width, height) if self.vertical else (height, width)
+            self.scale = np.array((self.layout_shape[1] / self.length, self.layout_shape[0] / self.width))
+            dir_path = os.path.dirname(os.path.realpath(__file__))
+            table_img = cv2.imread(os.path.join(dir_path, 'assets', 'air_hockey_table.png'))
+            table_img = cv2.rotate(table_img, cv2.ROTATE_90_CLOCKWISE)
+            table_img = cv2.resize(table_img, (self.layout_shape[1], self.layout_shape[0]), interpolation=cv2.INTER_AREA)
+        self.table_img = table_img
+        self.offset = np.array((self.width / 2, self.length / 2))
+
+        self.puck_sprite = self.make_sprite(self.puck_img, self.airhockey_sim.puck_radius)
+        self.paddle_sprite = self.make_sprite(self.paddle_img, self.airhockey_sim.paddle_radius)
+        # state offsets of the bodies to blit, pucks first so paddles are drawn over them
+        puck_offsets = [puck_offset(i) for i in range(self.airhockey_sim.num_pucks)]
+        paddle_offsets = [EGO_PADDLE]
+        if self.airhockey_sim.multiagent:
+            paddle_offsets.append(alt_paddle_offset(self.airhockey_sim.num_pucks))
+        self.circles = [(puck_offsets, self.puck_sprite), (paddle_offsets, self.paddle_sprite)]
+
+        self.static_key = None
+        self.background = None
+        self.frame = None
+        # frame rectangles covered by the sprites of the last frame
+        self.drawn_rects = []
+
+    def make_sprite(self, img, radius):
+        """
+        Resizes (and rotates) a BGRA sprite for a circle of the given radius.
+
+        Returns:
+            tuple: radius in layout pixels (columns, rows), image (BGR or gray) and alpha mask in the final orientation.
+        """
+        radius_px = (self.scale * radius).astype(int)
+        sprite = cv2.resize(img, (int(2 * radius_px[0]), int(2 * radius_px[1])), interpolation=self.interpolation)
+        if self.vertical:
+            sprite = np.ascontiguousarray(np.rot90(sprite))
+        mask = sprite[..., 3] > self.alpha_threshold
+        if self.grayscale:
+            return radius_px, cv2.cvtColor(np.ascontiguousarray(sprite[..., :3]), cv2.COLOR_BGR2GRAY), mask
+        # a mask per channel, np.copyto with a broadcast mask is several times slower
+        return radius_px, sprite[..., :3].copy(), np.repeat(mask[..., None], 3, axis=2)
+
+    def to_layout(self, position):
+        # box2d position -> (column, row) in the horizontal layout
+        center = np.array(position) + self.offset
+        return np.array((center[1], center[0])) * self.scale
+
+    def get_static_key(self):
+        """
+        Everything drawn into the background: goals, and the poses and shapes of blocks and obstacles.
+        """
+        env = self.airhockey_env
+        key = []
+        if env.goal_conditioned:
+            key += [tuple(env.ego_goal_pos), env.ego_goal_radius]
+            if env.multiagent:
+                key += [tuple(env.alt_goal_pos), env.alt_goal_radius]
+        for body, _ in list(getattr(self.airhockey_sim, 'blocks', {}).values()) + \
+                list(getattr(self.airhockey_sim, 'obstacles', {}).values()):
+            key += [tuple(body.position), body.angle, tuple(body.fixtures[0].shape.vertices)]
+        return tuple(key)
+
+    def draw_background(self):
+        background = self.table_img.copy()
+        env = self.airhockey_env
+        if env.goal_conditioned:
+            goals = [(env.ego_goal_pos, env.ego_goal_radius, (0, 255, 0))]
+            if env.multiagent:
+                goals.append((env.alt_goal_pos, env.alt_goal_radius, (255, 0, 0)))
+            for goal, radius, color in goals:
+                center = self.to_layout((goal[1], -goal[0])).astype(int) # coords -> box2d
+                axes = (self.scale * radius).astype(int)
+                if axes[0] == axes[1]:
+                    cv2.circle(background, center, int(axes[0]), color, 2)
+                else:
+                    cv2.ellipse(background, center, axes, 0, 0, 360, color, 2)
+        for body, color in list(getattr(self.airhockey_sim, 'blocks', {}).values()) + \
+                list(getattr(self.airhockey_sim, 'obstacles', {}).values()):
+            for fixture in body.fixtures:
+                rotation = np.stack([body.transform.R.x_axis, body.transform.R.y_axis], axis=1)
+                vertices = [self.to_layout((body.position + np.matmul(rotation, v)) / self.world_scale)
+                            for v in fixture.shape.vertices]
+                cv2.fillPoly(background, pts=[np.array(vertices).astype(int)], color=color)
+        if self.vertical:
+            background = cv2.rotate(background, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        if self.grayscale:
+            background = cv2.cvtColor(background, cv2.COLOR_BGR2GRAY)
+        return background
+
+    def blit(self, sprite, column, row):
+        """
+        Draws a sprite centered at a (column, row) layout position, and remembers the rectangle it covered.
+        """
+        radius_px, image, mask = sprite
+        height, width = mask.shape[:2]
+        frame_height, frame_width = self.frame.shape[:2]
+        left = int(column - radius_px[0])
+        top = int(row - radius_px[1])
+        if self.vertical:
+            # layout (row, column) -> (layout width - 1 - column, row) after the counterclockwise rotation
+            top, left = self.layout_shape[1] - left - height, top
+        frame_top, frame_left = max(top, 0), max(left, 0)
+        frame_bottom, frame_right = min(top + height, frame_height), min(left + width, frame_width)
+        if frame_top >= frame_bottom or frame_left >= frame_right:
+            return
+        rect = (slice(frame_top, frame_bottom), slice(frame_left, frame_right))
+        region = (slice(frame_top - top, frame_bottom - top), slice(frame_left - left, frame_right - left))
+        np.copyto(self.frame[rect], image[region], where=mask[region])
+        self.drawn_rects.append(rect)
+
+    def get_frame(self):
+        """
+        Gets the current frame of the air hockey game.
+
+        Returns:
+            numpy.ndarray: The frame. It is a buffer that the next call overwrites, and only the parts that
+                changed are redrawn, so copy it before keeping or modifying it.
+        """
+        key = self.get_static_key()
+        if key != self.static_key:
+            self.background = self.draw_background()
+            self.static_key = key
+            self.frame = self.background.copy()
+        else:
+            # only the pucks and paddles of the last frame need to be erased
+            for rect in self.drawn_rects:
+                self.frame[rect] = self.background[rect]
+        self.drawn_rects = []
+        state = self.airhockey_env.current_state
+        offset_x, offset_y = self.offset
+        scale_x, scale_y = self.scale
+        for offsets, sprite in self.circles:
+            for offset in offsets:
+                # env (x, y) -> box2d (y, -x) -> layout (column, row)
+                self.blit(sprite, (-state[offset + POS_X] + offset_y) * scale_x, (state[offset + POS_Y] + offset_x) * scale_y)
+        return self.frame
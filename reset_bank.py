@@ -0,0 +1,54 @@
+"""
+Initial configurations sampled in bulk and handed out one reset at a time.
+
+A simulator (or env) describes its reset distribution with a sample_fn(n) that draws n configurations
+at once from its own np.random.Generator, with a few vectorized calls. The bank keeps the last batch
+and hands out its rows in order, so a reset costs an index instead of a dozen scalar RNG calls.
+With the same generator seed and bank size, the sequence of configurations is the same on every run.
+"""
+
+# configurations sampled at once when the config does not set reset_bank_size
+DEFAULT_RESET_BANK_SIZE = 256
+
+
+class ResetBank:
+    """
+    Rows of sample_fn(size), consumed in order and resampled when they run out.
+
+    Args:
+        sample_fn (callable): n -> dict of name -> (n, ...) numpy arrays.
+        size (int): configurations sampled at once. 1 samples on every reset.
+    """
+
+    def __init__(self, sample_fn, size=DEFAULT_RESET_BANK_SIZE):
+        if size < 1:
+            raise ValueError("reset_bank_size must be at least 1.")
+        self.sample_fn = sample_fn
+        self.size = size
+        self.clear()
+
+    def next(self):
+        """
+        Returns:
+            dict: name -> row of the next configuration (views into the bank, do not modify).
+        """
+        if self.index == self.size:
+            # a new dict every time, so get_state can hand out the old one without copying it
+            self.batch = self.sample_fn(self.size)
+            self.index = 0
+        index = self.index
+        self.index += 1
+        return {name: values[index] for name, values in self.batch.items()}
+
+    def clear(self):
+        """
+        Drops the remaining configurations, e.g. after the generator was reseeded.
+        """
+        self.batch = None
+        self.index = self.size
+
+    def get_state(self):
+        return self.batch, self.index
+
+    def set_state(self, state):
+        self.batch, self.index = state
@@ -0,0 +1,521 @@
+import math
+
+import numpy as np
+from state_layout import (EGO_VX, EGO_VY, EGO_X, EGO_Y, PUCK_VX, PUCK_VY, PUCK_X, PUCK_Y)
+
+TASKS = ('puck_height', 'puck_vel', 'puck_catch', 'puck_reach', 'puck_touch', 'alt_home',
+         'goal_discrete', 'goal_position', 'goal_position_velocity')
+
+# shaping terms returned by RewardEngine.compute, summed in this order into 'shaping'
+SHAPING_TERMS = ('direction_rew', 'horizontal_vel_rew', 'diagonal_motion_rew', 'stand_still_rew', 'wall_bumping_rew')
+
+ONE = np.float64(1)
+
+
+class RewardEngine:
+    """
+    Rewards, reward shaping and termination flags for batches of flat states (see state_layout.py).
+
+    Every method takes either an (N, state size) batch, giving (N,) arrays, or a single (state size,)
+    state, giving numpy scalars. Slots are read from states.T, a column view of a batch or the state
+    itself, so both go through the same numpy operations: AirHockeyEnv.step and batched callers get
+    exactly the same results, and the single state path avoids the per-call overhead of tiny arrays.
+    Flags select values as value * flag, which unlike np.where is cheap on numpy scalars.
+    The base reward function is picked once from the task, instead of branching on every call, and
+    make_transition_fn builds AirHockeyEnv.step's reward and termination from only the checks and terms
+    the task and flags use.
+    """
+
+    def __init__(self,
+                 task,
+                 width,
+                 length,
+                 paddle_radius,
+                 puck_radius,
+                 max_paddle_vel,
+                 max_timesteps,
+                 terminate_on_out_of_bounds,
+                 terminate_on_enemy_goal,
+                 terminate_on_puck_stop,
+                 truncate_rew,
+                 wall_bumping_rew,
+                 direction_change_rew,
+                 horizontal_vel_rew,
+                 diagonal_motion_rew,
+                 stand_still_rew):
+        if task not in TASKS:
+            raise ValueError("Invalid reward type defined in config.")
+        self.task = task
+        self.width = width
+        self.length = length
+        self.paddle_radius = paddle_radius
+        self.puck_radius = puck_radius
+        self.max_paddle_vel = max_paddle_vel
+        self.max_timesteps = max_timesteps
+        self.terminate_on_out_of_bounds = terminate_on_out_of_bounds
+        self.terminate_on_enemy_goal = terminate_on_enemy_goal
+        self.terminate_on_puck_stop = terminate_on_puck_stop
+        # numpy floats: value * flag stays a float, and is fast when value is a numpy scalar (flag * value is not)
+        self.truncate_rew = np.float64(truncate_rew)
+        self.wall_bumping_rew = np.float64(wall_bumping_rew)
+        self.direction_change_rew = np.float64(direction_change_rew)
+        self.horizontal_vel_rew = np.float64(horizontal_vel_rew)
+        self.diagonal_motion_rew = np.float64(diagonal_motion_rew)
+        self.stand_still_rew = np.float64(stand_still_rew)
+
+        self.table_x_top = -length / 2
+        self.table_x_bot = length / 2
+        self.table_y_right = width / 2
+        self.table_y_left = -width / 2
+        # radius of the two home regions, 90 / 560 = 0.16 <- normalized dist in pixels
+        self.home_radius = 0.16 * width
+        self.base_reward_fn = getattr(self, task + '_reward')
+        # one function per entry of SHAPING_TERMS, with its weight
+        self.shaping_fns = (self.direction_shaping, self.horizontal_vel_shaping, self.diagonal_motion_shaping,
+                            self.stand_still_shaping, self.wall_bumping_shaping)
+        self.shaping_weights = (self.direction_change_rew, self.horizontal_vel_rew, self.diagonal_motion_rew,
+                                self.stand_still_rew, self.wall_bumping_rew)
+
+    @staticmethod
+    def from_dict(state_dict):
+        return RewardEngine(**state_dict)
+
+    def compute(self, states, old_states, timesteps, goal_pos=None, goal_vel=None, goal_radius=None, hit_a_puck=False,
+                multiagent=False):
+        """
+        Rewards and termination flags of transitions, as AirHockeyEnv.single_agent_step uses them.
+
+        Args:
+            states (numpy.ndarray): (N, state size) states after the transitions, or a single state.
+            old_states (numpy.ndarray): states before the transitions, used by the direction change shaping.
+            timesteps (numpy.ndarray or int): env timestep of each transition (before it is incremented).
+            goal_pos (numpy.ndarray, optional): (N, 2) or (2,) goal positions, for goal tasks.
+            goal_vel (numpy.ndarray, optional): (N, 2) or (2,) goal velocities, for goal_position_velocity.
+            goal_radius (float or numpy.ndarray, optional): goal radius, shared or one per state.
+            hit_a_puck (numpy.ndarray or bool, optional): whether the ego paddle hit a puck, for puck_touch.
+            multiagent (bool, optional): use the multi-agent termination rules, see termination.
+
+        Returns:
+            dict: one value per state. 'reward' is the total reward, 'base_reward' the task reward (before
+            truncation), one entry per shaping term in SHAPING_TERMS and their sum 'shaping', and the
+            flags 'terminated', 'truncated', 'puck_within_home', 'puck_within_alt_home', 'puck_within_goal'.
+        """
+        result = self.termination(states, timesteps, goal_pos, goal_radius, multiagent)
+        base_reward = self.base_reward_fn(states, hit_a_puck=hit_a_puck, puck_within_alt_home=result['puck_within_alt_home'],
+                                          goal_pos=goal_pos, goal_vel=goal_vel, goal_radius=goal_radius)
+        result['base_reward'] = base_reward
+        result.update(self.shaping(states, old_states, timesteps))
+        truncated = result['truncated']
+        result['reward'] = (self.truncate_rew * truncated + base_reward * ~truncated) + result['shaping']
+        if self.task == 'puck_reach':
+            result['terminated'] = result['terminated'] | self.puck_reached(states)
+        return result
+
+    def make_transition_fn(self, multiagent=False, wrap=None, python_floats=False):
+        """
+        Reward and termination of a single transition for AirHockeyEnv.step, built once from only the
+        checks and terms this engine's task and flags use: disabled termination checks and shaping terms
+        with a zero weight are left out, and the base reward is skipped on truncation. Gives the same values
+        as compute, without the dict and the flags the env does not read.
+
+        Args:
+            multiagent (bool, optional): use the multi-agent termination rules, see termination.
+            wrap (callable, optional): wrap(name, fn) applied to the termination, base reward and shaping
+                phases, e.g. StepProfiler.wrap.
+            python_floats (bool, optional): compute on the states as python floats with math (see
+                FloatRewardTerms), which allocates no numpy arrays. The values then match compute only up
+                to rounding, math.hypot and np.hypot can differ in the last bit.
+
+        Returns:
+            callable: fn(state, old_state, timestep, hit_a_puck, goal_pos, goal_vel, goal_radius) -> (reward,
+            terminated, truncated, puck_within_home, puck_within_alt_home), the home flags are None unless
+            multiagent.
+        """
+        max_timesteps = self.max_timesteps
+        # the checks and terms, and the flags, on numpy scalars or on python floats
+        terms = FloatRewardTerms(self) if python_floats else self
+        to_bool, false = (bool, False) if python_floats else (np.bool_, np.False_)
+        # checks that end the episode early, the truncations after the multiagent rule, and the terminations
+        ends = ([terms.out_of_bounds] if self.terminate_on_out_of_bounds else []) + \
+            ([terms.puck_within_home] if self.terminate_on_enemy_goal and not multiagent else [])
+        stops = [terms.puck_stopped] if self.terminate_on_puck_stop else []
+        reached = [terms.puck_reached] if self.task == 'puck_reach' else []
+
+        if not multiagent:
+            def termination(state, timestep):
+                # numpy bools throughout (or python bools throughout with python_floats), mixing them (or ~)
+                # goes through a ufunc and allocates
+                terminated = to_bool(timestep > max_timesteps)
+                truncated = false
+                for check in ends:
+                    truncated = truncated | check(state)
+                if terminated:
+                    truncated = false
+                for check in stops:
+                    truncated = truncated | check(state)
+                for check in reached:
+                    terminated = terminated | check(state)
+                return terminated, truncated, None, None
+        else:
+            puck_within_home, puck_within_alt_home = terms.puck_within_home, terms.puck_within_alt_home
+
+            def termination(state, timestep):
+                within_home, within_alt_home = puck_within_home(state), puck_within_alt_home(state)
+                terminated = to_bool(timestep > max_timesteps) | within_home | within_alt_home
+                for check in ends:
+                    terminated = terminated | check(state)
+                truncated = false
+                for check in stops:
+                    truncated = truncated | check(state)
+                for check in reached:
+                    terminated = terminated | check(state)
+                return terminated, truncated, within_home, within_alt_home
+
+        base_reward_fn = getattr(terms, self.task + '_reward')
+        if self.task == 'alt_home':
+            puck_within_alt_home = terms.puck_within_alt_home
+
+            def base_reward(state, hit_a_puck, goal_pos, goal_vel, goal_radius):
+                return base_reward_fn(state, puck_within_alt_home=puck_within_alt_home(state))
+        else:
+            def base_reward(state, hit_a_puck, goal_pos, goal_vel, goal_radius):
+                return base_reward_fn(state, hit_a_puck=hit_a_puck, goal_pos=goal_pos, goal_vel=goal_vel,
+                                      goal_radius=goal_radius)
+
+        # a zero weight makes its term +-0, which leaves the sum unchanged
+        shaping_fns = [fn for fn, weight in zip(terms.shaping_fns, self.shaping_weights) if weight != 0]
+
+        def shaping(state, old_state, timestep):
+            total = 0.0
+            for term in shaping_fns:
+                total = total + term(state, old_state, timestep)
+            return total
+
+        if wrap is not None:
+            termination = wrap('has_finished', termination)
+            base_reward = wrap('get_base_reward', base_reward)
+            shaping = wrap('get_reward_shaping', shaping)
+        truncate_rew = terms.truncate_rew
+
+        def transition(state, old_state, timestep, hit_a_puck, goal_pos, goal_vel, goal_radius):
+            terminated, truncated, within_home, within_alt_home = termination(state, timestep)
+            reward = truncate_rew if truncated else base_reward(state, hit_a_puck, goal_pos, goal_vel, goal_radius)
+            return reward + shaping(state, old_state, timestep), terminated, truncated, within_home, within_alt_home
+
+        if python_floats:
+            float_transition = transition
+
+            def transition(state, old_state, timestep, hit_a_puck, goal_pos, goal_vel, goal_radius):
+                return float_transition(state.tolist(), old_state.tolist(), timestep, hit_a_puck, goal_pos, goal_vel,
+                                        goal_radius)
+        return transition
+
+    def termination(self, states, timesteps, goal_pos=None, goal_radius=None, multiagent=False):
+        """
+        Termination flags, see AirHockeyEnv.has_finished. With multiagent every episode end is a termination,
+        including the puck reaching either home region.
+        """
+        # a single state gets numpy bool scalars, like the comparisons below
+        no_flags = np.zeros(states.shape[:-1], dtype=bool) if states.ndim > 1 else np.False_
+        terminated = no_flags | (timesteps > self.max_timesteps)
+        truncated = no_flags
+        if self.terminate_on_out_of_bounds:
+            truncated = self.out_of_bounds(states) & ~terminated
+
+        puck_within_home = self.puck_within_home(states)
+        puck_within_alt_home = self.puck_within_alt_home(states)
+        if self.terminate_on_enemy_goal:
+            truncated = truncated | (puck_within_home & ~terminated)
+
+        if multiagent:
+            terminated = terminated | truncated | puck_within_alt_home | puck_within_home
+            truncated = no_flags
+
+        if self.terminate_on_puck_stop:
+            truncated = truncated | self.puck_stopped(states)
+
+        if goal_pos is not None:
+            puck_within_goal = self.get_goal_dist(states, goal_pos) < goal_radius
+        else:
+            puck_within_goal = no_flags
+        return {'terminated': terminated, 'truncated': truncated, 'puck_within_home': puck_within_home,
+                'puck_within_alt_home': puck_within_alt_home, 'puck_within_goal': puck_within_goal}
+
+    def out_of_bounds(self, states):
+        # check if we hit any walls or are above the middle of the board
+        s = states.T
+        ego_x, ego_y = s[EGO_X], s[EGO_Y]
+        return (ego_x < 0 + self.paddle_radius) | (ego_x > self.table_x_bot - self.paddle_radius) | \
+            (ego_y > self.table_y_right - self.paddle_radius) | (ego_y < self.table_y_left + self.paddle_radius)
+
+    def puck_within_home(self, states):
+        s = states.T
+        return np.hypot(s[PUCK_X] - self.table_x_bot, s[PUCK_Y]) < self.home_radius
+
+    def puck_within_alt_home(self, states):
+        s = states.T
+        return np.hypot(s[PUCK_X] - self.table_x_top, s[PUCK_Y]) < self.home_radius
+
+    def puck_stopped(self, states):
+        s = states.T
+        return np.hypot(s[PUCK_VX], s[PUCK_VY]) < 0.01
+
+    def shaping(self, states, old_states, timesteps):
+        """
+        Every reward shaping term and their sum, see SHAPING_TERMS.
+        """
+        result = {name: fn(states, old_states, timesteps) for name, fn in zip(SHAPING_TERMS, self.shaping_fns)}
+        result['shaping'] = result['direction_rew'] + result['horizontal_vel_rew'] + result['diagonal_motion_rew'] + \
+            result['stand_still_rew'] + result['wall_bumping_rew']
+        return result
+
+    # shaping terms, in the order of SHAPING_TERMS. they all take states, old_states and timesteps
+
+    def direction_shaping(self, states, old_states, timesteps):
+        # small negative reward for changing direction, from the second step on
+        s = states.T
+        ego_vx, ego_vy = s[EGO_VX], s[EGO_VY]
+        old_vx, old_vy = old_states.T[EGO_VX], old_states.T[EGO_VY]
+        old_speed = np.hypot(old_vx, old_vy) + 1e-8
+        old_unit_x, old_unit_y = old_vx / old_speed, old_vy / old_speed
+        new_speed = np.hypot(ego_vx, ego_vy) + 1e-8
+        new_unit_x, new_unit_y = ego_vx / new_speed, ego_vy / new_speed
+        cosine_sim = (old_unit_x * new_unit_x + old_unit_y * new_unit_y) / \
+            (np.hypot(old_unit_x, old_unit_y) * np.hypot(new_unit_x, new_unit_y) + 1e-8)
+        norm_cosine_sim = (cosine_sim + 1) / 2
+        return self.direction_change_rew * (1 - norm_cosine_sim) * (timesteps > 0)
+
+    def horizontal_vel_shaping(self, states, old_states, timesteps):
+        # small negative reward for moving too fast in horizontal direction
+        return self.horizontal_vel_rew * (abs(states.T[EGO_VY]) / self.max_paddle_vel)
+
+    def diagonal_motion_shaping(self, states, old_states, timesteps):
+        # negative penalty for diagonal motion, the angle is close to pi/4 or 3pi/4 if moving diagonally
+        s = states.T
+        angle = abs(np.arctan2(s[EGO_VY], s[EGO_VX]))
+        threshold = np.pi / 12
+        diagonal = (abs(angle - np.pi / 4) < threshold) | (abs(angle - 3 * np.pi / 4) < threshold)
+        return self.diagonal_motion_rew * diagonal
+
+    def stand_still_shaping(self, states, old_states, timesteps):
+        # small positive reward for keeping still
+        s = states.T
+        return self.stand_still_rew * (np.hypot(s[EGO_VX], s[EGO_VY]) < 0.01)
+
+    def wall_bumping_shaping(self, states, old_states, timesteps):
+        # determine if close to walls
+        s = states.T
+        ego_x, ego_y = s[EGO_X], s[EGO_Y]
+        bumping = (ego_y > self.table_y_right - 2 * self.paddle_radius) | \
+            (ego_y < self.table_y_left + 2 * self.paddle_radius) | \
+            (ego_x < 0 + 4 * self.paddle_radius) | (ego_x > self.table_x_bot - 4 * self.paddle_radius)
+        return self.wall_bumping_rew * bumping
+
+    def get_goal_dist(self, states, goal_pos):
+        s, goal = states.T, np.asarray(goal_pos).T
+        return np.hypot(s[PUCK_X] - goal[0], s[PUCK_Y] - goal[1])
+
+    def get_puck_paddle_dist(self, states):
+        s = states.T
+        return np.hypot(s[PUCK_X] - s[EGO_X], s[PUCK_Y] - s[EGO_Y])
+
+    def puck_reached(self, states):
+        return self.get_puck_paddle_dist(states) <= self.paddle_radius + self.puck_radius
+
+    def get_position_goal_reward(self, dist, goal_radius):
+        # float from [0, 1] 0 being far 1 being the point
+        # use sigmoid function because being closer is much more important than being far
+        sigmoid_scale = 2
+        inside = dist < goal_radius
+        reward_raw = (1 - dist / goal_radius) * inside # numerical stability, zeroed again below
+        return 1 / (1 + np.exp(-reward_raw * sigmoid_scale)) * inside
+
+    def get_velocity_goal_reward(self, position_reward, vx, vy, goal_vx, goal_vy):
+        # cosine of the angle between the velocities, and the size of their difference
+        denom = np.hypot(vx, vy) * np.hypot(goal_vx, goal_vy) + 1e-8
+        vel_cos = np.minimum(np.maximum((vx * goal_vx + vy * goal_vy) / denom, -1), 1)
+        mag_diff = np.hypot(vx - goal_vx, vy - goal_vy)
+        # no velocity reward outside of the goal region
+        has_position_reward = position_reward != 0
+        vel_angle_reward = (vel_cos + 1) / 2 * has_position_reward
+        vel_mag_reward = (1 - mag_diff / self.max_paddle_vel) * has_position_reward
+        vel_reward = (vel_angle_reward + vel_mag_reward) / 2
+        return 0.5 * position_reward + vel_reward
+
+    def goal_reward(self, achieved_goal, desired_goal, goal_radius):
+        """
+        Reward for position (..., 2) or position and velocity (..., 4) goals, used by AirHockeyEnv.compute_reward.
+        """
+        achieved, desired = achieved_goal.T, np.asarray(desired_goal).T
+        dist = np.hypot(achieved[0] - desired[0], achieved[1] - desired[1])
+        position_reward = self.get_position_goal_reward(dist, goal_radius)
+        if achieved_goal.shape[-1] == 2:
+            return position_reward
+        return self.get_velocity_goal_reward(position_reward, achieved[2], achieved[3], desired[2], desired[3])
+
+    # base rewards, one per task. they all take the same keyword arguments
+
+    def puck_height_reward(self, states, **kwargs):
+        # min acceptable reward is 0 height and above, normalized w.r.t. the top half length of the table
+        return np.maximum(-states.T[PUCK_X], 0) / (self.length / 2)
+
+    def puck_vel_reward(self, states, **kwargs):
+        # reward for positive velocity towards the top of the board, up to an estimated max vel of 2
+        max_rew = 2
+        return np.minimum(np.maximum(-states.T[PUCK_VX], 0), max_rew) / max_rew
+
+    def puck_catch_reward(self, states, **kwargs):
+        # reward for getting close to the puck, but make sure not to displace it
+        return np.maximum(1 - self.get_puck_paddle_dist(states) / self.home_radius, 0)
+
+    def puck_reach_reward(self, states, **kwargs):
+        return ONE * self.puck_reached(states)
+
+    def puck_touch_reward(self, states, hit_a_puck, **kwargs):
+        return ONE * ((np.zeros(states.shape[:-1], dtype=bool) if states.ndim > 1 else np.False_) | hit_a_puck)
+
+    def alt_home_reward(self, states, puck_within_alt_home, **kwargs):
+        return ONE * puck_within_alt_home
+
+    def goal_discrete_reward(self, states, goal_pos, goal_radius, **kwargs):
+        return ONE * (self.get_goal_dist(states, goal_pos) < goal_radius)
+
+    def goal_position_reward(self, states, goal_pos, goal_radius, **kwargs):
+        return self.get_position_goal_reward(self.get_goal_dist(states, goal_pos), goal_radius)
+
+    def goal_position_velocity_reward(self, states, goal_pos, goal_vel, goal_radius, **kwargs):
+        position_reward = self.get_position_goal_reward(self.get_goal_dist(states, goal_pos), goal_radius)
+        goal_vel = np.asarray(goal_vel).T
+        return self.get_velocity_goal_reward(position_reward, states.T[PUCK_VX], states.T[PUCK_VY],
+                                             goal_vel[0], goal_vel[1])
+
+
+class FloatRewardTerms:
+    """
+    The checks, shaping terms and base rewards of a RewardEngine, with the same names and arguments, on a
+    single state given as a list of python floats (state.tolist()). They compute with math and python
+    floats and bools, so unlike numpy ufuncs on numpy scalars they make no 0-d temporaries. Used by
+    RewardEngine.make_transition_fn(python_floats=True), the results match the engine up to rounding.
+    """
+
+    def __init__(self, engine):
+        self.paddle_radius = engine.paddle_radius
+        self.puck_radius = engine.puck_radius
+        self.max_paddle_vel = engine.max_paddle_vel
+        self.length = engine.length
+        self.table_x_top = engine.table_x_top
+        self.table_x_bot = engine.table_x_bot
+        self.table_y_right = engine.table_y_right
+        self.table_y_left = engine.table_y_left
+        self.home_radius = engine.home_radius
+        self.truncate_rew = float(engine.truncate_rew)
+        self.wall_bumping_rew = float(engine.wall_bumping_rew)
+        self.direction_change_rew = float(engine.direction_change_rew)
+        self.horizontal_vel_rew = float(engine.horizontal_vel_rew)
+        self.diagonal_motion_rew = float(engine.diagonal_motion_rew)
+        self.stand_still_rew = float(engine.stand_still_rew)
+        self.shaping_fns = (self.direction_shaping, self.horizontal_vel_shaping, self.diagonal_motion_shaping,
+                            self.stand_still_shaping, self.wall_bumping_shaping)
+
+    def out_of_bounds(self, s):
+        ego_x, ego_y = s[EGO_X], s[EGO_Y]
+        return (ego_x < 0 + self.paddle_radius) or (ego_x > self.table_x_bot - self.paddle_radius) or \
+            (ego_y > self.table_y_right - self.paddle_radius) or (ego_y < self.table_y_left + self.paddle_radius)
+
+    def puck_within_home(self, s):
+        return math.hypot(s[PUCK_X] - self.table_x_bot, s[PUCK_Y]) < self.home_radius
+
+    def puck_within_alt_home(self, s):
+        return math.hypot(s[PUCK_X] - self.table_x_top, s[PUCK_Y]) < self.home_radius
+
+    def puck_stopped(self, s):
+        return math.hypot(s[PUCK_VX], s[PUCK_VY]) < 0.01
+
+    # shaping terms, in the order of SHAPING_TERMS
+
+    def direction_shaping(self, s, old_s, timestep):
+        ego_vx, ego_vy = s[EGO_VX], s[EGO_VY]
+        old_vx, old_vy = old_s[EGO_VX], old_s[EGO_VY]
+        old_speed = math.hypot(old_vx, old_vy) + 1e-8
+        old_unit_x, old_unit_y = old_vx / old_speed, old_vy / old_speed
+        new_speed = math.hypot(ego_vx, ego_vy) + 1e-8
+        new_unit_x, new_unit_y = ego_vx / new_speed, ego_vy / new_speed
+        cosine_sim = (old_unit_x * new_unit_x + old_unit_y * new_unit_y) / \
+            (math.hypot(old_unit_x, old_unit_y) * math.hypot(new_unit_x, new_unit_y) + 1e-8)
+        norm_cosine_sim = (cosine_sim + 1) / 2
+        return self.direction_change_rew * (1 - norm_cosine_sim) * (timestep > 0)
+
+    def horizontal_vel_shaping(self, s, old_s, timestep):
+        return self.horizontal_vel_rew * (abs(s[EGO_VY]) / self.max_paddle_vel)
+
+    def diagonal_motion_shaping(self, s, old_s, timestep):
+        angle = abs(math.atan2(s[EGO_VY], s[EGO_VX]))
+        threshold = math.pi / 12
+        diagonal = (abs(angle - math.pi / 4) < threshold) or (abs(angle - 3 * math.pi / 4) < threshold)
+        return self.diagonal_motion_rew * diagonal
+
+    def stand_still_shaping(self, s, old_s, timestep):
+        return self.stand_still_rew * (math.hypot(s[EGO_VX], s[EGO_VY]) < 0.01)
+
+    def wall_bumping_shaping(self, s, old_s, timestep):
+        ego_x, ego_y = s[EGO_X], s[EGO_Y]
+        bumping = (ego_y > self.table_y_right - 2 * self.paddle_radius) or \
+            (ego_y < self.table_y_left + 2 * self.paddle_radius) or \
+            (ego_x < 0 + 4 * self.paddle_radius) or (ego_x > self.table_x_bot - 4 * self.paddle_radius)
+        return self.wall_bumping_rew * bumping
+
+    def get_goal_dist(self, s, goal_pos):
+        return math.hypot(s[PUCK_X] - float(goal_pos[0]), s[PUCK_Y] - float(goal_pos[1]))
+
+    def get_puck_paddle_dist(self, s):
+        return math.hypot(s[PUCK_X] - s[EGO_X], s[PUCK_Y] - s[EGO_Y])
+
+    def puck_reached(self, s):
+        return self.get_puck_paddle_dist(s) <= self.paddle_radius + self.puck_radius
+
+    def get_position_goal_reward(self, dist, goal_radius):
+        if dist >= goal_radius:
+            return 0.0
+        sigmoid_scale = 2
+        return 1 / (1 + math.exp(-(1 - dist / goal_radius) * sigmoid_scale))
+
+    def get_velocity_goal_reward(self, position_reward, vx, vy, goal_vx, goal_vy):
+        if position_reward == 0:
+            return 0.0
+        denom = math.hypot(vx, vy) * math.hypot(goal_vx, goal_vy) + 1e-8
+        vel_cos = min(max((vx * goal_vx + vy * goal_vy) / denom, -1), 1)
+        mag_diff = math.hypot(vx - goal_vx, vy - goal_vy)
+        vel_reward = ((vel_cos + 1) / 2 + (1 - mag_diff / self.max_paddle_vel)) / 2
+        return 0.5 * position_reward + vel_reward
+
+    # base rewards, one per task, with the keyword arguments of RewardEngine's
+
+    def puck_height_reward(self, s, **kwargs):
+        return max(-s[PUCK_X], 0.0) / (self.length / 2)
+
+    def puck_vel_reward(self, s, **kwargs):
+        max_rew = 2
+        return min(max(-s[PUCK_VX], 0.0), max_rew) / max_rew
+
+    def puck_catch_reward(self, s, **kwargs):
+        return max(1 - self.get_puck_paddle_dist(s) / self.home_radius, 0.0)
+
+    def puck_reach_reward(self, s, **kwargs):
+        return float(self.puck_reached(s))
+
+    def puck_touch_reward(self, s, hit_a_puck, **kwargs):
+        return float(hit_a_puck)
+
+    def alt_home_reward(self, s, puck_within_alt_home, **kwargs):
+        return float(puck_within_alt_home)
+
+    def goal_discrete_reward(self, s, goal_pos, goal_radius, **kwargs):
+        return float(self.get_goal_dist(s, goal_pos) < goal_radius)
+
+    def goal_position_reward(self, s, goal_pos, goal_radius, **kwargs):
+        return self.get_position_goal_reward(self.get_goal_dist(s, goal_pos), goal_radius)
+
+    def goal_position_velocity_reward(self, s, goal_pos, goal_vel, goal_radius, **kwargs):
+        position_reward = self.get_position_goal_reward(self.get_goal_dist(s, goal_pos), goal_radius)
+        return self.get_velocity_goal_reward(position_reward, s[PUCK_VX], s[PUCK_VY], float(goal_vel[0]),
+                                             float(goal_vel[1]))
@@ -2,6 +2,7 @@ from stable_baselines3 import PPO, SAC
 from stable_baselines3.common.vec_env import DummyVecEnv, VecNormalize
 from air_hockey_simulator.airhockey_box2d import AirHockey2D
 from render import AirHockeyRenderer
+from eval_media import start_eval_media
 from matplotlib import pyplot as plt
 import threading
 import time
@@ -10,7 +11,6 @@ import yaml
 import os
 import matplotlib.pyplot as plt
 from tensorboard.backend.event_processing import event_accumulator
-import imageio
 import cv2
 import tqdm
 
@@ -105,28 +105,13 @@ def evaluate_air_hockey_model(air_hockey_cfg, log_dir):
     start = time.time()
     done = False
     
-    # first let's create some videos offline into gifs
-    print("Saving gifs...(this will tqdm for EACH gif to save)")
-    n_eps_viz = 5
-    n_gifs = 5
-    for gif_idx in range(n_gifs):
-        frames = []
-        for i in tqdm.tqdm(range(n_eps_viz)):
-            obs = env_test.reset()
-            done = False
-            while not done:
-                frame = renderer.get_frame()
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                # decrease width to 160 but keep aspect ratio
-                aspect_ratio = frame.shape[1] / frame.shape[0]
-                frame = cv2.resize(frame, (160, int(160 / aspect_ratio)))
-                frames.append(frame)
-                action = model.predict(obs, deterministic=True)[0]
-                obs, rew, done, info = env_test.step(action)
-        gif_savepath = os.path.join(log_dir, f'eval_{gif_idx}.gif')
-        def fps_to_duration(fps):
-            return int(1000 * 1/fps)
-        imageio.mimsave(gif_savepath, frames, format='GIF', loop=0, duration=fps_to_duration(30))
+    # eval videos, one per worker process, streamed to disk frame by frame
+    print("Saving eval videos...")
+    media_job = start_eval_media(air_hockey_params, model_fp,
+                                 os.path.join(log_dir, air_hockey_cfg['vec_normalize_save_filepath']), log_dir,
+                                 formats=air_hockey_cfg.get('eval_media_formats', ['gif']),
+                                 num_workers=air_hockey_cfg.get('eval_media_workers', None))
+    media_job.wait()
     
     # print('Running policy live...Ctrl+C twice to stop.')
     # for i in range(1000000):
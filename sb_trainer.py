@@ -1,6 +1,6 @@
 from stable_baselines3 import PPO 
 from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.vec_env import DummyVecEnv, VecNormalize
+from stable_baselines3.common.vec_env import DummyVecEnv, VecMonitor, VecNormalize
 from stable_baselines3 import HerReplayBuffer, SAC
 from stable_baselines3.common.noise import NormalActionNoise
 from stable_baselines3.common.callbacks import BaseCallback
@@ -8,17 +8,18 @@ from stable_baselines3.common.logger import Figure
 from stable_baselines3.common.env_checker import check_env
 from matplotlib import pyplot as plt
 from airhockey import AirHockeyEnv
-from render import AirHockeyRenderer
+from vec_env import make_air_hockey_vec_env
+from eval_media import start_eval_media
+from league import LeagueCallback, LeagueEvaluator, LeagueOpponentEnv, OpponentPool
 from tensorboard.backend.event_processing import event_accumulator
 import numpy as np
 import argparse
+import functools
+import json
 import yaml
 import os
 import re
 import time
-import imageio
-import cv2
-import tqdm
 
 
 def train_air_hockey_model(air_hockey_cfg):
@@ -32,6 +33,17 @@ def train_air_hockey_model(air_hockey_cfg):
     
     air_hockey_params = air_hockey_cfg['air_hockey']
     air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
+    # image observations are already in [0, 255] and go through a CNN
+    pixels = air_hockey_params.get('observation_mode', 'state') == 'pixels'
+    # self-play: both paddles of every table play the policy being trained, each table takes two
+    # slots of the vec env and both go through the same forward pass
+    self_play = air_hockey_cfg.get('self_play', False)
+    if self_play:
+        air_hockey_params['simulator_params']['num_paddles'] = 2
+    # league: the ego paddle trains against a pool of its own past snapshots, see league.py
+    league_cfg = air_hockey_cfg.get('league', None)
+    if league_cfg is not None and self_play:
+        raise ValueError("self_play and league cannot be used together.")
     
     if type(air_hockey_cfg['seed']) is not list:
         seeds = [int(air_hockey_cfg['seed'])]
@@ -39,20 +51,49 @@ def train_air_hockey_model(air_hockey_cfg):
         seeds = [int(s) for s in air_hockey_cfg['seed']]
         del air_hockey_cfg['seed'] # otherwise it will be saved in the model cfg when copied over
         
+    media_jobs = []
     for seed in seeds:
         air_hockey_cfg['seed'] = seed # since it it used as training seed
         air_hockey_params['seed'] = seed # and environment seed
-        env = AirHockeyEnv.from_dict(air_hockey_params)
+        num_envs = air_hockey_cfg.get('num_envs', 1)
 
-        # check_env(env)
-        def wrap_env(env):
-            wrapped_env = Monitor(env) # needed for extracting eprewmean and eplenmean
-            wrapped_env = DummyVecEnv([lambda: wrapped_env]) # Needed for all environments (e.g. used for multi-processing)
-            wrapped_env = VecNormalize(wrapped_env) # probably something to try when tuning
-            return wrapped_env
+        callback = None
+        if league_cfg is not None:
+            make_env = functools.partial(LeagueOpponentEnv, scripted_opponent=league_cfg.get('scripted_opponent', None))
+            env = make_air_hockey_vec_env(air_hockey_params, num_envs,
+                                          num_workers=air_hockey_cfg.get('num_workers', None),
+                                          seed=seed, make_env=make_env)
+            env = VecMonitor(env)
+            env = VecNormalize(env, norm_obs=not pixels)
+            pool = OpponentPool(max_size=league_cfg.get('pool_size', 16),
+                                eviction=league_cfg.get('eviction', 'lru'),
+                                pfsp_power=league_cfg.get('pfsp_power', 2.0))
+            evaluator = None
+            if league_cfg.get('eval_workers', 1):
+                evaluator = LeagueEvaluator(pool, air_hockey_params, num_workers=league_cfg.get('eval_workers', 1),
+                                            n_episodes=league_cfg.get('eval_episodes', 4), seed=seed)
+            callback = LeagueCallback(pool, snapshot_interval=league_cfg.get('snapshot_interval', 20000),
+                                      refresh_interval=league_cfg.get('refresh_interval', 2000),
+                                      evaluator=evaluator)
+        elif num_envs > 1 or self_play:
+            # envs live in worker processes, each with its own seed derived from the training seed
+            env = make_air_hockey_vec_env(air_hockey_params, num_envs,
+                                          num_workers=air_hockey_cfg.get('num_workers', None),
+                                          seed=seed)
+            env = VecMonitor(env) # needed for extracting eprewmean and eplenmean
+            env = VecNormalize(env, norm_obs=not pixels)
+        else:
+            env = AirHockeyEnv.from_dict(air_hockey_params)
+
+            # check_env(env)
+            def wrap_env(env):
+                wrapped_env = Monitor(env) # needed for extracting eprewmean and eplenmean
+                wrapped_env = DummyVecEnv([lambda: wrapped_env]) # Needed for all environments (e.g. used for multi-processing)
+                wrapped_env = VecNormalize(wrapped_env, norm_obs=not pixels) # probably something to try when tuning
+                return wrapped_env
 
-        # check_env(env)
-        env = wrap_env(env)
+            # check_env(env)
+            env = wrap_env(env)
         os.makedirs(air_hockey_cfg['tb_log_dir'], exist_ok=True)
         log_parent_dir = os.path.join(air_hockey_cfg['tb_log_dir'], air_hockey_cfg['air_hockey']['task'])
         os.makedirs(log_parent_dir, exist_ok=True)
@@ -89,7 +130,7 @@ def train_air_hockey_model(air_hockey_cfg):
                 # policy_kwargs=dict(net_arch=[64, 64]),
             )
         else:
-            model = PPO("MlpPolicy", env, verbose=1, 
+            model = PPO("CnnPolicy" if pixels else "MlpPolicy", env, verbose=1, 
                     tensorboard_log=log_parent_dir, 
                     device="cpu", # cpu is actually faster!
                     seed=seed,
@@ -97,7 +138,8 @@ def train_air_hockey_model(air_hockey_cfg):
         
         model.learn(total_timesteps=air_hockey_cfg['n_training_steps'],
                     tb_log_name=air_hockey_cfg['tb_log_name'], 
-                    progress_bar=True)
+                    progress_bar=True,
+                    callback=callback)
         
         os.makedirs(log_parent_dir, exist_ok=True)
         # get log dir ending with highest number
@@ -115,24 +157,17 @@ def train_air_hockey_model(air_hockey_cfg):
 
         model.save(model_filepath)
         env.save(env_filepath)
+        env.close()
+        if league_cfg is not None:
+            # final Elo ratings and the learner's results against every snapshot left in the pool
+            with open(os.path.join(log_dir, 'league.json'), 'w') as f:
+                json.dump(pool.get_table(), f, indent=2)
         
         # let's also evaluate the policy and save the results!
         air_hockey_cfg['air_hockey']['max_timesteps'] = 200
         
         air_hockey_params = air_hockey_cfg['air_hockey']
         air_hockey_params['n_training_steps'] = air_hockey_cfg['n_training_steps']
-        env_test = AirHockeyEnv.from_dict(air_hockey_params)
-        renderer = AirHockeyRenderer(env_test)
-        
-        env_test = DummyVecEnv([lambda : env_test])
-        env_test = VecNormalize.load(os.path.join(log_dir, air_hockey_cfg['vec_normalize_save_filepath']), env_test)
-        
-        # if goal-conditioned use SAC
-        if 'goal' in air_hockey_cfg['air_hockey']['task']:
-            model = SAC.load(model_filepath, env=env_test)
-        else:
-            model = PPO.load(model_filepath)
-
         # env_test.training = False
         # env_test.norm_reward = False
         
@@ -194,32 +229,12 @@ def train_air_hockey_model(air_hockey_cfg):
 
         save_plot(metrics)
 
-        obs = env_test.reset()
-        start = time.time()
-        done = False
-        
-        # first let's create some videos offline into gifs
-        print("Saving gifs...(this will tqdm for EACH gif to save)")
-        n_eps_viz = 5
-        n_gifs = 5
-        for gif_idx in range(n_gifs):
-            frames = []
-            for i in tqdm.tqdm(range(n_eps_viz)):
-                obs = env_test.reset()
-                done = False
-                while not done:
-                    frame = renderer.get_frame()
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    # decrease width to 160 but keep aspect ratio
-                    aspect_ratio = frame.shape[1] / frame.shape[0]
-                    frame = cv2.resize(frame, (160, int(160 / aspect_ratio)))
-                    frames.append(frame)
-                    action = model.predict(obs, deterministic=True)[0]
-                    obs, rew, done, info = env_test.step(action)
-            gif_savepath = os.path.join(log_dir, f'eval_{gif_idx}.gif')
-            def fps_to_duration(fps):
-                return int(1000 * 1/fps)
-            imageio.mimsave(gif_savepath, frames, format='GIF', loop=0, duration=fps_to_duration(30))
+        # eval videos are rendered by background workers, the next seed can start training meanwhile
+        print("Rendering eval videos in the background...")
+        media_jobs.append(start_eval_media(air_hockey_params, model_filepath, env_filepath, log_dir,
+                                           formats=air_hockey_cfg.get('eval_media_formats', ['gif']),
+                                           num_workers=air_hockey_cfg.get('eval_media_workers', None),
+                                           seed=seed))
         
         # print('Running policy live...Ctrl+C twice to stop.')
         # for i in range(1000000):
@@ -233,7 +248,9 @@ def train_air_hockey_model(air_hockey_cfg):
         #     if done:
         #         obs = env_test.reset()
 
-        env_test.close()
+    for media_job in media_jobs:
+        media_job.wait()
+    print("Saved eval videos.")
 
 
 if __name__ == "__main__":
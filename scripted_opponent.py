@@ -0,0 +1,154 @@
+"""
+Scripted paddle controllers built on PuckPredictor: cheap baseline opponents for evaluation and curricula.
+
+ScriptedOpponent reads AirHockeyEnv observations in its player's own frame (the alt row of a two-paddle env
+is already turned around), so the same controller plays either paddle, given the predictor of that player's
+frame (gravity points the other way for the other one). It has the predict(obs) interface of
+league.NumpyPolicy, so it can stand in for an opponent in LeagueOpponentEnv, or play a match loop like
+league.play_match from a fixed side.
+"""
+import numpy as np
+
+from puck_predictor import PuckPredictor
+
+MODES = ('defend', 'attack')
+
+
+class ScriptedOpponent:
+    """
+    'defend' keeps the paddle on a guard arc around its home, where the predicted puck path crosses the arc
+    (or between the puck and the home while the puck is not coming). 'attack' does the same, but whenever
+    the puck will be reachable on its own half it lines up behind the puck, a run-up away, and strikes it
+    towards the far home when the puck gets there.
+
+    A plan (the puck path and the paddle target) is made with the predictor and kept for replan_interval
+    steps, or until the puck leaves the planned path (a hit, a new episode), so most calls only steer the
+    paddle. Actions are delta positions in AirHockeyEnv.action_space, see AirHockeyBox2D.push_paddle.
+
+    Args:
+        predictor (PuckPredictor): puck paths in the player's frame.
+        length (float): table length.
+        width (float): table width.
+        paddle_radius (float): paddle radius.
+        puck_radius (float): puck radius.
+        mode (str, optional): 'defend' or 'attack'. Defaults to 'defend'.
+        horizon (int, optional): planned steps. Defaults to 30.
+        replan_interval (int, optional): steps a plan is kept at most. Defaults to 8.
+        tolerance (float, optional): distance of the puck from its planned path that triggers a new plan.
+            Defaults to 0.02.
+        reach_speed (float, optional): paddle speed assumed when deciding whether a puck can be reached.
+            Defaults to 1.
+        time_step (float, optional): seconds per env step. Defaults to the predictor's.
+    """
+
+    def __init__(self, predictor, length, width, paddle_radius, puck_radius, mode='defend', horizon=30,
+                 replan_interval=8, tolerance=0.02, reach_speed=1.0, time_step=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown scripted opponent mode {mode}, expected one of {MODES}.")
+        self.predictor = predictor
+        self.mode = mode
+        self.horizon = horizon
+        self.replan_interval = replan_interval
+        self.tolerance = tolerance
+        self.time_step = predictor.time_step if time_step is None else time_step
+        self.home = np.array([length / 2, 0.0])
+        self.far_home = np.array([-length / 2, 0.0])
+        self.guard_radius = 0.16 * width + paddle_radius
+        self.contact_distance = paddle_radius + puck_radius
+        # run-up of a strike, the paddle needs a few tenths of a meter to get fast
+        self.stage_distance = 4 * self.contact_distance
+        self.run_up_steps = int(np.ceil(self.stage_distance / (reach_speed * self.time_step)))
+        # targets keep a margin from the out of bounds lines of RewardEngine.termination, overshooting them
+        # ends the episode. the paddle cannot push forward within 3 paddle radii of the center line either,
+        # see push_paddle
+        margin = paddle_radius / 2
+        self.x_min = 3 * paddle_radius
+        self.x_max = length / 2 - paddle_radius - margin
+        self.y_max = width / 2 - paddle_radius - margin
+        self.reach = reach_speed * self.time_step * np.arange(horizon + 1)[:, None]
+        self.reset()
+
+    @staticmethod
+    def from_dict(air_hockey_params, frame='alt', **kwargs):
+        """
+        A scripted opponent for an AirHockeyEnv config, playing the alt (or the ego) paddle.
+        """
+        simulator_params = air_hockey_params['simulator_params']
+        return ScriptedOpponent(PuckPredictor.from_dict(simulator_params, frame=frame),
+                                length=simulator_params['length'],
+                                width=simulator_params['width'],
+                                paddle_radius=simulator_params['paddle_radius'],
+                                puck_radius=simulator_params['puck_radius'],
+                                **kwargs)
+
+    def reset(self):
+        """
+        Drops the current plan. Not needed between episodes, a respawned puck is off the plan anyway.
+        """
+        self.path = None
+        self.target = None
+        self.plan_step = 0
+
+    def predict(self, obs):
+        """
+        Args:
+            obs (numpy.ndarray): (8,) observation or (N, 8) batch in the player's frame (paddle x, y, vx, vy,
+                puck x, y, vx, vy).
+
+        Returns:
+            numpy.ndarray: (2,) or (N, 2) actions.
+        """
+        single = np.ndim(obs) == 1
+        obs = np.atleast_2d(obs)
+        paddle, paddle_vel, puck = obs[:, 0:2], obs[:, 2:4], obs[:, 4:6]
+        self.plan_step += 1
+        if self.path is None or self.path.shape[1] != len(obs) or self.plan_step >= self.replan_interval \
+                or np.abs(self.path[self.plan_step] - puck).max() > self.tolerance:
+            self.plan(paddle, puck, obs[:, 6:8])
+        # aim where the paddle would stop one step ahead, the force saturates a few mm from the target
+        action = np.clip(self.target - paddle - 2 * self.time_step * paddle_vel, -1, 1)
+        return action[0] if single else action
+
+    def plan(self, paddle, puck, puck_vel):
+        self.path = np.concatenate([puck[None], self.predictor.cast(puck, puck_vel, self.horizon)[0]])
+        self.plan_step = 0
+        columns = np.arange(len(puck))
+
+        # guard the home where the puck path first gets close to it, or facing the puck
+        offset = self.path - self.home
+        coming = np.hypot(offset[:, :, 0], offset[:, :, 1]) < self.guard_radius
+        crossing = np.where(coming.any(axis=0), np.argmax(coming, axis=0), 0)
+        target = self.home + self.guard_radius * self.unit(offset[crossing, columns])
+
+        if self.mode == 'attack':
+            # strike the first point of the path on the own half that the paddle can get to in time
+            to_puck = self.path - paddle
+            reachable = (self.path[:, :, 0] > self.x_min) \
+                & (np.hypot(to_puck[:, :, 0], to_puck[:, :, 1]) < self.reach + self.contact_distance)
+            strike = reachable.any(axis=0)
+            arrival = np.argmax(reachable, axis=0)
+            point = self.path[arrival, columns]
+            # line up behind the puck (on the home side of it) and go through it towards the far home. a
+            # puck against a wall is hit along the wall instead, from the staging point the paddle can get to
+            stage = self.clip(point - self.stage_distance * self.unit(self.far_home - point))
+            aim = self.unit(point - stage)
+            behind = paddle - point
+            # wait at the staging point until the puck is a run-up away from the strike point
+            lined_up = (np.sum(behind * aim, axis=1) < 0) \
+                & (np.abs(behind[:, 0] * aim[:, 1] - behind[:, 1] * aim[:, 0]) < self.contact_distance / 2) \
+                & (arrival <= self.run_up_steps)
+            strike_target = np.where(lined_up[:, None], point + self.stage_distance * aim, stage)
+            target = np.where(strike[:, None], strike_target, target)
+
+        self.target = self.clip(target)
+
+    @staticmethod
+    def unit(vectors):
+        return vectors / np.maximum(np.hypot(vectors[:, 0], vectors[:, 1]), 1e-8)[:, None]
+
+    def clip(self, target):
+        """
+        (N, 2) targets moved into the part of the own half the paddle can safely go to.
+        """
+        return np.stack([np.clip(target[:, 0], self.x_min, self.x_max),
+                         np.clip(target[:, 1], -self.y_max, self.y_max)], axis=1)
@@ -0,0 +1,47 @@
+"""
+Fixed slot offsets of the flat state array written by the simulators.
+
+Every body takes BODY_SLOTS consecutive floats: x position, y position, x velocity, y velocity,
+all in env coordinates (x runs along the table length, positive towards the ego home, y runs
+across it). Bodies are laid out as:
+
+    [ego paddle | puck 0 | puck 1 | ... | puck n-1 | alt paddle (multi-agent only)]
+
+so the first OBS_SIZE slots are exactly the single-agent observation.
+"""
+
+BODY_SLOTS = 4
+
+# offsets within a body
+POS_X = 0
+POS_Y = 1
+VEL_X = 2
+VEL_Y = 3
+
+# ego paddle, slots 0-3
+EGO_PADDLE = 0
+EGO_X = EGO_PADDLE + POS_X
+EGO_Y = EGO_PADDLE + POS_Y
+EGO_VX = EGO_PADDLE + VEL_X
+EGO_VY = EGO_PADDLE + VEL_Y
+
+# first puck, slots 4-7. puck i starts at puck_offset(i)
+PUCK = EGO_PADDLE + BODY_SLOTS
+PUCK_X = PUCK + POS_X
+PUCK_Y = PUCK + POS_Y
+PUCK_VX = PUCK + VEL_X
+PUCK_VY = PUCK + VEL_Y
+
+OBS_SIZE = 2 * BODY_SLOTS
+
+
+def puck_offset(i):
+    return PUCK + BODY_SLOTS * i
+
+
+def alt_paddle_offset(num_pucks):
+    return PUCK + BODY_SLOTS * num_pucks
+
+
+def state_size(num_paddles, num_pucks):
+    return BODY_SLOTS * (num_paddles + num_pucks)
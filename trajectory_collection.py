@@ -0,0 +1,80 @@
+"""
+Batched trajectory collection from a VecEnv into a TrajectoryWriter.
+
+Every tick the observations of all envs go through one policy call. Transitions are kept in a
+per-env episode buffer until the episode ends, then the whole episode is written in one piece. The
+dataset therefore stores episodes contiguously (so its episode index stays valid) even though the
+envs finish them in an interleaved order. Each row also records which env (worker) produced it and
+that env's episode counter.
+"""
+import numpy as np
+
+# row layout, obs / next_obs / action widths come from the env spaces
+COLUMNS = ('obs', 'action', 'reward', 'next_obs', 'timestep', 'env_id', 'episode_id')
+
+
+def get_columns(vec_env):
+    obs_dim = int(np.prod(vec_env.observation_space.shape))
+    action_dim = int(np.prod(vec_env.action_space.shape))
+    widths = {'obs': obs_dim, 'action': action_dim, 'next_obs': obs_dim}
+    return {name: widths.get(name, 1) for name in COLUMNS}
+
+
+def collect_trajectories(policy, vec_env, writer, n_steps, episode_length=None, progress=None):
+    """
+    Steps vec_env with policy until writer holds at least n_steps transitions of finished episodes.
+
+    Episodes still running when that happens are dropped, so every stored episode is complete.
+
+    Args:
+        policy (callable): maps a (num_envs, obs dim) batch of observations to a batch of actions.
+        vec_env (VecEnv): auto-resetting vectorized env (e.g. from vec_env.make_air_hockey_vec_env).
+        writer (TrajectoryWriter): created with get_columns(vec_env).
+        n_steps (int): number of transitions to collect.
+        episode_length (int, optional): initial per-env episode buffer length, grown when exceeded.
+            Defaults to the envs' max_timesteps.
+        progress (callable, optional): called with the number of new transitions every tick (e.g. tqdm.update).
+
+    Returns:
+        (int) number of finished episodes written.
+    """
+    num_envs = vec_env.num_envs
+    if episode_length is None:
+        episode_length = max(vec_env.get_attr('max_timesteps'))
+    slices = writer.slices
+    episodes = np.zeros((num_envs, episode_length + 1, writer.row_size), dtype=writer.dtype)
+    lengths = np.zeros(num_envs, dtype=int)
+    episode_ids = np.zeros(num_envs, dtype=int)
+    env_ids = np.arange(num_envs)
+    n_episodes = 0
+
+    obs = vec_env.reset()
+    while len(writer) < n_steps:
+        actions = policy(obs)
+        next_obs, rewards, dones, infos = vec_env.step(actions)
+        if lengths.max() == episodes.shape[1]:
+            episodes = np.concatenate([episodes, np.zeros_like(episodes)], axis=1)
+        rows = episodes[env_ids, lengths]
+        rows[:, slices['obs']] = obs.reshape(num_envs, -1)
+        rows[:, slices['action']] = np.reshape(actions, (num_envs, -1))
+        rows[:, slices['reward']] = rewards[:, None]
+        rows[:, slices['next_obs']] = next_obs.reshape(num_envs, -1)
+        rows[:, slices['timestep']] = lengths[:, None]
+        rows[:, slices['env_id']] = env_ids[:, None]
+        rows[:, slices['episode_id']] = episode_ids[:, None]
+        for i in np.flatnonzero(dones):
+            # next_obs of a finished env is already the first obs of its next episode
+            rows[i, slices['next_obs']] = np.reshape(infos[i]['terminal_observation'], -1)
+        episodes[env_ids, lengths] = rows
+        lengths += 1
+        if progress is not None:
+            progress(num_envs)
+
+        for i in np.flatnonzero(dones):
+            writer.extend_rows(episodes[i, :lengths[i]])
+            writer.end_episode()
+            lengths[i] = 0
+            episode_ids[i] += 1
+            n_episodes += 1
+        obs = next_obs
+    return n_episodes
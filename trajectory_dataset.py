@@ -0,0 +1,233 @@
+"""
+Streaming, chunked storage for collected transitions.
+
+A dataset is a directory with:
+
+    manifest.json         columns, dtype, shard list and row / episode counts
+    shard_000000.npy ...  (rows, row size) arrays of chunk_size rows (the last one may be shorter)
+    episode_ends.bin      int64 row index one past the last row of every finished episode
+
+TrajectoryWriter fills a preallocated chunk in memory and writes it out as a memory-mapped shard once
+it is full, so collection memory stays at one chunk however many rows are written. The manifest is
+rewritten (atomically) after every shard, a crash only loses the rows of the current chunk.
+TrajectoryDataset opens the shards lazily as read-only memmaps.
+"""
+import json
+import os
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+EPISODE_FILE = 'episode_ends.bin'
+
+
+class TrajectoryWriter:
+    """
+    Writes rows of named columns to a dataset directory, see the module docstring.
+
+    Args:
+        path (str): dataset directory, created if needed. An existing dataset in it is overwritten.
+        columns (dict): column name -> width, in row order.
+        chunk_size (int, optional): rows per shard. Defaults to 65536.
+        dtype (optional): row dtype. Defaults to float64.
+        metadata (dict, optional): json serializable information stored in the manifest (e.g. the config).
+    """
+
+    def __init__(self, path, columns, chunk_size=65536, dtype=np.float64, metadata=None):
+        self.path = path
+        self.columns = [(name, int(width)) for name, width in columns.items()]
+        self.slices = {}
+        start = 0
+        for name, width in self.columns:
+            self.slices[name] = slice(start, start + width)
+            start += width
+        self.row_size = start
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype)
+        self.metadata = metadata or {}
+
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.startswith('shard_') or name in (MANIFEST, EPISODE_FILE):
+                os.remove(os.path.join(path, name))
+        self.buffer = np.zeros((chunk_size, self.row_size), dtype=self.dtype)
+        self.n_buffered = 0
+        self.shards = []
+        self.n_rows = 0 # rows in written shards
+        self.episode_ends = [] # episodes finished since the last flush
+        self.n_episodes = 0
+        self.episode_file = open(os.path.join(path, EPISODE_FILE), 'wb')
+        self.write_manifest()
+
+    def __len__(self):
+        return self.n_rows + self.n_buffered
+
+    def append(self, **values):
+        """
+        Adds one row, with a value for every column.
+        """
+        if self.n_buffered == self.chunk_size:
+            self.flush()
+        row = self.buffer[self.n_buffered]
+        for name, value in values.items():
+            row[self.slices[name]] = value
+        self.n_buffered += 1
+
+    def extend(self, **values):
+        """
+        Adds a batch of rows, every value has the rows along its first axis.
+        """
+        n = len(next(iter(values.values())))
+        done = 0
+        while done < n:
+            if self.n_buffered == self.chunk_size:
+                self.flush()
+            count = min(n - done, self.chunk_size - self.n_buffered)
+            rows = self.buffer[self.n_buffered:self.n_buffered + count]
+            for name, value in values.items():
+                rows[:, self.slices[name]] = np.reshape(value[done:done + count], (count, -1))
+            self.n_buffered += count
+            done += count
+
+    def extend_rows(self, rows):
+        """
+        Adds a batch of rows already in the full row layout, (n, row size).
+        """
+        done = 0
+        while done < len(rows):
+            if self.n_buffered == self.chunk_size:
+                self.flush()
+            count = min(len(rows) - done, self.chunk_size - self.n_buffered)
+            self.buffer[self.n_buffered:self.n_buffered + count] = rows[done:done + count]
+            self.n_buffered += count
+            done += count
+
+    def end_episode(self):
+        """
+        Marks the last added row as the end of an episode.
+        """
+        self.episode_ends.append(len(self))
+
+    def flush(self):
+        """
+        Writes the buffered rows to a new shard and updates the manifest.
+        """
+        if self.n_buffered == 0:
+            return
+        file_name = 'shard_%06d.npy' % len(self.shards)
+        shard = np.lib.format.open_memmap(os.path.join(self.path, file_name), mode='w+', dtype=self.dtype,
+                                          shape=(self.n_buffered, self.row_size))
+        shard[:] = self.buffer[:self.n_buffered]
+        shard.flush()
+        del shard
+        self.shards.append({'file': file_name, 'rows': self.n_buffered})
+        self.n_rows += self.n_buffered
+        self.n_buffered = 0
+
+        # only episodes that end inside written shards are recorded, the rest stay buffered
+        written = [end for end in self.episode_ends if end <= self.n_rows]
+        if written:
+            np.array(written, dtype=np.int64).tofile(self.episode_file)
+            self.episode_file.flush()
+            self.n_episodes += len(written)
+            self.episode_ends = self.episode_ends[len(written):]
+        self.write_manifest()
+
+    def write_manifest(self):
+        manifest = {
+            'columns': self.columns,
+            'dtype': self.dtype.str,
+            'row_size': self.row_size,
+            'chunk_size': self.chunk_size,
+            'shards': self.shards,
+            'num_rows': self.n_rows,
+            'num_episodes': self.n_episodes,
+            'metadata': self.metadata,
+        }
+        tmp_path = os.path.join(self.path, MANIFEST + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST))
+
+    def close(self):
+        self.flush()
+        self.episode_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryDataset:
+    """
+    Read-only view of a dataset written by TrajectoryWriter. Shards are memory-mapped on first access.
+
+    Args:
+        path (str): dataset directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST), 'r') as f:
+            self.manifest = json.load(f)
+        self.columns = [(name, width) for name, width in self.manifest['columns']]
+        self.slices = {}
+        start = 0
+        for name, width in self.columns:
+            self.slices[name] = slice(start, start + width)
+            start += width
+        self.metadata = self.manifest['metadata']
+        self.shard_files = [shard['file'] for shard in self.manifest['shards']]
+        # first row of every shard, and the total
+        self.offsets = np.cumsum([0] + [shard['rows'] for shard in self.manifest['shards']])
+        self.shards = [None] * len(self.shard_files)
+        self.episode_ends = np.fromfile(os.path.join(path, EPISODE_FILE), dtype=np.int64,
+                                        count=self.manifest['num_episodes'])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def get_shard(self, i):
+        if self.shards[i] is None:
+            self.shards[i] = np.load(os.path.join(self.path, self.shard_files[i]), mmap_mode='r')
+        return self.shards[i]
+
+    def get_rows(self, start=0, stop=None):
+        """
+        Rows [start, stop) as one array (copied out of the shards they span).
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        parts = []
+        first = max(int(np.searchsorted(self.offsets, start, side='right')) - 1, 0)
+        for i in range(first, len(self.shard_files)):
+            if self.offsets[i] >= stop:
+                break
+            lo, hi = max(start, self.offsets[i]), min(stop, self.offsets[i + 1])
+            parts.append(self.get_shard(i)[lo - self.offsets[i]:hi - self.offsets[i]])
+        if not parts:
+            return np.zeros((0, self.manifest['row_size']), dtype=self.manifest['dtype'])
+        return np.concatenate(parts)
+
+    def get_column(self, name, start=0, stop=None):
+        return self.get_rows(start, stop)[:, self.slices[name]]
+
+    def get_episode_bounds(self):
+        """
+        (num_episodes, 2) array of [start, stop) rows of every finished episode.
+        """
+        starts = np.concatenate([[0], self.episode_ends[:-1]])
+        return np.stack([starts, self.episode_ends], axis=1)
+
+    def get_episode(self, i):
+        """
+        Columns of the i-th finished episode, as a dict.
+        """
+        start, stop = self.get_episode_bounds()[i]
+        rows = self.get_rows(start, stop)
+        return {name: rows[:, column] for name, column in self.slices.items()}
+
+    def iter_shards(self):
+        for i in range(len(self.shard_files)):
+            yield self.get_shard(i)
@@ -0,0 +1,276 @@
+import multiprocessing as mp
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv
+from stable_baselines3.common.vec_env.util import dict_to_obs, obs_space_info
+
+from airhockey import AirHockeyEnv
+
+
+def get_env_seeds(seed, num_envs):
+    """
+    Derives one independent seed per env from a base seed.
+
+    Seeds are spawned from a numpy SeedSequence, so env i gets the same seed on every run
+    and no two envs (or workers) share a random stream.
+    """
+    children = np.random.SeedSequence(seed).spawn(num_envs)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def make_air_hockey_vec_env(air_hockey_params, num_envs, num_workers=None, seed=0, start_method=None,
+                            make_env=AirHockeyEnv.from_dict):
+    """
+    Builds `num_envs` AirHockeyEnv copies spread across a pool of worker processes.
+
+    Args:
+        air_hockey_params (dict): AirHockeyEnv parameters, as passed to AirHockeyEnv.from_dict.
+        num_envs (int): total number of environments.
+        num_workers (int, optional): number of worker processes. Defaults to min(num_envs, cpu count).
+        seed (int, optional): base seed, see get_env_seeds. Defaults to 0.
+        start_method (str, optional): multiprocessing start method. Defaults to the platform default.
+        make_env (callable, optional): builds one env from its parameters (e.g. league.LeagueOpponentEnv).
+            Defaults to AirHockeyEnv.from_dict.
+
+    With num_paddles 2 in the simulator params every env is a two player table and takes two slots,
+    see SharedMemoryVecEnv, so one policy plays both sides (self-play).
+    """
+    env_fns = []
+    for env_seed in get_env_seeds(seed, num_envs):
+        env_params = dict(air_hockey_params)
+        env_params['seed'] = env_seed
+        env_fns.append(lambda env_params=env_params: make_env(env_params))
+    return SharedMemoryVecEnv(env_fns, num_workers=num_workers, start_method=start_method)
+
+
+class SharedArray:
+    """
+    A numpy array backed by shared memory that can be handed to worker processes.
+    """
+
+    def __init__(self, shape, dtype):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.raw = RawArray('b', max(1, int(np.prod(self.shape)) * self.dtype.itemsize))
+
+    def as_array(self):
+        return np.frombuffer(self.raw, dtype=self.dtype, count=int(np.prod(self.shape))).reshape(self.shape)
+
+
+def _worker(remote, parent_remote, env_fn_wrappers, env_offset, num_agents, buffers):
+    parent_remote.close()
+    envs = [env_fn_wrapper.var() for env_fn_wrapper in env_fn_wrappers.var]
+    # buffer rows of every env, one row (indexed by an int) per single-agent env
+    if num_agents == 1:
+        env_slots = [env_offset + i for i in range(len(envs))]
+    else:
+        env_slots = [slice((env_offset + i) * num_agents, (env_offset + i + 1) * num_agents) for i in range(len(envs))]
+    arrays = {name: {key: buf.as_array() for key, buf in bufs.items()} if isinstance(bufs, dict) else bufs.as_array()
+              for name, bufs in buffers.items()}
+
+    def write_obs(name, idx, obs):
+        if isinstance(arrays[name], dict):
+            for key, value in arrays[name].items():
+                value[idx] = obs if key is None else obs[key]
+        else:
+            arrays[name][idx] = obs
+
+    while True:
+        try:
+            cmd, data = remote.recv()
+        except EOFError:
+            break
+        if cmd == 'step':
+            infos = None
+            for i, env in enumerate(envs):
+                idx = env_offset + i
+                slot = env_slots[i]
+                obs, reward, terminated, truncated, info = env.step(arrays['actions'][slot])
+                done = terminated or truncated
+                arrays['rewards'][slot] = reward
+                arrays['dones'][slot] = done
+                if done:
+                    # terminal observation goes through shared memory too, the parent attaches it to info
+                    info = dict(info)
+                    info['TimeLimit.truncated'] = truncated and not terminated
+                    write_obs('terminal_obs', slot, obs)
+                    obs, reset_info = env.reset()
+                if done or info:
+                    if infos is None:
+                        infos = {}
+                    infos[idx] = (info, done)
+                write_obs('obs', slot, obs)
+            remote.send(infos)
+        elif cmd == 'reset':
+            for i, env in enumerate(envs):
+                seed = data[(env_offset + i) * num_agents]
+                obs, _ = env.reset(seed=seed) if seed is not None else env.reset()
+                write_obs('obs', env_slots[i], obs)
+            remote.send(None)
+        elif cmd == 'get_attr':
+            indices, attr_name = data
+            remote.send([getattr(envs[i - env_offset], attr_name) for i in indices])
+        elif cmd == 'set_attr':
+            indices, attr_name, value = data
+            for i in indices:
+                setattr(envs[i - env_offset], attr_name, value)
+            remote.send(None)
+        elif cmd == 'env_method':
+            indices, method_name, args, kwargs = data
+            remote.send([getattr(envs[i - env_offset], method_name)(*args, **kwargs) for i in indices])
+        elif cmd == 'is_wrapped':
+            indices, wrapper_class = data
+            remote.send([isinstance(envs[i - env_offset], wrapper_class) for i in indices])
+        elif cmd == 'close':
+            for env in envs:
+                if hasattr(env, 'close'):
+                    env.close()
+            remote.close()
+            break
+        else:
+            raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Stable-baselines3 VecEnv that runs its envs in worker processes.
+
+    Actions, observations, rewards, dones and terminal observations live in shared-memory numpy
+    buffers, so a step only exchanges a tiny command message with each worker instead of pickling
+    the observations. Each worker hosts a contiguous slice of the envs and steps them in order.
+    Envs are reset automatically when they finish, like DummyVecEnv/SubprocVecEnv.
+
+    Multi-agent envs (num_agents > 1, e.g. AirHockeyEnv with two paddles) take num_agents consecutive
+    slots each, ego first: num_envs counts slots, every slot looks like a single-agent env to the policy,
+    and the whole batch goes through one forward pass. The players of an env finish together. get_attr,
+    set_attr and env_method indices are slots too, and reach the env of the slot.
+    """
+
+    def __init__(self, env_fns, num_workers=None, start_method=None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+        if num_workers is None:
+            num_workers = mp.cpu_count()
+        num_workers = max(1, min(num_workers, n_envs))
+
+        # build one env in the parent to read the spaces, then drop it
+        probe_env = env_fns[0]()
+        observation_space, action_space = probe_env.observation_space, probe_env.action_space
+        self.num_agents = getattr(probe_env, 'num_agents', 1)
+        del probe_env
+        num_envs = n_envs * self.num_agents
+        super().__init__(num_envs, observation_space, action_space)
+
+        self.keys, shapes, dtypes = obs_space_info(observation_space)
+        buffers = {'obs': {k: SharedArray((num_envs, *shapes[k]), dtypes[k]) for k in self.keys},
+                   'terminal_obs': {k: SharedArray((num_envs, *shapes[k]), dtypes[k]) for k in self.keys},
+                   'actions': SharedArray((num_envs, *action_space.shape), action_space.dtype),
+                   'rewards': SharedArray((num_envs,), np.float32),
+                   'dones': SharedArray((num_envs,), bool)}
+        self.buf_obs = {k: buf.as_array() for k, buf in buffers['obs'].items()}
+        self.buf_terminal_obs = {k: buf.as_array() for k, buf in buffers['terminal_obs'].items()}
+        self.buf_actions = buffers['actions'].as_array()
+        self.buf_rews = buffers['rewards'].as_array()
+        self.buf_dones = buffers['dones'].as_array()
+
+        if start_method is None:
+            # fork is the fastest on linux, fall back to the default elsewhere
+            start_method = 'fork' if 'fork' in mp.get_all_start_methods() else None
+        ctx = mp.get_context(start_method)
+
+        # split envs into contiguous slices, one per worker
+        splits = np.array_split(np.arange(n_envs), num_workers)
+        self.worker_indices = [split.tolist() for split in splits]
+        self.remotes, self.processes = [], []
+        for indices in self.worker_indices:
+            remote, work_remote = ctx.Pipe()
+            worker_fns = CloudpickleWrapper([CloudpickleWrapper(env_fns[i]) for i in indices])
+            process = ctx.Process(target=_worker, args=(work_remote, remote, worker_fns, indices[0], self.num_agents, buffers), daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+    def step_async(self, actions):
+        self.buf_actions[:] = np.asarray(actions).reshape(self.buf_actions.shape)
+        for remote in self.remotes:
+            remote.send(('step', None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [{} for _ in range(self.num_envs)]
+        for remote in self.remotes:
+            worker_infos = remote.recv()
+            if worker_infos is None:
+                continue
+            for idx, (info, done) in worker_infos.items():
+                for slot in range(idx * self.num_agents, (idx + 1) * self.num_agents):
+                    slot_info = info if self.num_agents == 1 else dict(info)
+                    if done:
+                        slot_info['terminal_observation'] = self._get_obs(self.buf_terminal_obs, slot)
+                    infos[slot] = slot_info
+        self.waiting = False
+        return self._get_obs(self.buf_obs), np.copy(self.buf_rews), np.copy(self.buf_dones), infos
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(('reset', self._seeds))
+        for remote in self.remotes:
+            remote.recv()
+        self._reset_seeds()
+        self._reset_options()
+        return self._get_obs(self.buf_obs)
+
+    def _get_obs(self, buffers, idx=None):
+        if idx is None:
+            return dict_to_obs(self.observation_space, {k: np.copy(v) for k, v in buffers.items()})
+        obs = {k: np.copy(v[idx]) for k, v in buffers.items()}
+        return obs[None] if isinstance(self.observation_space, spaces.Box) else obs
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def _get_target_remotes(self, indices):
+        # slots -> envs
+        indices = [i // self.num_agents for i in self._get_indices(indices)]
+        targets = []
+        for remote, worker_indices in zip(self.remotes, self.worker_indices):
+            selected = [i for i in indices if i in worker_indices]
+            if selected:
+                targets.append((remote, selected))
+        return targets
+
+    def _request(self, cmd, indices, *args):
+        targets = self._get_target_remotes(indices)
+        for remote, selected in targets:
+            remote.send((cmd, (selected, *args)))
+        results = []
+        for remote, _ in targets:
+            result = remote.recv()
+            if result is not None:
+                results += result
+        return results
+
+    def get_attr(self, attr_name, indices=None):
+        return self._request('get_attr', indices, attr_name)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._request('set_attr', indices, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._request('env_method', indices, method_name, method_args, method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return self._request('is_wrapped', indices, wrapper_class)